@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any
+
+
+# Higher numbers are admitted first and shed last.
+PRIORITIES = {"free": 0, "pro": 1, "dev_unlimited": 2}
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, priority_class: str, reason: str, retry_after_seconds: int) -> None:
+        super().__init__(f"Scan shed ({reason}) for {priority_class}")
+        self.priority_class = priority_class
+        self.reason = reason
+        self.retry_after_seconds = retry_after_seconds
+
+
+@dataclass
+class AdmissionTicket:
+    priority_class: str
+    admitted_at: float = field(default_factory=time.monotonic)
+    wait_ms: int = 0
+    released: bool = False
+
+
+@dataclass(order=True)
+class _Waiter:
+    sort_key: tuple[int, int]
+    priority_class: str = field(compare=False)
+    future: asyncio.Future[AdmissionTicket] = field(compare=False)
+    enqueued_at: float = field(compare=False, default_factory=time.monotonic)
+
+
+class AdmissionController:
+    """Caps concurrent scans and decides, per plan, who runs, waits or is shed under load.
+
+    Each plan may only fill its share of the in-flight limit (`free` 60%, `pro` 90%,
+    developer bypass 100%), so the last slots are always held back for higher plans. When
+    the recent scan latency (an EWMA) exceeds `target_latency_ms`, the limit shrinks in
+    proportion, shedding free traffic first. A scan that does not fit waits in a priority
+    queue for at most its plan's wait budget and is then rejected.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = 16,
+        target_latency_ms: float = 15000.0,
+        max_wait_seconds: float = 10.0,
+        free_max_wait_seconds: float = 2.0,
+        max_waiting: int = 64,
+        shares: dict[str, float] | None = None,
+        latency_alpha: float = 0.2,
+    ) -> None:
+        if max_in_flight <= 0:
+            raise ValueError("max_in_flight must be > 0")
+        self.max_in_flight = max_in_flight
+        self.target_latency_ms = target_latency_ms
+        self.max_wait_seconds = {"free": free_max_wait_seconds, "pro": max_wait_seconds, "dev_unlimited": max_wait_seconds}
+        self.max_waiting = max_waiting
+        self.shares = shares or {"free": 0.6, "pro": 0.9, "dev_unlimited": 1.0}
+        self.latency_alpha = latency_alpha
+        self.in_flight = 0
+        self.latency_ewma_ms: float | None = None
+        self._waiters: list[_Waiter] = []
+        self._sequence = itertools.count()
+        self._decisions: Counter[tuple[str, str]] = Counter()
+        self._wait_ms_total: Counter[str] = Counter()
+
+    @staticmethod
+    def priority_class(plan: str) -> str:
+        return plan if plan in PRIORITIES else "free"
+
+    def effective_limit(self) -> int:
+        if self.latency_ewma_ms is None or self.latency_ewma_ms <= self.target_latency_ms:
+            return self.max_in_flight
+        return max(1, int(self.max_in_flight * self.target_latency_ms / self.latency_ewma_ms))
+
+    def class_limit(self, priority_class: str) -> int:
+        return max(1, math.ceil(self.effective_limit() * self.shares[priority_class]))
+
+    def would_admit(self, priority_class: str) -> bool:
+        """True if a scan of this class would get a slot right now without waiting."""
+        return self.in_flight < self.class_limit(priority_class) and not self._waiting_at_or_above(priority_class)
+
+    def retry_after_seconds(self) -> int:
+        latency_seconds = (self.latency_ewma_ms or self.target_latency_ms / 2) / 1000
+        return max(1, math.ceil(latency_seconds * (1 + len(self._waiters) / self.max_in_flight)))
+
+    def reject(self, priority_class: str, reason: str) -> AdmissionRejected:
+        self._decisions[(priority_class, f"shed_{reason}")] += 1
+        return AdmissionRejected(priority_class, reason, self.retry_after_seconds())
+
+    async def admit(self, priority_class: str, wait_forever: bool = False) -> AdmissionTicket:
+        """Take a slot, waiting up to the class's wait budget (or indefinitely for accepted jobs)."""
+        if self.would_admit(priority_class):
+            self._decisions[(priority_class, "admitted")] += 1
+            return self._grant(priority_class, 0)
+        wait_budget = None if wait_forever else self.max_wait_seconds[priority_class]
+        if wait_budget is not None and wait_budget <= 0:
+            raise self.reject(priority_class, "capacity")
+        if not wait_forever and len(self._waiters) >= self.max_waiting:
+            raise self.reject(priority_class, "queue_full")
+
+        waiter = _Waiter(
+            sort_key=(-PRIORITIES[priority_class], next(self._sequence)),
+            priority_class=priority_class,
+            future=asyncio.get_running_loop().create_future(),
+        )
+        heapq.heappush(self._waiters, waiter)
+        try:
+            ticket = await asyncio.wait_for(asyncio.shield(waiter.future), timeout=wait_budget)
+        except asyncio.TimeoutError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Granted in the same tick the timeout fired; keep the slot.
+                ticket = waiter.future.result()
+            else:
+                waiter.future.cancel()
+                self._drop_cancelled()
+                raise self.reject(priority_class, "timeout") from None
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                self.release(waiter.future.result())
+            else:
+                waiter.future.cancel()
+                self._drop_cancelled()
+            raise
+        self._decisions[(priority_class, "admitted_after_wait")] += 1
+        return ticket
+
+    def release(self, ticket: AdmissionTicket, latency_ms: float | None = None) -> None:
+        if ticket.released:
+            return
+        ticket.released = True
+        self.in_flight -= 1
+        if latency_ms is not None:
+            if self.latency_ewma_ms is None:
+                self.latency_ewma_ms = latency_ms
+            else:
+                self.latency_ewma_ms += self.latency_alpha * (latency_ms - self.latency_ewma_ms)
+        self._wake_waiters()
+
+    def _grant(self, priority_class: str, wait_ms: int) -> AdmissionTicket:
+        self.in_flight += 1
+        self._wait_ms_total[priority_class] += wait_ms
+        return AdmissionTicket(priority_class=priority_class, wait_ms=wait_ms)
+
+    def _wake_waiters(self) -> None:
+        self._drop_cancelled()
+        while self._waiters:
+            waiter = self._waiters[0]
+            if self.in_flight >= self.class_limit(waiter.priority_class):
+                break
+            heapq.heappop(self._waiters)
+            waiter.future.set_result(
+                self._grant(waiter.priority_class, int((time.monotonic() - waiter.enqueued_at) * 1000))
+            )
+            self._drop_cancelled()
+
+    def _drop_cancelled(self) -> None:
+        if any(waiter.future.done() for waiter in self._waiters):
+            self._waiters = [waiter for waiter in self._waiters if not waiter.future.done()]
+            heapq.heapify(self._waiters)
+
+    def _waiting_at_or_above(self, priority_class: str) -> bool:
+        rank = PRIORITIES[priority_class]
+        return any(PRIORITIES[waiter.priority_class] >= rank for waiter in self._waiters if not waiter.future.done())
+
+    def metrics(self) -> dict[str, Any]:
+        waiting = Counter(waiter.priority_class for waiter in self._waiters if not waiter.future.done())
+        decisions: dict[str, dict[str, int]] = {priority_class: {} for priority_class in PRIORITIES}
+        for (priority_class, decision), count in sorted(self._decisions.items()):
+            decisions[priority_class][decision] = count
+        return {
+            "max_in_flight": self.max_in_flight,
+            "effective_limit": self.effective_limit(),
+            "in_flight": self.in_flight,
+            "latency_ewma_ms": round(self.latency_ewma_ms) if self.latency_ewma_ms is not None else None,
+            "target_latency_ms": self.target_latency_ms,
+            "class_limits": {priority_class: self.class_limit(priority_class) for priority_class in PRIORITIES},
+            "waiting": {priority_class: waiting.get(priority_class, 0) for priority_class in PRIORITIES},
+            "decisions": decisions,
+            "wait_ms_total": {priority_class: self._wait_ms_total.get(priority_class, 0) for priority_class in PRIORITIES},
+            "retry_after_seconds": self.retry_after_seconds(),
+        }
@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+import unicodedata
+from collections import deque
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+
+
+_DISHES_DIR = Path(__file__).resolve().parent
+_PRICE_RE = re.compile(r"[¥￥]?\d[\d,]*(?:\.\d+)?円?")
+
+
+@dataclass(frozen=True)
+class DishEntry:
+    dish_id: str
+    jp_forms: tuple[str, ...]
+    en_title: str
+    en_description: str
+    tags: tuple[str, ...]
+    image_query: str
+
+
+@dataclass(frozen=True)
+class DishMatch:
+    """One dictionary hit on a menu line; `surface` is the form as it appears in the text."""
+
+    entry: DishEntry
+    surface: str
+    line_index: int
+    price_text: str | None
+
+
+@dataclass
+class MenuMatch:
+    """Dictionary matches for a whole menu, split into lines it covers and lines it does not."""
+
+    matches: list[DishMatch] = field(default_factory=list)
+    unmatched_lines: list[tuple[int, str]] = field(default_factory=list)
+    candidate_lines: int = 0
+    matched_lines: int = 0
+
+    @property
+    def coverage(self) -> float:
+        return self.matched_lines / self.candidate_lines if self.candidate_lines else 0.0
+
+    @property
+    def unmatched_text(self) -> str:
+        return "\n".join(line for _, line in self.unmatched_lines)
+
+
+class AhoCorasick:
+    """Multi-pattern string matcher: every occurrence of every pattern in one pass over the text."""
+
+    def __init__(self, patterns: dict[str, object]) -> None:
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._output: list[list[str]] = [[]]
+        self._values = dict(patterns)
+        for pattern in patterns:
+            if pattern:
+                self._add(pattern)
+        self._link()
+
+    def _add(self, pattern: str) -> None:
+        state = 0
+        for ch in pattern:
+            next_state = self._goto[state].get(ch)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][ch] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append(pattern)
+
+    def _link(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(ch, 0)
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def find_all(self, text: str) -> list[tuple[int, int, object]]:
+        """Return (start, end, value) for every pattern occurrence, overlaps included."""
+        hits: list[tuple[int, int, object]] = []
+        state = 0
+        for index, ch in enumerate(text):
+            while state and ch not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(ch, 0)
+            for pattern in self._output[state]:
+                hits.append((index + 1 - len(pattern), index + 1, self._values[pattern]))
+        return hits
+
+    def find_longest(self, text: str) -> list[tuple[int, int, object]]:
+        """Leftmost-longest, non-overlapping occurrences, so 天ぷらそば wins over そば."""
+        selected: list[tuple[int, int, object]] = []
+        reach = 0
+        for start, end, value in sorted(self.find_all(text), key=lambda hit: (hit[0], hit[0] - hit[1])):
+            if start >= reach:
+                selected.append((start, end, value))
+                reach = end
+        return selected
+
+
+class DishDictionary:
+    """A bundled, versioned list of common dishes with a matcher over all their Japanese forms.
+
+    A menu line counts as matched when dictionary forms cover at least `min_line_coverage`
+    of its Japanese characters, so 唐揚げ定食 is not mistaken for plain 唐揚げ. Matching
+    runs on NFKC-normalized lines with whitespace removed, the same shape the OCR
+    diagnostics compare against.
+    """
+
+    def __init__(self, version: str, entries: list[DishEntry]) -> None:
+        self.version = version
+        self.entries = entries
+        self._matcher = AhoCorasick(
+            {normalize_menu_text(form): entry for entry in entries for form in entry.jp_forms}
+        )
+
+    @classmethod
+    def from_bytes(cls, version: str, data: bytes) -> DishDictionary:
+        payload = json.loads(data)
+        entries = [
+            DishEntry(
+                dish_id=raw["dish_id"],
+                jp_forms=tuple(raw["jp_forms"]),
+                en_title=raw["en_title"],
+                en_description=raw.get("en_description", ""),
+                tags=tuple(raw.get("tags", [])),
+                image_query=raw.get("image_query") or raw["en_title"],
+            )
+            for raw in payload["dishes"]
+        ]
+        return cls(payload.get("version", version), entries)
+
+    def match_menu(self, text: str, min_line_coverage: float = 0.9) -> MenuMatch:
+        result = MenuMatch()
+        for line_index, raw_line in enumerate(text.splitlines()):
+            line = normalize_menu_text(raw_line)
+            # 円 is a kanji; count Japanese characters with the prices taken out.
+            jp_count = _jp_char_count(_PRICE_RE.sub("", line))
+            if jp_count < 2:
+                # Prices, numbers and stray symbols; keep them for the LLM as context.
+                if line:
+                    result.unmatched_lines.append((line_index, raw_line))
+                continue
+            result.candidate_lines += 1
+            hits = self._matcher.find_longest(line)
+            covered = sum(_jp_char_count(line[start:end]) for start, end, _ in hits)
+            if not hits or covered < min_line_coverage * jp_count:
+                result.unmatched_lines.append((line_index, raw_line))
+                continue
+            result.matched_lines += 1
+            for position, (start, end, entry) in enumerate(hits):
+                next_start = hits[position + 1][0] if position + 1 < len(hits) else len(line)
+                price = _PRICE_RE.search(line, end, next_start)
+                result.matches.append(
+                    DishMatch(
+                        entry=entry,
+                        surface=line[start:end],
+                        line_index=line_index,
+                        price_text=price.group(0) if price else None,
+                    )
+                )
+        return result
+
+
+def normalize_menu_text(value: str) -> str:
+    return re.sub(r"\s+", "", unicodedata.normalize("NFKC", value))
+
+
+def _jp_char_count(value: str) -> int:
+    count = 0
+    for ch in value:
+        code = ord(ch)
+        if 0x3040 <= code <= 0x30FF or 0x4E00 <= code <= 0x9FFF:
+            count += 1
+    return count
+
+
+@lru_cache(maxsize=None)
+def _load_dictionary_bytes(version: str) -> bytes:
+    return (_DISHES_DIR / f"{version}.json").read_bytes()
+
+
+@lru_cache(maxsize=None)
+def load_dish_dictionary(version: str) -> DishDictionary:
+    try:
+        data = _load_dictionary_bytes(version)
+    except FileNotFoundError:
+        raise RuntimeError(f"Dish dictionary not found: {version}.json") from None
+    return DishDictionary.from_bytes(version, data)
+
+
+def get_dictionary_fingerprint(version: str) -> str:
+    load_dish_dictionary(version)
+    return hashlib.sha256(_load_dictionary_bytes(version)).hexdigest()
+
+
+def clear_dictionary_cache() -> None:
+    _load_dictionary_bytes.cache_clear()
+    load_dish_dictionary.cache_clear()
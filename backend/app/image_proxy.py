@@ -0,0 +1,327 @@
+from __future__ import annotations
+
+import asyncio
+import base64
+import hashlib
+import hmac
+import io
+import ipaddress
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import cache
+from pathlib import Path
+from typing import Any
+
+import httpx
+
+
+_RENDER_VERSION = "webp-v1"
+_MAX_REDIRECTS = 5
+
+
+class ImageProxyError(Exception):
+    def __init__(self, status_code: int, detail: str) -> None:
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+@dataclass
+class ProxiedImage:
+    etag: str
+    body: bytes
+    media_type: str = "image/webp"
+
+
+class DiskLruCache:
+    """Size-bounded file cache; least recently used entries are evicted first.
+
+    Recency lives in memory and is rebuilt from file mtimes on start, and hits bump the
+    mtime so the order survives restarts. Processes sharing a directory each keep their
+    own index, so the bound is enforced per process, and a file evicted by a sibling
+    process just reads as a miss.
+    """
+
+    def __init__(self, root: Path, max_bytes: int) -> None:
+        if max_bytes <= 0:
+            raise ValueError("max_bytes must be > 0")
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries: OrderedDict[str, int] = OrderedDict()
+        self._lock = threading.Lock()
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self) -> None:
+        files = []
+        for path in self.root.glob("*/*.bin"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, path.stem, stat.st_size))
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self.total_bytes += size
+        self._evict()
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.bin"
+
+    def get(self, key: str) -> bytes | None:
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            with self._lock:
+                size = self._entries.pop(key, None)
+                if size is not None:
+                    self.total_bytes -= size
+            return None
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.total_bytes -= previous
+            self._entries[key] = len(data)
+            self.total_bytes += len(data)
+            self._evict()
+
+    def _evict(self) -> None:
+        while self.total_bytes > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self.total_bytes -= size
+            try:
+                self._path(key).unlink()
+            except FileNotFoundError:
+                pass
+
+
+class ImageProxy:
+    """Fetches preview images once and serves resized WebP thumbnails from a disk cache.
+
+    Image ids are the source URL plus an HMAC signature, so the proxy needs no shared
+    id table and only ever fetches URLs that this backend handed out. Those URLs come from
+    third-party hosts, so every hop (including redirects) must resolve to public addresses
+    only, and the connection goes to the address that was checked.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        secret: str,
+        max_cache_bytes: int = 256 * 1024 * 1024,
+        allowed_widths: tuple[int, ...] = (160, 320, 640),
+        default_width: int = 320,
+        public_base_url: str = "",
+        fetch_timeout_seconds: float = 8.0,
+        max_source_bytes: int = 10 * 1024 * 1024,
+        failure_ttl_seconds: float = 600.0,
+    ) -> None:
+        if not secret:
+            raise ValueError("secret is required")
+        if default_width not in allowed_widths:
+            raise ValueError("default_width must be one of allowed_widths")
+
+        self.cache = DiskLruCache(Path(cache_dir), max_cache_bytes)
+        self.allowed_widths = allowed_widths
+        self.default_width = default_width
+        self.public_base_url = public_base_url.rstrip("/")
+        self.fetch_timeout_seconds = fetch_timeout_seconds
+        self.max_source_bytes = max_source_bytes
+        self.failure_ttl_seconds = failure_ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._secret = secret.encode("utf-8")
+        self._client: httpx.AsyncClient | None = None
+        self._inflight: dict[str, asyncio.Task[bytes]] = {}
+        self._failed_until: dict[str, float] = {}
+
+    def image_id(self, url: str) -> str:
+        encoded = base64.urlsafe_b64encode(url.encode("utf-8")).rstrip(b"=").decode("ascii")
+        return f"{encoded}.{self._sign(url)}"
+
+    def proxy_url(self, url: str) -> str:
+        return f"{self.public_base_url}/v1/images/{self.image_id(url)}"
+
+    def resolve_source_url(self, image_id: str) -> str:
+        encoded, _, signature = image_id.partition(".")
+        try:
+            url = base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4)).decode("utf-8")
+        except (ValueError, UnicodeDecodeError):
+            raise ImageProxyError(404, "Unknown image") from None
+        if not signature or not hmac.compare_digest(signature, self._sign(url)):
+            raise ImageProxyError(404, "Unknown image")
+        return url
+
+    def resolve_width(self, width: int | None) -> int:
+        if width is None:
+            return self.default_width
+        if width not in self.allowed_widths:
+            allowed = ", ".join(str(value) for value in self.allowed_widths)
+            raise ImageProxyError(400, f"Unsupported width. Use one of: {allowed}.")
+        return width
+
+    def etag_for(self, url: str, width: int) -> str:
+        return f'"{self._cache_key(url, width)[:32]}"'
+
+    async def get_thumbnail(self, url: str, width: int) -> ProxiedImage:
+        key = self._cache_key(url, width)
+        etag = f'"{key[:32]}"'
+        cached = await asyncio.to_thread(self.cache.get, key)
+        if cached is not None:
+            self.hits += 1
+            return ProxiedImage(etag=etag, body=cached)
+
+        self.misses += 1
+        if self._failed_until.get(key, 0.0) > time.monotonic():
+            raise ImageProxyError(404, "Image source unavailable")
+
+        # Concurrent requests for the same variant share one fetch and render.
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._fetch_and_render(key, url, width))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return ProxiedImage(etag=etag, body=await asyncio.shield(task))
+
+    async def _fetch_and_render(self, key: str, url: str, width: int) -> bytes:
+        if pillow_modules() is None:
+            raise ImageProxyError(500, "Pillow is not installed")
+        try:
+            source = await self._fetch(url)
+            body = await asyncio.to_thread(_render_webp, source, width)
+        except (httpx.HTTPError, ImageProxyError, OSError, ValueError) as exc:
+            now = time.monotonic()
+            if len(self._failed_until) > 10000:
+                self._failed_until = {k: until for k, until in self._failed_until.items() if until > now}
+            self._failed_until[key] = now + self.failure_ttl_seconds
+            if isinstance(exc, ImageProxyError):
+                raise
+            raise ImageProxyError(502, f"Image source unavailable: {exc}") from exc
+        await asyncio.to_thread(self.cache.put, key, body)
+        return body
+
+    async def _fetch(self, url: str) -> bytes:
+        if self._client is None:
+            # Redirects are followed by hand, so each hop's destination is checked first.
+            self._client = httpx.AsyncClient(timeout=self.fetch_timeout_seconds)
+        for _ in range(_MAX_REDIRECTS + 1):
+            request = await self._pinned_request(url)
+            response = await self._client.send(request, stream=True)
+            try:
+                if response.is_redirect:
+                    url = str(httpx.URL(url).join(response.headers["location"]))
+                    continue
+                response.raise_for_status()
+                chunks: list[bytes] = []
+                received = 0
+                async for chunk in response.aiter_bytes():
+                    received += len(chunk)
+                    if received > self.max_source_bytes:
+                        raise ImageProxyError(502, "Image source too large")
+                    chunks.append(chunk)
+                return b"".join(chunks)
+            finally:
+                await response.aclose()
+        raise ImageProxyError(502, "Image source redirected too many times")
+
+    async def _pinned_request(self, url: str) -> httpx.Request:
+        """Build a GET that connects to a checked public address of the URL's host.
+
+        Connecting to the resolved address (with the original Host header and TLS server
+        name) keeps a DNS answer that changes after the check from reaching internal hosts.
+        """
+        source = httpx.URL(url)
+        if source.scheme not in ("http", "https") or not source.host:
+            raise ImageProxyError(403, "Image source not allowed")
+        port = source.port or (443 if source.scheme == "https" else 80)
+        try:
+            addresses = await self._resolve_host(source.host, port)
+        except OSError as exc:
+            raise ImageProxyError(502, f"Image source unavailable: {exc}") from exc
+        if not addresses or not all(_is_public_address(address) for address in addresses):
+            raise ImageProxyError(403, "Image source not allowed")
+        return self._client.build_request(
+            "GET",
+            source.copy_with(host=addresses[0]),
+            headers={"Host": source.netloc.decode("ascii")},
+            extensions={"sni_hostname": source.host},
+        )
+
+    @staticmethod
+    async def _resolve_host(host: str, port: int) -> list[str]:
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        return [str(info[4][0]) for info in infos]
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _sign(self, url: str) -> str:
+        digest = hmac.new(self._secret, url.encode("utf-8"), hashlib.sha256).digest()[:16]
+        return base64.urlsafe_b64encode(digest).rstrip(b"=").decode("ascii")
+
+    @staticmethod
+    def _cache_key(url: str, width: int) -> str:
+        return hashlib.sha256(f"{_RENDER_VERSION}|{width}|{url}".encode("utf-8")).hexdigest()
+
+
+def _is_public_address(address: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(address.split("%", 1)[0])
+    except ValueError:
+        return False
+    if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    # is_global excludes private, loopback, link-local (cloud metadata), shared and reserved ranges.
+    return ip.is_global and not ip.is_multicast
+
+
+@cache
+def pillow_modules() -> tuple[Any, Any] | None:
+    """Return Pillow's `(Image, ImageOps)` modules, or None when Pillow is not installed."""
+    # Pillow is imported on first use so it stays off the startup path.
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        return None
+    return Image, ImageOps
+
+
+def _render_webp(source: bytes, width: int) -> bytes:
+    Image, ImageOps = pillow_modules()
+    try:
+        with Image.open(io.BytesIO(source)) as image:
+            # JPEG decoders can downscale while decoding, which is much cheaper than a full decode.
+            image.draft("RGB", (width, width))
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((width, width))
+            if image.mode not in {"RGB", "RGBA"}:
+                image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+            output = io.BytesIO()
+            image.save(output, format="WEBP", quality=80, method=4)
+    except Image.DecompressionBombError as exc:
+        # Not an OSError: without this, a huge source would escape as a 500 and skip the failure TTL.
+        raise ImageProxyError(502, "Image source too large to decode") from exc
+    return output.getvalue()
@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import re
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any
+
+
+logger = logging.getLogger("menulens")
+
+
+class CountMinSketch:
+    """Fixed-size frequency counter; estimates never undercount and overcount only on collisions.
+
+    Uses conservative update (only the smallest counters grow), which keeps the
+    overestimate for rare keys much lower on heavy-tailed streams.
+    """
+
+    def __init__(self, width: int = 4096, depth: int = 4) -> None:
+        if width <= 0 or depth <= 0:
+            raise ValueError("width and depth must be > 0")
+        self.width = width
+        self.depth = depth
+        self._rows = [[0] * width for _ in range(depth)]
+
+    def _indexes(self, key: str) -> list[int]:
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8 * self.depth).digest()
+        return [int.from_bytes(digest[row * 8 : row * 8 + 8], "little") % self.width for row in range(self.depth)]
+
+    def add(self, key: str, count: int = 1) -> int:
+        indexes = self._indexes(key)
+        estimate = min(row[index] for row, index in zip(self._rows, indexes)) + count
+        for row, index in zip(self._rows, indexes):
+            if row[index] < estimate:
+                row[index] = estimate
+        return estimate
+
+    def estimate(self, key: str) -> int:
+        return min(row[index] for row, index in zip(self._rows, self._indexes(key)))
+
+    def decay(self) -> None:
+        """Halve every counter so yesterday's popular queries fade out."""
+        for row in self._rows:
+            for index, value in enumerate(row):
+                if value:
+                    row[index] = value >> 1
+
+
+@dataclass
+class _WarmEntry:
+    value: list[Any]
+    resolved_at: float
+
+
+def normalize_query(query: str) -> str:
+    return re.sub(r"\s+", " ", query.strip().lower())
+
+
+class WarmImageCache:
+    """Keeps image results for the most popular image queries resolved ahead of time.
+
+    Every scan records its image queries in a count-min sketch; a bounded candidate set
+    tracks the queries with the highest estimates. A background task periodically
+    resolves the top `top_k` candidates (and re-resolves entries older than `ttl_seconds`)
+    so popular dishes are served from memory instead of waiting on the search provider.
+    Counters are halved every `decay_every` refreshes so the warm set follows drift.
+    """
+
+    def __init__(
+        self,
+        top_k: int = 200,
+        refresh_interval_seconds: float = 600.0,
+        ttl_seconds: float = 86400.0,
+        min_count: int = 2,
+        decay_every: int = 6,
+        resolve_concurrency: int = 4,
+        sketch_width: int = 4096,
+        sketch_depth: int = 4,
+    ) -> None:
+        if top_k <= 0:
+            raise ValueError("top_k must be > 0")
+        if refresh_interval_seconds <= 0:
+            raise ValueError("refresh_interval_seconds must be > 0")
+        self.top_k = top_k
+        self.refresh_interval_seconds = refresh_interval_seconds
+        self.ttl_seconds = ttl_seconds
+        self.min_count = min_count
+        self.decay_every = decay_every
+        self.resolve_concurrency = resolve_concurrency
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+        self.refresh_count = 0
+        self.resolve_failures = 0
+        self.refreshed_at: datetime | None = None
+        self.last_refresh_ms: int | None = None
+        self._sketch = CountMinSketch(sketch_width, sketch_depth)
+        self._candidate_capacity = top_k * 4
+        self._candidates: dict[str, int] = {}
+        self._entries: dict[str, _WarmEntry] = {}
+        self._task: asyncio.Task[None] | None = None
+
+    def record(self, query: str) -> None:
+        key = normalize_query(query)
+        if not key:
+            return
+        self.recorded += 1
+        estimate = self._sketch.add(key)
+        if key in self._candidates or len(self._candidates) < self._candidate_capacity:
+            self._candidates[key] = estimate
+            return
+        coldest = min(self._candidates, key=self._candidates.__getitem__)
+        if estimate > self._candidates[coldest]:
+            del self._candidates[coldest]
+            self._candidates[key] = estimate
+
+    def get(self, query: str) -> list[Any] | None:
+        entry = self._entries.get(normalize_query(query))
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return list(entry.value)
+
+    def is_warm(self, query: str) -> bool:
+        return normalize_query(query) in self._entries
+
+    def clear(self) -> None:
+        """Drop resolved results (for example after the search provider changes); counts stay."""
+        self._entries.clear()
+
+    def top_queries(self) -> list[tuple[str, int]]:
+        ranked = sorted(self._candidates.items(), key=lambda item: item[1], reverse=True)
+        return [(key, count) for key, count in ranked[: self.top_k] if count >= self.min_count]
+
+    async def refresh(self, resolver: Callable[[str], Awaitable[list[Any]]]) -> int:
+        """Resolve new and stale top queries and evict warm entries that fell out; returns resolves."""
+        start = time.perf_counter()
+        top = dict(self.top_queries())
+        for key in [key for key in self._entries if key not in top]:
+            del self._entries[key]
+
+        now = time.monotonic()
+        due = [
+            key
+            for key in top
+            if key not in self._entries or now - self._entries[key].resolved_at >= self.ttl_seconds
+        ]
+        slots = asyncio.Semaphore(self.resolve_concurrency)
+
+        async def resolve(key: str) -> bool:
+            async with slots:
+                try:
+                    value = await resolver(key)
+                except Exception:
+                    logger.exception("Warm image cache could not resolve %r.", key)
+                    self.resolve_failures += 1
+                    return False
+            # An empty result is usually a provider hiccup; keep serving the previous one.
+            if value:
+                self._entries[key] = _WarmEntry(value=list(value), resolved_at=time.monotonic())
+            return bool(value)
+
+        resolved = sum(await asyncio.gather(*(resolve(key) for key in due)))
+
+        self.refresh_count += 1
+        if self.decay_every > 0 and self.refresh_count % self.decay_every == 0:
+            self._sketch.decay()
+            self._candidates = {key: count >> 1 for key, count in self._candidates.items() if count >> 1}
+        self.refreshed_at = datetime.now(timezone.utc)
+        self.last_refresh_ms = int((time.perf_counter() - start) * 1000)
+        return resolved
+
+    def start(self, resolver: Callable[[str], Awaitable[list[Any]]]) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_loop(resolver))
+
+    async def _refresh_loop(self, resolver: Callable[[str], Awaitable[list[Any]]]) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_interval_seconds)
+            try:
+                await self.refresh(resolver)
+            except Exception:
+                logger.exception("Warm image cache refresh failed; serving the previous warm set.")
+
+    async def aclose(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "warm_entries": len(self._entries),
+            "top_k": self.top_k,
+            "tracked_queries": len(self._candidates),
+            "recorded_queries": self.recorded,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "refresh_count": self.refresh_count,
+            "resolve_failures": self.resolve_failures,
+            "refreshed_at": self.refreshed_at.isoformat() if self.refreshed_at else None,
+            "last_refresh_ms": self.last_refresh_ms,
+        }
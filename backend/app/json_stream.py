@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import json
+import logging
+from dataclasses import dataclass
+from typing import Any
+
+
+logger = logging.getLogger("menulens")
+
+@dataclass
+class _Frame:
+    kind: str
+    parent_key: str | None
+    key: str | None = None
+    expect_key: bool = False
+
+
+class ArrayItemStreamParser:
+    """Incrementally scans streamed JSON text and returns objects of one top-level array.
+
+    `feed` accepts arbitrary text chunks and returns every element of
+    `{"<array_key>": [{...}, {...}]}` whose closing brace has arrived so far. Text before
+    the first `{` (such as a code fence) is ignored. The parser only tracks nesting and
+    strings; each finished element is decoded with `json.loads`, and elements that do not
+    decode (say, with a trailing comma) are skipped and counted in `skipped_items`.
+    """
+
+    def __init__(self, array_key: str = "items") -> None:
+        self.array_key = array_key
+        self._buffer: list[str] = []
+        self._stack: list[_Frame] = []
+        self._in_string = False
+        self._escaped = False
+        self._string_chars: list[str] = []
+        self._capturing = False
+        self._capture_depth = 0
+        self._done = False
+        self.skipped_items = 0
+
+    def feed(self, chunk: str) -> list[dict[str, Any]]:
+        completed: list[dict[str, Any]] = []
+        for ch in chunk:
+            if self._done:
+                break
+            if self._capturing:
+                self._buffer.append(ch)
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                    if not self._capturing:
+                        self._string_chars.append(ch)
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._close_string()
+                elif not self._capturing:
+                    self._string_chars.append(ch)
+                continue
+
+            if ch == '"':
+                if not self._stack:
+                    continue
+                self._in_string = True
+                self._string_chars = []
+            elif ch in "{[":
+                if not self._stack and ch == "[":
+                    continue
+                top = self._stack[-1] if self._stack else None
+                parent_key = top.key if top is not None and top.kind == "object" else None
+                if self._is_target_array(top) and ch == "{" and not self._capturing:
+                    self._capturing = True
+                    self._capture_depth = len(self._stack) + 1
+                    self._buffer = ["{"]
+                self._stack.append(_Frame(kind="object" if ch == "{" else "array", parent_key=parent_key, expect_key=ch == "{"))
+            elif ch in "}]":
+                if not self._stack:
+                    continue
+                closed_depth = len(self._stack)
+                self._stack.pop()
+                if self._capturing and closed_depth == self._capture_depth:
+                    self._capturing = False
+                    raw_element = "".join(self._buffer)
+                    self._buffer = []
+                    try:
+                        element = json.loads(raw_element)
+                    except json.JSONDecodeError:
+                        self.skipped_items += 1
+                        logger.warning("Skipping streamed item that is not valid JSON: %.200s", raw_element)
+                        continue
+                    if isinstance(element, dict):
+                        completed.append(element)
+                if not self._stack:
+                    self._done = True
+            elif ch == "," and self._stack and self._stack[-1].kind == "object":
+                self._stack[-1].expect_key = True
+        return completed
+
+    def _is_target_array(self, frame: _Frame | None) -> bool:
+        return (
+            frame is not None
+            and frame.kind == "array"
+            and frame.parent_key == self.array_key
+            and len(self._stack) == 2
+        )
+
+    def _close_string(self) -> None:
+        top = self._stack[-1] if self._stack else None
+        if top is not None and top.kind == "object" and top.expect_key and not self._capturing:
+            top.key = "".join(self._string_chars)
+            top.expect_key = False
@@ -1,31 +1,74 @@
+import asyncio
 import base64
+import hmac
+import io
 import json
 import logging
+import math
 import os
 import re
+import signal
+import threading
 import time
+from contextlib import AbstractContextManager, asynccontextmanager, nullcontext
+from collections.abc import Awaitable, Callable, Mapping
+from dataclasses import asdict, dataclass
+from functools import cache
+from pathlib import Path
 from typing import Any
 from urllib.parse import urlparse
 from uuid import uuid4
 
 import httpx
-import google.auth
-from fastapi import FastAPI, File, Form, Header, HTTPException, UploadFile
-from google.auth.transport.requests import Request
-from pydantic import BaseModel
-from dotenv import load_dotenv
-from app.prompts.registry import get_active_prompt_version, render_prompt
-from app.usage import UsageStore
+from fastapi import FastAPI, File, Form, Header, HTTPException, Query, Request, Response, UploadFile
+from pydantic import BaseModel, ValidationError
+from app.admission import AdmissionController, AdmissionRejected, AdmissionTicket
+from app.dishes.dictionary import MenuMatch, load_dish_dictionary, normalize_menu_text
+from app.image_proxy import ImageProxy, ImageProxyError, pillow_modules
+from app.image_warm_cache import WarmImageCache
+from app.json_stream import ArrayItemStreamParser
+from app.menu_layout import MenuRegion, TextBlock, blocks_from_annotation, segment_menu
+from app.profiling import PROFILE_FORMATS, RequestProfiler
+from app.prompts.registry import clear_prompt_cache, get_active_prompt_version, prime_prompts, render_prompt
+from app.replay import ReplayReservation, ScanReplayStore
+from app.responses import FastJSONResponse, encoded_json_response
+from app.scan_jobs import ScanJob, ScanJobQueue, ScanQueueFullError
+from app.settings import Settings, SettingsError, load_settings
+from app.tracing import (
+    NOOP_SPAN,
+    HttpSpanExporter,
+    JsonlSpanExporter,
+    Tracer,
+    TracingTransport,
+    current_trace_id,
+    span as trace_span,
+    trace_id_for,
+)
+from app.traffic_capture import TrafficCapture, note as capture_note, note_image as capture_image
+from app.usage import UsageDecision, UsageStore
+from app.usage_analytics import UsageAnalytics
+from app.usage_backends import build_usage_backend
+
+
+# Variables set by the real environment always win over `.env`, including on reload.
+_PROCESS_ENV_KEYS = frozenset(os.environ)
+
+
+def _apply_dotenv() -> None:
+    # Same search as `load_dotenv()`: this file's directory, then its parents.
+    candidates = (directory / ".env" for directory in Path(__file__).resolve().parents)
+    path = next((candidate for candidate in candidates if candidate.is_file()), None)
+    if path is None:
+        # Deployed containers are configured through the environment and never import python-dotenv.
+        return
+    from dotenv import dotenv_values
 
-try:
-    import firebase_admin
-    from firebase_admin import auth as firebase_auth
-except ImportError:
-    firebase_admin = None
-    firebase_auth = None
+    for key, value in dotenv_values(path).items():
+        if key not in _PROCESS_ENV_KEYS and value is not None:
+            os.environ[key] = value
 
 
-load_dotenv()
+_apply_dotenv()
 
 
 class DetectedType(BaseModel):
@@ -61,6 +104,109 @@ class ScanMenuResponse(BaseModel):
     pipeline_diagnostics: dict[str, Any] | None = None
 
 
+class UsagePeriodSummary(BaseModel):
+    period_ym: str
+    subjects: int
+    total_scans: int
+    exhausted_subjects: int
+    subjects_by_plan: dict[str, int]
+    scans_by_plan: dict[str, int]
+
+
+class UsagePeriodsResponse(BaseModel):
+    refreshed_at: str | None
+    periods: list[UsagePeriodSummary]
+
+
+class UsageSubject(BaseModel):
+    subject_key: str
+    plan: str
+    used_scans: int
+    quota_scans: int
+    remaining_scans: int
+
+
+class UsageTopSubjectsResponse(BaseModel):
+    refreshed_at: str | None
+    period_ym: str | None
+    subjects: list[UsageSubject]
+
+
+class UsageQuotaExhaustionResponse(BaseModel):
+    refreshed_at: str | None
+    period_ym: str | None
+    subjects: int
+    exhausted_subjects: int
+    near_quota_subjects: int
+    near_remaining_threshold: int
+
+
+class ScanJobFailure(BaseModel):
+    status_code: int
+    detail: Any
+
+
+class ScanJobResponse(BaseModel):
+    scan_id: str
+    status: str
+    queue_position: int | None = None
+    wait_ms: int | None = None
+    poll_after_ms: int | None = None
+    result: ScanMenuResponse | None = None
+    error: ScanJobFailure | None = None
+
+
+class ScanJobMetricsResponse(BaseModel):
+    workers: int
+    max_queued: int
+    queue_depth: int
+    running: int
+    submitted: int
+    rejected: int
+    succeeded: int
+    failed: int
+    retained_jobs: int
+    wait_ms_p50: float | None
+    wait_ms_p95: float | None
+    run_ms_p50: float | None
+    run_ms_p95: float | None
+    retry_after_seconds: int
+
+
+class AdmissionMetricsResponse(BaseModel):
+    max_in_flight: int
+    effective_limit: int
+    in_flight: int
+    latency_ewma_ms: int | None
+    target_latency_ms: float
+    class_limits: dict[str, int]
+    waiting: dict[str, int]
+    decisions: dict[str, dict[str, int]]
+    wait_ms_total: dict[str, int]
+    retry_after_seconds: int
+
+
+class WarmImageQuery(BaseModel):
+    query: str
+    estimated_count: int
+    warm: bool
+
+
+class ImageWarmCacheResponse(BaseModel):
+    warm_entries: int
+    top_k: int
+    tracked_queries: int
+    recorded_queries: int
+    hits: int
+    misses: int
+    hit_rate: float | None
+    refresh_count: int
+    resolve_failures: int
+    refreshed_at: str | None
+    last_refresh_ms: int | None
+    top_queries: list[WarmImageQuery]
+
+
 class LlmItem(BaseModel):
     jp_text: str
     price_text: str | None = None
@@ -76,10 +222,123 @@ class LlmOutput(BaseModel):
     items: list[LlmItem]
 
 
-app = FastAPI(title="MenuLens API", version="0.2.0")
+class FusedLlmOutput(LlmOutput):
+    normalized_text: str = ""
+
+
+class VisionLlmOutput(LlmOutput):
+    ocr_text: str = ""
+
+
+# Gemini response schemas (OpenAPI subset). Property order puts `items` last so streamed
+# output reaches the item objects as early as possible.
+_MENU_PARSE_RESPONSE_SCHEMA: dict[str, Any] = {
+    "type": "OBJECT",
+    "properties": {
+        "detected_type": {"type": "STRING"},
+        "items": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {
+                    "jp_text": {"type": "STRING"},
+                    "price_text": {"type": "STRING", "nullable": True},
+                    "en_title": {"type": "STRING"},
+                    "en_description": {"type": "STRING"},
+                    "tags": {"type": "ARRAY", "items": {"type": "STRING"}},
+                    "image_query": {"type": "STRING", "nullable": True},
+                    "confidence": {"type": "NUMBER"},
+                },
+                "required": ["jp_text", "en_title", "en_description", "confidence"],
+                "propertyOrdering": [
+                    "jp_text",
+                    "price_text",
+                    "en_title",
+                    "en_description",
+                    "tags",
+                    "image_query",
+                    "confidence",
+                ],
+            },
+        },
+    },
+    "required": ["detected_type", "items"],
+    "propertyOrdering": ["detected_type", "items"],
+}
+_FUSED_PARSE_RESPONSE_SCHEMA: dict[str, Any] = {
+    **_MENU_PARSE_RESPONSE_SCHEMA,
+    "properties": {"normalized_text": {"type": "STRING"}, **_MENU_PARSE_RESPONSE_SCHEMA["properties"]},
+    "required": ["normalized_text", "detected_type", "items"],
+    "propertyOrdering": ["normalized_text", "detected_type", "items"],
+}
+_VISION_PARSE_RESPONSE_SCHEMA: dict[str, Any] = {
+    **_MENU_PARSE_RESPONSE_SCHEMA,
+    "properties": {"ocr_text": {"type": "STRING"}, **_MENU_PARSE_RESPONSE_SCHEMA["properties"]},
+    "required": ["ocr_text", "detected_type", "items"],
+    "propertyOrdering": ["ocr_text", "detected_type", "items"],
+}
+# Parse prompt name -> (response schema, output model). `OCR_PIPELINE_MODE=fused` uses the
+# fused prompt, which normalizes the OCR text and extracts items in one generation;
+# `gemini_vision` sends the photo itself and has the model transcribe it first.
+_MENU_PARSE_PROMPTS: dict[str, tuple[dict[str, Any], type[LlmOutput]]] = {
+    "menu_parse": (_MENU_PARSE_RESPONSE_SCHEMA, LlmOutput),
+    "menu_parse_fused": (_FUSED_PARSE_RESPONSE_SCHEMA, FusedLlmOutput),
+    "menu_parse_vision": (_VISION_PARSE_RESPONSE_SCHEMA, VisionLlmOutput),
+}
+_PARSE_PROMPT_BY_MODE = {"fused": "menu_parse_fused", "gemini_vision": "menu_parse_vision"}
+_OCR_NORMALIZE_RESPONSE_SCHEMA: dict[str, Any] = {
+    "type": "OBJECT",
+    "properties": {"normalized_text": {"type": "STRING"}},
+    "required": ["normalized_text"],
+}
+
+
+@asynccontextmanager
+async def _lifespan(_: FastAPI):
+    if os.getenv("ENABLE_STARTUP_WARMUP", "true").strip().lower() == "true":
+        await _warm_up()
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, reload_settings)
+    except (NotImplementedError, RuntimeError, AttributeError):
+        pass
+    if _image_warm_cache is not None:
+        _image_warm_cache.start(_resolve_warm_image_query)
+    yield
+    await _scan_job_queue.aclose()
+    if _image_warm_cache is not None:
+        await _image_warm_cache.aclose()
+    await _close_http_client()
+    if _image_proxy is not None:
+        await _image_proxy.aclose()
+    if _usage_analytics is not None:
+        _usage_analytics.close()
+    if _request_profiler is not None:
+        _request_profiler.close()
+    if _tracer is not None:
+        _tracer.close()
+    if _traffic_capture is not None:
+        _traffic_capture.close()
+    _usage_store.close()
+
+
+app = FastAPI(
+    title="MenuLens API",
+    version="0.2.0",
+    default_response_class=FastJSONResponse,
+    lifespan=_lifespan,
+)
 _VERTEX_SCOPE = "https://www.googleapis.com/auth/cloud-platform"
 logger = logging.getLogger("menulens")
 _IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".gif", ".avif", ".bmp")
+_FIELD_PATH_TOKEN_RE = re.compile(r"([^.\[\]]+)|\[(\d+)\]")
+_MAX_VERTEX_WALK_NODES = 2000
+_IMAGE_SEARCH_CONCURRENCY = 8
+_DEFAULT_VERTEX_IMAGE_FIELD_PATHS = (
+    "document.derivedStructData.pagemap.cse_image[0].src",
+    "document.derivedStructData.pagemap.cse_thumbnail[0].src",
+    "document.structData.image_url",
+    "document.structData.thumbnail_url",
+)
 _ENABLE_FIREBASE_AUTH = os.getenv("ENABLE_FIREBASE_AUTH", "false").strip().lower() == "true"
 _FIREBASE_PROJECT_ID = os.getenv("FIREBASE_PROJECT_ID", "").strip()
 _DEV_BYPASS_QUOTA_UIDS = {
@@ -100,19 +359,125 @@ def _env_int(name: str, default: int) -> int:
     return value
 
 
+_settings = load_settings()
+
+
+def get_settings() -> Settings:
+    return _settings
+
+
+def reload_settings() -> Settings:
+    """Re-read `.env` and the environment and swap in a new settings snapshot.
+
+    Requests already in flight keep the snapshot they started with. Boot-time wiring
+    (usage store, replay store, image proxy) is not rebuilt.
+    """
+    global _settings
+    _apply_dotenv()
+    previous_provider = _settings.image_search_provider
+    _settings = load_settings()
+    clear_prompt_cache()
+    if _image_warm_cache is not None and _settings.image_search_provider != previous_provider:
+        _image_warm_cache.clear()
+    logger.info("Settings reloaded. invalid=%s", sorted(_settings.invalid))
+    return _settings
+
+
 _FREE_SCAN_LIMIT_PER_MONTH = _env_int("FREE_SCAN_LIMIT_PER_MONTH", 10)
 _PRO_SCAN_LIMIT_PER_MONTH = _env_int("PRO_SCAN_LIMIT_PER_MONTH", 250)
 _SCAN_USAGE_DB_PATH = os.getenv("SCAN_USAGE_DB_PATH", "scan_usage.db").strip() or "scan_usage.db"
+_SCAN_USAGE_COUNTER_MODE = os.getenv("SCAN_USAGE_COUNTER_MODE", "direct").strip().lower() or "direct"
+_SCAN_USAGE_BACKEND = os.getenv("SCAN_USAGE_BACKEND", "sqlite").strip().lower() or "sqlite"
 _usage_store = UsageStore(
     db_path=_SCAN_USAGE_DB_PATH,
     free_quota=_FREE_SCAN_LIMIT_PER_MONTH,
     pro_quota=_PRO_SCAN_LIMIT_PER_MONTH,
+    counter_mode=_SCAN_USAGE_COUNTER_MODE,
+    flush_interval_seconds=_env_int("SCAN_USAGE_FLUSH_INTERVAL_SECONDS", 5),
+    backend=build_usage_backend(
+        _SCAN_USAGE_BACKEND,
+        db_path=_SCAN_USAGE_DB_PATH,
+        url=os.getenv("SCAN_USAGE_BACKEND_URL", "").strip(),
+        shard_count=_env_int("SCAN_USAGE_SHARDS", 16),
+    ),
+    idempotency_retention_days=_env_int("SCAN_USAGE_IDEMPOTENCY_RETENTION_DAYS", 30),
+    usage_retention_months=_env_int("SCAN_USAGE_RETENTION_MONTHS", 3),
+    compaction_batch_size=_env_int("SCAN_USAGE_COMPACTION_BATCH_SIZE", 500),
+    compaction_interval_seconds=(
+        _env_int("SCAN_USAGE_COMPACTION_INTERVAL_SECONDS", 3600)
+        if os.getenv("ENABLE_USAGE_COMPACTION", "true").strip().lower() == "true"
+        else None
+    ),
+)
+_USAGE_ANALYTICS_API_KEY = os.getenv("USAGE_ANALYTICS_API_KEY", "").strip()
+_usage_analytics = (
+    UsageAnalytics(
+        _usage_store.backend,
+        refresh_interval_seconds=_env_int("USAGE_ANALYTICS_REFRESH_SECONDS", 30),
+        full_resync_interval_seconds=_env_int("USAGE_ANALYTICS_FULL_RESYNC_SECONDS", 3600),
+    )
+    if _USAGE_ANALYTICS_API_KEY
+    else None
+)
+
+
+def _build_image_proxy() -> ImageProxy | None:
+    if os.getenv("ENABLE_IMAGE_PROXY", "false").strip().lower() != "true":
+        return None
+    secret = os.getenv("IMAGE_PROXY_SECRET", "").strip()
+    if not secret:
+        raise RuntimeError("IMAGE_PROXY_SECRET is required when ENABLE_IMAGE_PROXY=true")
+    public_base_url = os.getenv("IMAGE_PROXY_PUBLIC_BASE_URL", "").strip()
+    rewrite_urls = os.getenv("IMAGE_PROXY_REWRITE_URLS", "true").strip().lower() == "true"
+    # The Android image loader cannot resolve relative URLs, so rewritten previews must be absolute.
+    if rewrite_urls and urlparse(public_base_url).scheme not in ("http", "https"):
+        raise RuntimeError(
+            "IMAGE_PROXY_PUBLIC_BASE_URL must be an absolute http(s) URL when IMAGE_PROXY_REWRITE_URLS=true"
+        )
+    return ImageProxy(
+        cache_dir=os.getenv("IMAGE_PROXY_CACHE_DIR", "image_cache").strip() or "image_cache",
+        secret=secret,
+        max_cache_bytes=_env_int("IMAGE_PROXY_CACHE_MAX_MB", 256) * 1024 * 1024,
+        public_base_url=public_base_url,
+    )
+
+
+_image_proxy = _build_image_proxy()
+_REWRITE_IMAGE_URLS = (
+    _image_proxy is not None
+    and os.getenv("IMAGE_PROXY_REWRITE_URLS", "true").strip().lower() == "true"
 )
 
 
+def _build_image_warm_cache() -> WarmImageCache | None:
+    if os.getenv("ENABLE_IMAGE_WARM_CACHE", "false").strip().lower() != "true":
+        return None
+    return WarmImageCache(
+        top_k=_env_int("IMAGE_WARM_CACHE_TOP_K", 200),
+        refresh_interval_seconds=_env_int("IMAGE_WARM_CACHE_REFRESH_SECONDS", 600),
+        ttl_seconds=_env_int("IMAGE_WARM_CACHE_TTL_SECONDS", 86400),
+    )
+
+
+_image_warm_cache = _build_image_warm_cache()
+
+
+@cache
+def _firebase_modules() -> tuple[Any, Any] | None:
+    # Imported on first use: firebase_admin pulls in google-cloud clients and is slow to load.
+    try:
+        import firebase_admin
+        from firebase_admin import auth as firebase_auth
+    except ImportError:
+        return None
+    return firebase_admin, firebase_auth
+
+
 def _ensure_firebase_admin_initialized() -> None:
-    if firebase_admin is None:
+    modules = _firebase_modules()
+    if modules is None:
         raise HTTPException(status_code=500, detail="firebase-admin is not installed")
+    firebase_admin = modules[0]
 
     try:
         firebase_admin.get_app()
@@ -140,7 +505,8 @@ def _resolve_authenticated_uid(authorization: str | None) -> str | None:
             raise HTTPException(status_code=401, detail="Missing Firebase bearer token")
         return None
 
-    if firebase_auth is None:
+    modules = _firebase_modules()
+    if modules is None:
         if _ENABLE_FIREBASE_AUTH:
             raise HTTPException(status_code=500, detail="firebase-admin import failed")
         logger.warning("firebase-admin unavailable; continuing without Firebase identity")
@@ -148,7 +514,7 @@ def _resolve_authenticated_uid(authorization: str | None) -> str | None:
 
     try:
         _ensure_firebase_admin_initialized()
-        decoded = firebase_auth.verify_id_token(token, check_revoked=False)
+        decoded = modules[1].verify_id_token(token, check_revoked=False)
     except Exception as exc:
         if _ENABLE_FIREBASE_AUTH:
             raise HTTPException(status_code=401, detail="Invalid Firebase ID token") from exc
@@ -164,13 +530,109 @@ def _resolve_authenticated_uid(authorization: str | None) -> str | None:
 
 
 def _require_env(name: str) -> str:
-    value = os.getenv(name, "").strip()
-    if not value:
-        raise HTTPException(status_code=500, detail=f"Missing required env var: {name}")
-    return value
+    try:
+        return _settings.require(name)
+    except SettingsError as exc:
+        raise HTTPException(status_code=500, detail=str(exc)) from exc
+
+
+# (loop, client, closer); the closer task closes the client when its loop shuts down.
+_http_client_state: tuple[asyncio.AbstractEventLoop, httpx.AsyncClient, asyncio.Task[None] | None] | None = None
+
+
+def _http_client() -> httpx.AsyncClient:
+    """Shared upstream client, so scans reuse warm TLS connections instead of dialing per call.
+
+    Clients are bound to the event loop they were created on; callers that run several
+    loops in turn (the eval runner, tests) get a fresh client per loop, and the previous
+    client is closed on its own loop.
+    """
+    global _http_client_state
+    loop = asyncio.get_running_loop()
+    if _http_client_state is None or _http_client_state[0] is not loop:
+        if _http_client_state is not None:
+            _retire_http_client(*_http_client_state)
+        limits = httpx.Limits(max_connections=64, max_keepalive_connections=32)
+        if _tracer is not None:
+            client = httpx.AsyncClient(transport=TracingTransport(httpx.AsyncHTTPTransport(limits=limits)))
+        else:
+            client = httpx.AsyncClient(limits=limits)
+        _http_client_state = (loop, client, loop.create_task(_close_when_cancelled(client), name="http-client-closer"))
+    return _http_client_state[1]
 
 
-async def _vision_ocr(image_bytes: bytes, api_key: str) -> str:
+async def _close_when_cancelled(client: httpx.AsyncClient) -> None:
+    # asyncio.run cancels leftover tasks before closing its loop, so loops without a lifespan close it too.
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await client.aclose()
+
+
+def _retire_http_client(
+    loop: asyncio.AbstractEventLoop, client: httpx.AsyncClient, closer: asyncio.Task[None] | None
+) -> None:
+    # Pooled connections can only be closed on the loop that opened them. A closed loop already ran its closer.
+    if closer is not None and not loop.is_closed():
+        loop.call_soon_threadsafe(closer.cancel)
+
+
+async def _close_http_client() -> None:
+    global _http_client_state
+    if _http_client_state is not None:
+        _, client, closer = _http_client_state
+        _http_client_state = None
+        if closer is not None:
+            closer.cancel()
+        await client.aclose()
+
+
+_WARMUP_HOSTS = {
+    "vision": "https://vision.googleapis.com/",
+    "gemini": "https://generativelanguage.googleapis.com/",
+    "cse": "https://www.googleapis.com/",
+    "vertex": "https://discoveryengine.googleapis.com/",
+}
+
+
+async def _warm_up(timeout_seconds: float = 5.0) -> None:
+    """Prime prompts, credentials and upstream connections before the first scan arrives."""
+    start = time.perf_counter()
+    settings = _settings
+    try:
+        prime_prompts()
+    except RuntimeError:
+        logger.exception("Prompt priming failed during warmup.")
+    if settings.dish_dictionary_enabled:
+        try:
+            load_dish_dictionary(settings.dish_dictionary_version)
+        except RuntimeError:
+            logger.exception("Dish dictionary loading failed during warmup.")
+
+    hosts = [_WARMUP_HOSTS["vision"], _WARMUP_HOSTS["gemini"]]
+    if settings.image_search_provider in {"cse", "vertex"}:
+        hosts.append(_WARMUP_HOSTS[settings.image_search_provider])
+    client = _http_client()
+    tasks = [client.head(host, timeout=timeout_seconds) for host in hosts]
+    if settings.image_search_provider == "vertex":
+        tasks.append(asyncio.to_thread(_vertex_access_token))
+    if _ENABLE_FIREBASE_AUTH:
+        tasks.append(asyncio.to_thread(_ensure_firebase_admin_initialized))
+    try:
+        results = await asyncio.wait_for(asyncio.gather(*tasks, return_exceptions=True), timeout=timeout_seconds)
+    except asyncio.TimeoutError:
+        results = []
+        logger.warning("Warmup timed out after %.1fs; continuing startup.", timeout_seconds)
+    failures = [result for result in results if isinstance(result, Exception)]
+    logger.info(
+        "Warmup finished in %d ms. tasks=%s failures=%s",
+        int((time.perf_counter() - start) * 1000),
+        len(tasks),
+        len(failures),
+    )
+
+
+async def _vision_annotate(image_bytes: bytes, api_key: str) -> dict[str, Any]:
     encoded = base64.b64encode(image_bytes).decode("utf-8")
     payload = {
         "requests": [
@@ -181,40 +643,107 @@ async def _vision_ocr(image_bytes: bytes, api_key: str) -> str:
         ]
     }
     url = f"https://vision.googleapis.com/v1/images:annotate?key={api_key}"
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        response = await client.post(url, json=payload)
-        response.raise_for_status()
-        body = response.json()
+    response = await _http_client().post(url, json=payload, timeout=30.0)
+    response.raise_for_status()
+    return response.json().get("responses", [{}])[0]
 
-    ocr_text = (
-        body.get("responses", [{}])[0]
-        .get("fullTextAnnotation", {})
-        .get("text", "")
-        .strip()
-    )
+
+def _vision_text(annotation: dict[str, Any]) -> str:
+    ocr_text = annotation.get("fullTextAnnotation", {}).get("text", "").strip()
     if not ocr_text:
-        annotations = body.get("responses", [{}])[0].get("textAnnotations", [])
+        annotations = annotation.get("textAnnotations", [])
         if annotations:
             ocr_text = annotations[0].get("description", "").strip()
     return ocr_text
 
 
-async def _gemini_normalize_ocr_text(ocr_text: str, api_key: str) -> str:
-    model = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+async def _vision_ocr(image_bytes: bytes, api_key: str) -> str:
+    return _vision_text(await _vision_annotate(image_bytes, api_key))
+
+
+async def _vision_ocr_layout(image_bytes: bytes, api_key: str) -> tuple[str, list[TextBlock]]:
+    """Vision OCR text plus its paragraphs and bounding boxes, for layout-chunked parsing."""
+    annotation = await _vision_annotate(image_bytes, api_key)
+    return _vision_text(annotation), blocks_from_annotation(annotation.get("fullTextAnnotation", {}))
+
+
+@dataclass
+class GeminiTokenUsage:
+    """Token counts summed from the `usageMetadata` of one or more Gemini responses."""
+
+    prompt_tokens: int = 0
+    output_tokens: int = 0
+    calls: int = 0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.output_tokens
+
+    def add(self, usage_metadata: Any) -> None:
+        if not isinstance(usage_metadata, dict):
+            return
+        self.prompt_tokens += int(usage_metadata.get("promptTokenCount") or 0)
+        self.output_tokens += int(usage_metadata.get("candidatesTokenCount") or 0)
+        self.calls += 1
+
+    def as_dict(self) -> dict[str, int]:
+        return {
+            "prompt": self.prompt_tokens,
+            "output": self.output_tokens,
+            "total": self.total_tokens,
+            "calls": self.calls,
+        }
+
+
+def _parse_prompt_name(ocr_pipeline_mode: str) -> str:
+    return _PARSE_PROMPT_BY_MODE.get(ocr_pipeline_mode, "menu_parse")
+
+
+def _prepare_gemini_image(image_bytes: bytes, max_side: int) -> tuple[bytes, str]:
+    """Downscale and re-encode a menu photo for an inline Gemini part.
+
+    Gemini bills images per 768px tile, so capping the long side bounds both the upload
+    and the prompt tokens. Without Pillow, or for images it cannot decode or that exceed
+    its decompression-bomb limit, the original bytes are sent as-is.
+    """
+    pillow = pillow_modules()
+    if pillow is not None:
+        Image, ImageOps = pillow
+        try:
+            with Image.open(io.BytesIO(image_bytes)) as image:
+                image.draft("RGB", (max_side, max_side))
+                image = ImageOps.exif_transpose(image)
+                image.thumbnail((max_side, max_side))
+                output = io.BytesIO()
+                image.convert("RGB").save(output, format="JPEG", quality=85)
+            return output.getvalue(), "image/jpeg"
+        except (OSError, Image.DecompressionBombError):
+            logger.warning("Could not decode menu image for Gemini; sending the original bytes.")
+    if image_bytes.startswith(b"\x89PNG"):
+        return image_bytes, "image/png"
+    if image_bytes[8:12] == b"WEBP":
+        return image_bytes, "image/webp"
+    return image_bytes, "image/jpeg"
+
+
+async def _gemini_normalize_ocr_text(
+    ocr_text: str,
+    api_key: str,
+    token_usage: GeminiTokenUsage | None = None,
+) -> str:
+    model = _settings.gemini_model
     _, prompt = render_prompt("ocr_normalize", ocr_text=ocr_text)
 
     payload = {
         "contents": [{"parts": [{"text": prompt}]}],
-        "generationConfig": {
-            "temperature": 0.0,
-            "responseMimeType": "application/json",
-        },
+        "generationConfig": _gemini_generation_config(0.0, _OCR_NORMALIZE_RESPONSE_SCHEMA),
     }
     url = f"https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent?key={api_key}"
-    async with httpx.AsyncClient(timeout=40.0) as client:
-        response = await client.post(url, json=payload)
-        response.raise_for_status()
-        body = response.json()
+    response = await _http_client().post(url, json=payload, timeout=40.0)
+    response.raise_for_status()
+    body = response.json()
+    if token_usage is not None:
+        token_usage.add(body.get("usageMetadata"))
 
     try:
         text = body["candidates"][0]["content"]["parts"][0]["text"]
@@ -241,36 +770,308 @@ def _extract_json_payload(text: str) -> dict[str, Any]:
     return json.loads(cleaned[start : end + 1])
 
 
-async def _gemini_parse_menu(ocr_text: str, target_lang: str, api_key: str) -> LlmOutput:
-    model = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
-    max_items = _resolve_max_menu_items()
+def _gemini_generation_config(temperature: float, response_schema: dict[str, Any]) -> dict[str, Any]:
+    config: dict[str, Any] = {"temperature": temperature, "responseMimeType": "application/json"}
+    if _settings.gemini_response_schema:
+        config["responseSchema"] = response_schema
+    return config
+
+
+def _menu_parse_payload(
+    ocr_text: str,
+    target_lang: str,
+    prompt_name: str,
+    image: tuple[bytes, str] | None = None,
+) -> dict[str, Any]:
     _, prompt = render_prompt(
-        "menu_parse",
+        prompt_name,
         ocr_text=ocr_text,
         target_lang=target_lang,
-        max_items=max_items,
+        max_items=_resolve_max_menu_items(),
     )
-
-    payload = {
-        "contents": [{"parts": [{"text": prompt}]}],
-        "generationConfig": {
-            "temperature": 0.2,
-            "responseMimeType": "application/json",
-        },
+    parts: list[dict[str, Any]] = [{"text": prompt}]
+    if image is not None:
+        image_data, mime_type = image
+        parts.insert(0, {"inlineData": {"mimeType": mime_type, "data": base64.b64encode(image_data).decode("ascii")}})
+    return {
+        "contents": [{"parts": parts}],
+        "generationConfig": _gemini_generation_config(0.2, _MENU_PARSE_PROMPTS[prompt_name][0]),
     }
+
+
+def _parse_llm_output(text: str, output_model: type[LlmOutput] = LlmOutput) -> LlmOutput:
+    # Schema-constrained output is plain JSON; the fence/brace fallback covers unconstrained runs.
+    try:
+        return output_model.model_validate_json(text)
+    except ValidationError:
+        return output_model.model_validate(_extract_json_payload(text))
+
+
+async def _gemini_parse_menu(
+    ocr_text: str,
+    target_lang: str,
+    api_key: str,
+    prompt_name: str = "menu_parse",
+    token_usage: GeminiTokenUsage | None = None,
+    image: tuple[bytes, str] | None = None,
+) -> LlmOutput:
+    model = _settings.gemini_model
+    payload = _menu_parse_payload(ocr_text, target_lang, prompt_name, image)
     url = f"https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent?key={api_key}"
-    async with httpx.AsyncClient(timeout=40.0) as client:
-        response = await client.post(url, json=payload)
-        response.raise_for_status()
-        body = response.json()
+    response = await _http_client().post(url, json=payload, timeout=40.0)
+    response.raise_for_status()
+    body = response.json()
+    if token_usage is not None:
+        token_usage.add(body.get("usageMetadata"))
 
     try:
         text = body["candidates"][0]["content"]["parts"][0]["text"]
     except (KeyError, IndexError, TypeError) as exc:
         raise ValueError("Gemini response format unexpected") from exc
 
-    parsed = _extract_json_payload(text)
-    return LlmOutput.model_validate(parsed)
+    return _parse_llm_output(text, _MENU_PARSE_PROMPTS[prompt_name][1])
+
+
+async def _gemini_parse_menu_streaming(
+    ocr_text: str,
+    target_lang: str,
+    api_key: str,
+    on_item: Callable[[LlmItem], None],
+    prompt_name: str = "menu_parse",
+    token_usage: GeminiTokenUsage | None = None,
+    image: tuple[bytes, str] | None = None,
+) -> LlmOutput:
+    """Parse via `streamGenerateContent`, calling `on_item` as soon as each item object closes."""
+    model = _settings.gemini_model
+    output_model = _MENU_PARSE_PROMPTS[prompt_name][1]
+    payload = _menu_parse_payload(ocr_text, target_lang, prompt_name, image)
+    url = f"https://generativelanguage.googleapis.com/v1beta/models/{model}:streamGenerateContent?alt=sse&key={api_key}"
+    parser = ArrayItemStreamParser("items")
+    chunks: list[str] = []
+    streamed_items: list[LlmItem] = []
+    usage_metadata: Any = None
+    async with _http_client().stream("POST", url, json=payload, timeout=40.0) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            try:
+                event = json.loads(line[len("data:") :])
+            except json.JSONDecodeError:
+                # A truncated or injected line loses at most its own text; the whole output is still parsed below.
+                logger.warning("Skipping Gemini stream line that is not valid JSON: %.200s", line)
+                continue
+            if not isinstance(event, dict):
+                continue
+            # Every event repeats the running token counts; only the last one is kept.
+            usage_metadata = event.get("usageMetadata", usage_metadata)
+            try:
+                parts = event["candidates"][0]["content"]["parts"]
+            except (KeyError, IndexError, TypeError):
+                continue
+            text = "".join(str(part.get("text", "")) for part in parts)
+            if not text:
+                continue
+            chunks.append(text)
+            for raw_item in parser.feed(text):
+                try:
+                    item = LlmItem.model_validate(raw_item)
+                except ValidationError:
+                    logger.warning("Skipping invalid streamed menu item: %s", raw_item)
+                    continue
+                streamed_items.append(item)
+                on_item(item)
+    if token_usage is not None:
+        token_usage.add(usage_metadata)
+
+    try:
+        output = _parse_llm_output("".join(chunks), output_model)
+    except ValueError:
+        if not streamed_items:
+            raise
+        logger.warning("Streamed Gemini output did not parse as a whole; using %s streamed items.", len(streamed_items))
+        return output_model(items=streamed_items)
+    if streamed_items:
+        output.items = streamed_items
+    return output
+
+
+@dataclass
+class RegionParseResult:
+    output: LlmOutput
+    item_regions: list[int]
+    regions: list[dict[str, Any]]
+
+
+def _layout_regions(ocr_text: str, text_blocks: list[TextBlock]) -> list[MenuRegion]:
+    regions = segment_menu(
+        text_blocks,
+        max_chars=_checked_setting("LAYOUT_REGION_MAX_CHARS").layout_region_max_chars,
+        max_regions=_checked_setting("LAYOUT_MAX_REGIONS").layout_max_regions,
+    )
+    if regions:
+        return regions
+    # Vision returned text without paragraph geometry; parse it as one region.
+    return [MenuRegion([TextBlock(ocr_text, 0, 0, 0, 0)])]
+
+
+async def _gemini_parse_menu_regions(
+    regions: list[MenuRegion],
+    target_lang: str,
+    api_key: str,
+    token_usage: GeminiTokenUsage | None = None,
+    on_item: Callable[[LlmItem], None] | None = None,
+) -> RegionParseResult:
+    """Parse each layout region in its own concurrent Gemini call, then merge the items.
+
+    Items keep region order; an item named in several regions is kept once, from the
+    region that gave it the highest confidence. A region that fails only loses its own
+    items unless every region fails. `on_item` sees each region's items as soon as that
+    region finishes.
+    """
+
+    async def parse_region(region: MenuRegion) -> tuple[LlmOutput, int]:
+        start = time.perf_counter()
+        output = await _gemini_parse_menu(
+            ocr_text=region.text,
+            target_lang=target_lang,
+            api_key=api_key,
+            token_usage=token_usage,
+        )
+        if on_item is not None:
+            for item in output.items:
+                on_item(item)
+        return output, int((time.perf_counter() - start) * 1000)
+
+    results = await asyncio.gather(*(parse_region(region) for region in regions), return_exceptions=True)
+    if all(isinstance(result, BaseException) for result in results):
+        raise results[0]
+
+    items: list[LlmItem] = []
+    item_regions: list[int] = []
+    positions: dict[str, int] = {}
+    detected_types: list[str] = []
+    region_diagnostics: list[dict[str, Any]] = []
+    for region_index, (region, result) in enumerate(zip(regions, results)):
+        diagnostics: dict[str, Any] = {
+            "region_index": region_index,
+            "bbox": list(region.bbox),
+            "char_count": region.char_count,
+        }
+        region_diagnostics.append(diagnostics)
+        if isinstance(result, BaseException):
+            logger.warning("Menu parse failed for layout region %s: %s", region_index, result)
+            diagnostics.update(item_count=0, error=str(result))
+            continue
+        output, latency_ms = result
+        diagnostics.update(item_count=len(output.items), latency_ms=latency_ms)
+        detected_types.append(output.detected_type)
+        for item in output.items:
+            key = _normalize_for_match(item.jp_text)
+            if key in positions:
+                position = positions[key]
+                if item.confidence > items[position].confidence:
+                    items[position] = item
+                    item_regions[position] = region_index
+                continue
+            positions[key] = len(items)
+            items.append(item)
+            item_regions.append(region_index)
+
+    detected_type = max(set(detected_types), key=detected_types.count) if detected_types else "dish"
+    return RegionParseResult(
+        output=LlmOutput.model_construct(detected_type=detected_type, items=items),
+        item_regions=item_regions,
+        regions=region_diagnostics,
+    )
+
+
+_DISH_DICTIONARY_MODES = ("vision_only", "hybrid")
+_DISH_DICTIONARY_CONFIDENCE = 0.9
+
+
+@dataclass
+class DishDictionaryPlan:
+    """How one scan splits between the local dish dictionary and Gemini.
+
+    When enough menu lines are covered, matched dishes are filled from the dictionary and
+    Gemini only sees the remaining lines (or nothing, if every line matched). Below the
+    coverage threshold the dictionary is ignored and Gemini parses the whole menu.
+    """
+
+    version: str
+    source_text: str
+    match: MenuMatch
+    items: list[tuple[int, LlmItem]]
+
+    @property
+    def applied(self) -> bool:
+        return bool(self.items)
+
+    @property
+    def llm_text(self) -> str:
+        return self.match.unmatched_text if self.applied else self.source_text
+
+    @property
+    def skips_llm(self) -> bool:
+        return self.applied and self.match.matched_lines == self.match.candidate_lines
+
+    def merge(self, output: LlmOutput) -> LlmOutput:
+        """Combine dictionary and Gemini items in menu line order, dictionary first on ties."""
+        if not self.applied:
+            return output
+        lines = [normalize_menu_text(line) for line in self.source_text.splitlines()]
+        seen = {normalize_menu_text(item.jp_text) for _, item in self.items}
+        ordered = list(self.items)
+        for item in output.items:
+            key = normalize_menu_text(item.jp_text)
+            if not key or key in seen:
+                continue
+            seen.add(key)
+            line_index = next((index for index, line in enumerate(lines) if key in line), len(lines))
+            ordered.append((line_index, item))
+        ordered.sort(key=lambda entry: entry[0])
+        return LlmOutput.model_construct(detected_type=output.detected_type, items=[item for _, item in ordered])
+
+    def diagnostics(self) -> dict[str, Any]:
+        return {
+            "version": self.version,
+            "line_coverage": round(self.match.coverage, 3),
+            "matched_items": len(self.items),
+            "llm_lines": len(self.match.unmatched_lines) if self.applied else None,
+            "llm_skipped": self.skips_llm,
+        }
+
+
+def _plan_dish_dictionary(ocr_pipeline_mode: str, target_lang: str, source_text: str) -> DishDictionaryPlan | None:
+    settings = _checked_setting("DISH_DICTIONARY_MIN_COVERAGE_PCT")
+    # Dictionary entries are English, and the fused/vision modes read text the dictionary never sees.
+    if (
+        not settings.dish_dictionary_enabled
+        or ocr_pipeline_mode not in _DISH_DICTIONARY_MODES
+        or target_lang.strip().lower() not in {"en", "english"}
+    ):
+        return None
+    dictionary = load_dish_dictionary(settings.dish_dictionary_version)
+    match = dictionary.match_menu(source_text)
+    items: list[tuple[int, LlmItem]] = []
+    if match.coverage >= settings.dish_dictionary_min_coverage and match.matches:
+        items = [
+            (
+                dish.line_index,
+                LlmItem.model_construct(
+                    jp_text=dish.surface,
+                    price_text=dish.price_text,
+                    en_title=dish.entry.en_title,
+                    en_description=dish.entry.en_description,
+                    tags=list(dish.entry.tags),
+                    image_query=dish.entry.image_query,
+                    confidence=_DISH_DICTIONARY_CONFIDENCE,
+                ),
+            )
+            for dish in match.matches
+        ]
+    return DishDictionaryPlan(version=dictionary.version, source_text=source_text, match=match, items=items)
 
 
 def _normalize_for_match(value: str) -> str:
@@ -291,25 +1092,110 @@ def _jp_chars(value: str) -> list[str]:
     return chars
 
 
-def _calc_item_match_score(item_jp_text: str, source_text: str) -> float:
+_MATCH_NGRAM_MAX = 4
+_JP_CANDIDATE_CHUNK_RE = re.compile(r"[\u3041-\u3093\u30A1-\u30F3\u4E00-\u9FAF\u30FC]{2,}")
+_MATCH_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+@dataclass(frozen=True)
+class OcrSourceIndex:
+    """Per-scan view of the OCR source text, built once and shared by every item.
+
+    Fragments up to `_MATCH_NGRAM_MAX` characters are looked up in the n-gram sets. Longer
+    ones go through `ngram_starts`, the start offsets of every lowercase `_MATCH_NGRAM_MAX`-gram:
+    the windows tiling the fragment must all occur at offsets consistent with one start, so
+    no lookup rescans the source text.
+    """
+
+    normalized: str
+    normalized_lower: str
+    jp_chars: frozenset[str]
+    tokens: frozenset[str]
+    ngrams: frozenset[str]
+    exact_ngrams: frozenset[str]
+    ngram_starts: Mapping[str, frozenset[int]]
+    candidate_count: int
+
+    def match_starts_lower(self, fragment: str) -> list[int]:
+        """Offsets in `normalized_lower` where a lowercase fragment of at least `_MATCH_NGRAM_MAX` chars starts."""
+        offsets = list(range(0, len(fragment) - _MATCH_NGRAM_MAX + 1, _MATCH_NGRAM_MAX))
+        if offsets[-1] != len(fragment) - _MATCH_NGRAM_MAX:
+            offsets.append(len(fragment) - _MATCH_NGRAM_MAX)
+        windows: list[tuple[int, frozenset[int]]] = []
+        for offset in offsets:
+            starts = self.ngram_starts.get(fragment[offset : offset + _MATCH_NGRAM_MAX])
+            if starts is None:
+                return []
+            windows.append((offset, starts))
+        anchor_offset, anchor_starts = min(windows, key=lambda window: len(window[1]))
+        return sorted(
+            start - anchor_offset
+            for start in anchor_starts
+            if all(start - anchor_offset + offset in starts for offset, starts in windows)
+        )
+
+    def contains_lower(self, fragment: str) -> bool:
+        if len(fragment) <= _MATCH_NGRAM_MAX:
+            return bool(fragment) and fragment in self.ngrams
+        return bool(self.match_starts_lower(fragment))
+
+    def contains(self, fragment: str) -> bool:
+        if len(fragment) <= _MATCH_NGRAM_MAX:
+            return bool(fragment) and fragment in self.exact_ngrams
+        fragment_lower = fragment.lower()
+        if len(fragment_lower) != len(fragment) or len(self.normalized_lower) != len(self.normalized):
+            # Lowercasing changed a length (e.g. "İ"), so lowercase offsets do not line up with the source.
+            return fragment in self.normalized
+        return any(
+            self.normalized.startswith(fragment, start) for start in self.match_starts_lower(fragment_lower)
+        )
+
+
+def _build_ocr_source_index(source_text: str) -> OcrSourceIndex:
+    normalized = _normalize_for_match(source_text)
+    normalized_lower = normalized.lower()
+    ngrams: set[str] = set()
+    exact_ngrams: set[str] = set()
+    for size in range(1, _MATCH_NGRAM_MAX + 1):
+        for start in range(len(normalized_lower) - size + 1):
+            ngrams.add(normalized_lower[start : start + size])
+        for start in range(len(normalized) - size + 1):
+            exact_ngrams.add(normalized[start : start + size])
+    ngram_starts: dict[str, set[int]] = {}
+    for start in range(len(normalized_lower) - _MATCH_NGRAM_MAX + 1):
+        ngram_starts.setdefault(normalized_lower[start : start + _MATCH_NGRAM_MAX], set()).add(start)
+    return OcrSourceIndex(
+        normalized=normalized,
+        normalized_lower=normalized_lower,
+        jp_chars=frozenset(_jp_chars(normalized)),
+        tokens=frozenset(_MATCH_TOKEN_RE.findall(normalized_lower)),
+        ngrams=frozenset(ngrams),
+        exact_ngrams=frozenset(exact_ngrams),
+        ngram_starts={gram: frozenset(starts) for gram, starts in ngram_starts.items()},
+        candidate_count=_estimate_ocr_candidate_count(source_text),
+    )
+
+
+def _calc_item_match_score(item_jp_text: str, source_index: OcrSourceIndex) -> float:
     item_clean = _normalize_for_match(item_jp_text)
-    source_clean = _normalize_for_match(source_text)
-    if not item_clean or not source_clean:
+    if not item_clean or not source_index.normalized:
         return 0.0
 
-    if item_clean in source_clean:
+    if source_index.contains(item_clean):
         return 1.0
 
     item_jp = _jp_chars(item_clean)
     if item_jp:
         unique = set(item_jp)
-        hits = sum(1 for ch in unique if ch in source_clean)
+        hits = sum(1 for ch in unique if ch in source_index.jp_chars)
         return hits / max(1, len(unique))
 
-    tokens = re.findall(r"[a-z0-9]+", item_clean.lower())
+    tokens = _MATCH_TOKEN_RE.findall(item_clean.lower())
     if not tokens:
         return 0.0
-    hits = sum(1 for token in tokens if token in source_clean.lower())
+    hits = sum(
+        1 for token in tokens if token in source_index.tokens or source_index.contains_lower(token)
+    )
     return hits / max(1, len(tokens))
 
 
@@ -317,14 +1203,14 @@ def _build_ocr_diagnostics(
     *,
     item_jp_text: str,
     en_title: str,
-    source_text_for_matching: str,
+    source_index: OcrSourceIndex,
     ocr_pipeline: str,
     normalization_changed: bool,
     vision_text_len: int,
     normalized_text_len: int | None,
     llm_confidence: float,
 ) -> tuple[dict[str, Any], float]:
-    match_score = _calc_item_match_score(item_jp_text=item_jp_text, source_text=source_text_for_matching)
+    match_score = _calc_item_match_score(item_jp_text=item_jp_text, source_index=source_index)
     source_quality = max(0.0, min(1.0, vision_text_len / 180.0))
     if normalization_changed:
         source_quality = min(1.0, source_quality + 0.05)
@@ -390,10 +1276,9 @@ async def _image_search(query: str, api_key: str, cx: str) -> list[ImagePreview]
         "q": query,
     }
     url = "https://www.googleapis.com/customsearch/v1"
-    async with httpx.AsyncClient(timeout=20.0) as client:
-        response = await client.get(url, params=params)
-        response.raise_for_status()
-        body = response.json()
+    response = await _http_client().get(url, params=params, timeout=20.0)
+    response.raise_for_status()
+    body = response.json()
 
     items = body.get("items", [])[:2]
     previews: list[ImagePreview] = []
@@ -414,10 +1299,22 @@ async def _image_search_safe(query: str, api_key: str, cx: str) -> list[ImagePre
         return []
 
 
+_vertex_credentials: Any = None
+_vertex_credentials_lock = threading.Lock()
+
+
 def _vertex_access_token() -> str:
-    credentials, _ = google.auth.default(scopes=[_VERTEX_SCOPE])
-    credentials.refresh(Request())
-    token = credentials.token
+    # google.auth is imported on first use and credentials are only refreshed once expired.
+    global _vertex_credentials
+    import google.auth
+    from google.auth.transport.requests import Request
+
+    with _vertex_credentials_lock:
+        if _vertex_credentials is None:
+            _vertex_credentials, _ = google.auth.default(scopes=[_VERTEX_SCOPE])
+        if not _vertex_credentials.valid:
+            _vertex_credentials.refresh(Request())
+        token = _vertex_credentials.token
     if not token:
         raise HTTPException(status_code=500, detail="Failed to acquire Vertex access token")
     return token
@@ -428,33 +1325,6 @@ def _is_http_url(value: str) -> bool:
     return lowered.startswith("http://") or lowered.startswith("https://")
 
 
-def _collect_url_candidates(payload: Any, key_path: str = "") -> list[tuple[str, str]]:
-    candidates: list[tuple[str, str]] = []
-    stack: list[tuple[str, Any]] = [(key_path, payload)]
-    visited = 0
-
-    while stack and visited < 2000:
-        path, current = stack.pop()
-        visited += 1
-
-        if isinstance(current, dict):
-            for key, value in current.items():
-                child_path = f"{path}.{key}" if path else str(key)
-                stack.append((child_path, value))
-            continue
-
-        if isinstance(current, list):
-            for idx, value in enumerate(current):
-                child_path = f"{path}[{idx}]"
-                stack.append((child_path, value))
-            continue
-
-        if isinstance(current, str) and _is_http_url(current):
-            candidates.append((path.lower(), current))
-
-    return candidates
-
-
 def _is_likely_image_url(key_hint: str, url: str) -> bool:
     parsed = urlparse(url)
     path = parsed.path.lower()
@@ -470,25 +1340,138 @@ def _is_likely_image_url(key_hint: str, url: str) -> bool:
     return False
 
 
-def _pick_image_url_from_vertex_result(result: dict[str, Any]) -> str | None:
-    candidates = _collect_url_candidates(result)
-    if not candidates:
-        return None
+def _parse_field_path(path: str) -> tuple[str | int, ...]:
+    return tuple(int(index) if index else key for key, index in _FIELD_PATH_TOKEN_RE.findall(path.strip()))
 
-    ranked = sorted(
-        candidates,
-        key=lambda item: (
-            0 if _is_likely_image_url(item[0], item[1]) else 1,
-            0 if "image" in item[0] else 1,
-            0 if "thumbnail" in item[0] else 1,
-            len(item[0]),
-        ),
+
+def _format_field_path(parts: tuple[str | int, ...]) -> str:
+    path = ""
+    for part in parts:
+        if isinstance(part, int):
+            path = f"{path}[{part}]"
+        else:
+            path = f"{path}.{part}" if path else part
+    return path
+
+
+def _lookup_field_path(payload: Any, parts: tuple[str | int, ...]) -> Any:
+    current = payload
+    for part in parts:
+        if isinstance(part, int):
+            if not isinstance(current, list) or part >= len(current):
+                return None
+        elif not isinstance(current, dict) or part not in current:
+            return None
+        current = current[part]
+    return current
+
+
+def _image_url_rank(key_hint: str) -> tuple[int, int, int]:
+    return (
+        0 if "image" in key_hint else 1,
+        0 if "thumbnail" in key_hint else 1,
+        len(key_hint),
     )
 
-    for key_hint, url in ranked:
-        if _is_likely_image_url(key_hint, url):
-            return url
-    return None
+
+def _is_strong_image_field(key_hint: str) -> bool:
+    return "image" in key_hint or "thumbnail" in key_hint
+
+
+def _walk_for_image_url(payload: Any) -> tuple[str | None, tuple[str | int, ...] | None]:
+    # Stack entries are (node, key, parent_entry); paths are only materialized for URL leaves.
+    stack: list[tuple[Any, str | int | None, Any]] = [(payload, None, None)]
+    visited = 0
+    best: tuple[tuple[int, int, int], str, tuple[str | int, ...]] | None = None
+
+    while stack and visited < _MAX_VERTEX_WALK_NODES:
+        entry = stack.pop()
+        current = entry[0]
+        visited += 1
+
+        if isinstance(current, dict):
+            stack.extend((value, key, entry) for key, value in current.items())
+            continue
+        if isinstance(current, list):
+            stack.extend((value, idx, entry) for idx, value in enumerate(current))
+            continue
+        if not isinstance(current, str) or not _is_http_url(current):
+            continue
+
+        parts: list[str | int] = []
+        node = entry
+        while node is not None and node[1] is not None:
+            parts.append(node[1] if isinstance(node[1], int) else str(node[1]))
+            node = node[2]
+        path = tuple(reversed(parts))
+        key_hint = _format_field_path(path).lower()
+        if not _is_likely_image_url(key_hint, current):
+            continue
+        if _is_strong_image_field(key_hint):
+            return current, path
+        rank = _image_url_rank(key_hint)
+        if best is None or rank < best[0]:
+            best = (rank, current, path)
+
+    if best is None:
+        return None, None
+    return best[1], best[2]
+
+
+class VertexImageExtractor:
+    """Resolves a preview image URL from a Vertex search result.
+
+    Configured field paths are looked up directly, then paths learned from earlier
+    results; only when none of them yields an image URL does it walk the result. Only
+    walk matches under an image or thumbnail field are learned, so a one-off hit on a
+    generic field cannot shadow better candidates for later results.
+    """
+
+    def __init__(self, known_paths: list[str], max_learned_paths: int = 8) -> None:
+        self._known_paths = [
+            (parts, _format_field_path(parts).lower()) for parts in map(_parse_field_path, known_paths) if parts
+        ]
+        self._learned_paths: list[tuple[tuple[str | int, ...], str]] = []
+        self._max_learned_paths = max_learned_paths
+        self.fast_path_hits = 0
+        self.walk_fallbacks = 0
+
+    @property
+    def learned_paths(self) -> list[str]:
+        return [_format_field_path(parts) for parts, _ in self._learned_paths]
+
+    def pick(self, result: dict[str, Any]) -> str | None:
+        for parts, key_hint in (*self._known_paths, *self._learned_paths):
+            value = _lookup_field_path(result, parts)
+            if isinstance(value, str) and _is_http_url(value) and _is_likely_image_url(key_hint, value):
+                self.fast_path_hits += 1
+                return value
+
+        self.walk_fallbacks += 1
+        url, parts = _walk_for_image_url(result)
+        if parts and _is_strong_image_field(_format_field_path(parts).lower()):
+            self._learn(parts)
+        return url
+
+    def _learn(self, parts: tuple[str | int, ...]) -> None:
+        entry = (parts, _format_field_path(parts).lower())
+        if entry in self._learned_paths:
+            self._learned_paths.remove(entry)
+        self._learned_paths.insert(0, entry)
+        del self._learned_paths[self._max_learned_paths :]
+
+
+_vertex_image_extractor = VertexImageExtractor(
+    [
+        path
+        for path in os.getenv("VERTEX_IMAGE_FIELD_PATHS", ",".join(_DEFAULT_VERTEX_IMAGE_FIELD_PATHS)).split(",")
+        if path.strip()
+    ]
+)
+
+
+def _pick_image_url_from_vertex_result(result: dict[str, Any]) -> str | None:
+    return _vertex_image_extractor.pick(result)
 
 
 async def _vertex_search(
@@ -512,10 +1495,9 @@ async def _vertex_search(
     }
     headers = {"Authorization": f"Bearer {access_token}"}
 
-    async with httpx.AsyncClient(timeout=20.0) as client:
-        response = await client.post(url, json=payload, headers=headers)
-        response.raise_for_status()
-        body = response.json()
+    response = await _http_client().post(url, json=payload, headers=headers, timeout=20.0)
+    response.raise_for_status()
+    body = response.json()
 
     previews: list[ImagePreview] = []
     first_result = None
@@ -569,45 +1551,40 @@ async def _vertex_search_safe(
         return []
 
 
+def _checked_setting(name: str, settings: Settings | None = None) -> Settings:
+    settings = settings or _settings
+    try:
+        settings.check(name)
+    except SettingsError as exc:
+        raise HTTPException(status_code=500, detail=str(exc)) from exc
+    return settings
+
+
 def _resolve_image_search_provider() -> str:
-    provider = os.getenv("IMAGE_SEARCH_PROVIDER", "cse").strip().lower()
-    if not provider:
-        return "cse"
-    if provider not in {"none", "cse", "vertex"}:
-        raise HTTPException(
-            status_code=500,
-            detail=(
-                "Invalid IMAGE_SEARCH_PROVIDER. "
-                "Use one of: none, cse, vertex."
-            ),
-        )
-    return provider
+    return _checked_setting("IMAGE_SEARCH_PROVIDER").image_search_provider
 
 
 def _resolve_ocr_pipeline_mode() -> str:
-    mode = os.getenv("OCR_PIPELINE_MODE", "hybrid").strip().lower()
-    if mode not in {"vision_only", "hybrid"}:
-        raise HTTPException(
-            status_code=500,
-            detail="Invalid OCR_PIPELINE_MODE. Use one of: vision_only, hybrid.",
-        )
-    return mode
+    return _checked_setting("OCR_PIPELINE_MODE").ocr_pipeline_mode
 
 
 def _resolve_max_menu_items() -> int:
-    raw = os.getenv("MAX_MENU_ITEMS", "10").strip()
-    try:
-        value = int(raw)
-    except ValueError as exc:
-        raise HTTPException(status_code=500, detail="Invalid MAX_MENU_ITEMS. Use an integer between 1 and 20.") from exc
-    if value < 1 or value > 20:
-        raise HTTPException(status_code=500, detail="Invalid MAX_MENU_ITEMS. Use an integer between 1 and 20.")
-    return value
+    return _checked_setting("MAX_MENU_ITEMS").max_menu_items
+
+
+def _resolve_max_scan_items(ocr_pipeline_mode: str) -> int:
+    # Layout-chunked scans apply MAX_MENU_ITEMS per region, so the response cap is separate.
+    if ocr_pipeline_mode == "layout_chunked":
+        return _checked_setting("LAYOUT_MAX_TOTAL_ITEMS").layout_max_total_items
+    return _resolve_max_menu_items()
+
+
+def _resolve_gemini_vision_max_image_side() -> int:
+    return _checked_setting("GEMINI_VISION_MAX_IMAGE_SIDE").gemini_vision_max_image_side
 
 
 def _estimate_ocr_candidate_count(ocr_text: str) -> int:
-    jp_chunks = re.findall(r"[\u3041-\u3093\u30A1-\u30F3\u4E00-\u9FAF\u30FC]{2,}", ocr_text)
-    unique_chunks = {chunk.strip() for chunk in jp_chunks if chunk.strip()}
+    unique_chunks = {chunk.strip() for chunk in _JP_CANDIDATE_CHUNK_RE.findall(ocr_text) if chunk.strip()}
     return len(unique_chunks)
 
 
@@ -636,6 +1613,24 @@ async def _image_search_by_provider(
     raise ValueError(f"Unsupported image search provider: {provider}")
 
 
+async def _resolve_warm_image_query(query: str) -> list[ImagePreview]:
+    # Runs in the background, outside any request, so it reads the current snapshot directly.
+    settings = _settings
+    provider = settings.image_search_provider
+    if provider == "none":
+        return []
+    return await _image_search_by_provider(
+        query=query,
+        provider=provider,
+        cse_api_key=settings.credentials["GOOGLE_CSE_API_KEY"],
+        cse_cx=settings.credentials["GOOGLE_CSE_CX"],
+        vertex_project_id=settings.credentials["GCP_PROJECT_ID"],
+        vertex_location=settings.credentials["VERTEX_SEARCH_LOCATION"],
+        vertex_app_id=settings.credentials["VERTEX_SEARCH_APP_ID"],
+        vertex_access_token=await asyncio.to_thread(_vertex_access_token) if provider == "vertex" else "",
+    )
+
+
 def _fallback_response() -> ScanMenuResponse:
     return ScanMenuResponse(
         scan_id=str(uuid4()),
@@ -657,6 +1652,133 @@ def _fallback_response() -> ScanMenuResponse:
     )
 
 
+def _build_scan_replay_store() -> ScanReplayStore | None:
+    if os.getenv("ENABLE_SCAN_REPLAY", "false").strip().lower() != "true":
+        return None
+    return ScanReplayStore(
+        db_path=os.getenv("SCAN_REPLAY_DB_PATH", "scan_replay.db").strip() or "scan_replay.db",
+        wait_timeout_seconds=_env_int("SCAN_REPLAY_WAIT_SECONDS", 30),
+        retention_days=_env_int("SCAN_REPLAY_RETENTION_DAYS", 7),
+    )
+
+
+_scan_replay_store = _build_scan_replay_store()
+_SCAN_RESPONSE_VERBOSE = os.getenv("SCAN_RESPONSE_VERBOSE", "true").strip().lower() == "true"
+_scan_job_queue = ScanJobQueue(
+    workers=_env_int("SCAN_JOB_WORKERS", 4),
+    max_queued=_env_int("SCAN_JOB_MAX_QUEUED", 32),
+    result_ttl_seconds=_env_int("SCAN_JOB_RESULT_TTL_SECONDS", 600),
+)
+_SCAN_JOB_MAX_WAIT_SECONDS = 30
+_SCAN_JOB_POLL_AFTER_MS = 1000
+_admission_controller = (
+    AdmissionController(
+        max_in_flight=_env_int("ADMISSION_MAX_IN_FLIGHT", 16),
+        target_latency_ms=_env_int("ADMISSION_TARGET_LATENCY_MS", 15000),
+        max_wait_seconds=_env_int("ADMISSION_MAX_WAIT_SECONDS", 10),
+        free_max_wait_seconds=_env_int("ADMISSION_FREE_MAX_WAIT_SECONDS", 2),
+        max_waiting=_env_int("ADMISSION_MAX_WAITING", 64),
+    )
+    if os.getenv("ENABLE_ADMISSION_CONTROL", "false").strip().lower() == "true"
+    else None
+)
+
+
+def _build_request_profiler() -> RequestProfiler | None:
+    if os.getenv("ENABLE_REQUEST_PROFILING", "false").strip().lower() != "true":
+        return None
+    signing_key = os.getenv("PROFILE_SIGNING_KEY", "").strip()
+    raw_rate = os.getenv("PROFILE_SAMPLE_RATE", "0").strip()
+    try:
+        sample_rate = float(raw_rate)
+    except ValueError as exc:
+        raise RuntimeError(f"Invalid number for PROFILE_SAMPLE_RATE: {raw_rate}") from exc
+    if not 0.0 <= sample_rate <= 1.0:
+        raise RuntimeError("PROFILE_SAMPLE_RATE must be between 0 and 1")
+    if not signing_key and sample_rate == 0.0:
+        raise RuntimeError("PROFILE_SIGNING_KEY or PROFILE_SAMPLE_RATE is required when ENABLE_REQUEST_PROFILING=true")
+    return RequestProfiler(
+        output_dir=os.getenv("PROFILE_OUTPUT_DIR", "profiles").strip() or "profiles",
+        signing_key=signing_key,
+        sample_rate=sample_rate,
+        interval_ms=_env_int("PROFILE_SAMPLE_INTERVAL_MS", 5),
+        max_profiles=_env_int("PROFILE_MAX_STORED", 200),
+        trace_memory=os.getenv("PROFILE_TRACE_MEMORY", "false").strip().lower() == "true",
+    )
+
+
+_request_profiler = _build_request_profiler()
+# Random sampling only picks scans; a signed X-Profile-Token profiles any request.
+_SAMPLED_PROFILE_PATHS = {"/v1/scan_menu", "/v1/scan_jobs"}
+
+
+async def _profile_request(request: Request, call_next: Callable[[Request], Awaitable[Response]]) -> Response:
+    sampled = request.method == "POST" and request.url.path in _SAMPLED_PROFILE_PATHS
+    if not _request_profiler.should_profile(request.headers.get("x-profile-token"), sampled=sampled):
+        return await call_next(request)
+    async with _request_profiler.profile(f"{request.method} {request.url.path}") as profile:
+        response = await call_next(request)
+    response.headers["X-Profile-Id"] = profile.profile_id
+    return response
+
+
+if _request_profiler is not None:
+    app.middleware("http")(_profile_request)
+
+
+def _build_tracer() -> Tracer | None:
+    if os.getenv("ENABLE_TRACING", "false").strip().lower() != "true":
+        return None
+    export_url = os.getenv("TRACE_EXPORT_URL", "").strip()
+    max_queued_batches = _env_int("TRACE_EXPORT_MAX_QUEUED_BATCHES", 1000)
+    if export_url:
+        return Tracer(HttpSpanExporter(export_url, max_queued_batches=max_queued_batches))
+    export_path = os.getenv("TRACE_EXPORT_PATH", "traces.jsonl").strip() or "traces.jsonl"
+    return Tracer(JsonlSpanExporter(export_path, max_queued_batches=max_queued_batches))
+
+
+_tracer = _build_tracer()
+
+
+def _scan_trace(name: str, request_id: str | None, parent_id: str | None = None) -> AbstractContextManager[Any]:
+    """Root span for one scan; the client's `request_id` becomes the trace id."""
+    if _tracer is None:
+        return nullcontext(NOOP_SPAN)
+    return _tracer.trace(name, trace_id_for(request_id), parent_id=parent_id, request_id=request_id)
+
+
+def _build_traffic_capture() -> TrafficCapture | None:
+    if os.getenv("ENABLE_TRAFFIC_CAPTURE", "false").strip().lower() != "true":
+        return None
+    raw_rate = os.getenv("TRAFFIC_CAPTURE_SAMPLE_RATE", "1").strip()
+    try:
+        sample_rate = float(raw_rate)
+    except ValueError as exc:
+        raise RuntimeError(f"Invalid number for TRAFFIC_CAPTURE_SAMPLE_RATE: {raw_rate}") from exc
+    if not 0.0 < sample_rate <= 1.0:
+        raise RuntimeError("TRAFFIC_CAPTURE_SAMPLE_RATE must be greater than 0 and at most 1")
+    return TrafficCapture(
+        os.getenv("TRAFFIC_CAPTURE_PATH", "traffic_capture.jsonl").strip() or "traffic_capture.jsonl",
+        sample_rate=sample_rate,
+        max_records=_env_int("TRAFFIC_CAPTURE_MAX_RECORDS", 100000),
+    )
+
+
+_traffic_capture = _build_traffic_capture()
+
+
+def _scan_capture(request_id: str | None, **fields: Any) -> AbstractContextManager[dict[str, Any]]:
+    """Replayable record of one scan (see `benchmarks/traffic_replay.py`); a throwaway dict when disabled."""
+    if _traffic_capture is None:
+        return nullcontext({})
+    return _traffic_capture.capture(request_id, **fields)
+
+
+@app.get("/healthz")
+def healthz() -> dict[str, str]:
+    return {"status": "ok"}
+
+
 @app.post("/v1/scan_menu", response_model=ScanMenuResponse)
 async def scan_menu(
     image: UploadFile = File(...),
@@ -665,16 +1787,168 @@ async def scan_menu(
     app_version: str = Form(...),
     timezone: str = Form(...),
     request_id: str | None = Form(default=None),
+    fields: str | None = Form(default=None),
+    verbose: bool | None = Form(default=None),
     authorization: str | None = Header(default=None),
+    accept_encoding: str | None = Header(default=None),
+) -> Response:
+    include, exclude = _scan_response_projection(fields, _SCAN_RESPONSE_VERBOSE if verbose is None else verbose)
+    with _scan_capture(request_id, target_lang=target_lang, app_version=app_version) as captured:
+        response = await _scan_menu_response(
+            image=image,
+            target_lang=target_lang,
+            device_id=device_id,
+            app_version=app_version,
+            timezone=timezone,
+            request_id=request_id,
+            authorization=authorization,
+        )
+        captured.update(_capture_outcome(response))
+    body = ScanMenuResponse.__pydantic_serializer__.to_json(response, include=include, exclude=exclude)
+    return encoded_json_response(body, accept_encoding)
+
+
+def _scan_response_projection(fields: str | None, verbose: bool) -> tuple[set[str] | None, dict[str, Any] | None]:
+    include: set[str] | None = None
+    if fields:
+        include = {field.strip() for field in fields.split(",") if field.strip()}
+        unknown = include - set(ScanMenuResponse.model_fields)
+        if unknown:
+            allowed = ", ".join(ScanMenuResponse.model_fields)
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}. Use: {allowed}.")
+    exclude = None if verbose else {"pipeline_diagnostics": True, "items": {"__all__": {"ocr_diagnostics"}}}
+    return include, exclude
+
+
+def _capture_outcome(response: ScanMenuResponse) -> dict[str, Any]:
+    diagnostics = response.pipeline_diagnostics or {}
+    return {
+        "returned_item_count": len(response.items),
+        "ocr_pipeline_mode": diagnostics.get("ocr_pipeline_mode"),
+        "stage_latency_ms": diagnostics.get("stage_latency_ms"),
+        "pipeline_latency_ms": diagnostics.get("total_latency_ms"),
+        "image_warm_cache_hits": diagnostics.get("image_warm_cache_hits"),
+        "duplicate_request": bool(diagnostics.get("usage_duplicate_request")),
+        "response_replayed": bool(diagnostics.get("response_replayed")),
+        "gemini_tokens": diagnostics.get("gemini_tokens"),
+    }
+
+
+async def _scan_menu_response(
+    *,
+    image: UploadFile,
+    target_lang: str,
+    device_id: str,
+    app_version: str,
+    timezone: str,
+    request_id: str | None,
+    authorization: str | None,
 ) -> ScanMenuResponse:
-    authenticated_uid = _resolve_authenticated_uid(authorization)
-    subject_key = f"uid:{authenticated_uid}" if authenticated_uid else f"device:{device_id}"
+    with _scan_trace("scan_menu", request_id) as root:
+        root.set(target_lang=target_lang, app_version=app_version)
+        authenticated_uid = _traced_auth(authorization)
+        subject_key = _scan_subject_key(authenticated_uid, device_id)
+        capture_note(subject_key=subject_key, auth_subject_type="firebase" if authenticated_uid else "device")
+        _ = timezone
+        # Reserved before the first await, so a duplicate arriving at any later point finds this request.
+        reservation = _reserve_replay(subject_key, request_id)
+        try:
+            # Admission is decided before the quota charge and before any upstream call.
+            ticket = await _admit_scan(await _scan_priority_class(authenticated_uid, subject_key))
+            ran_pipeline = False
+            try:
+                await _claim_replay(reservation)
+                usage = await _charge_scan(
+                    authenticated_uid=authenticated_uid, subject_key=subject_key, request_id=request_id
+                )
+                capture_note(plan=usage.plan)
+                replayed = await _replayed_scan(reservation)
+                if replayed is not None:
+                    return replayed
+
+                image_bytes = await image.read()
+                if not image_bytes:
+                    raise HTTPException(status_code=400, detail="Uploaded image is empty")
+                capture_image(image_bytes)
+                ran_pipeline = True
+                return await _run_scan_once(
+                    image_bytes=image_bytes,
+                    target_lang=target_lang,
+                    reservation=reservation,
+                    usage=usage,
+                    authenticated_uid=authenticated_uid,
+                )
+            finally:
+                _release_scan(ticket, ran_pipeline)
+        finally:
+            await _release_replay(reservation)
+
+
+def _traced_auth(authorization: str | None) -> str | None:
+    with trace_span("auth") as auth_span:
+        authenticated_uid = _resolve_authenticated_uid(authorization)
+        auth_span.set(subject_type="firebase" if authenticated_uid else "device")
+    return authenticated_uid
+
+
+def _scan_subject_key(authenticated_uid: str | None, device_id: str) -> str:
+    return f"uid:{authenticated_uid}" if authenticated_uid else f"device:{device_id}"
 
+
+async def _scan_priority_class(authenticated_uid: str | None, subject_key: str) -> str:
+    if _admission_controller is None:
+        return "free"
     if authenticated_uid and authenticated_uid in _DEV_BYPASS_QUOTA_UIDS:
-        logger.info("Developer quota bypass applied. uid=%s", authenticated_uid)
-        usage = _usage_store.developer_bypass_decision(subject_key=subject_key)
-    else:
-        usage = _usage_store.consume_scan(subject_key=subject_key, request_id=request_id)
+        return "dev_unlimited"
+    return _admission_controller.priority_class(await asyncio.to_thread(_usage_store.resolve_plan, subject_key))
+
+
+async def _admit_scan(priority_class: str, wait_forever: bool = False) -> AdmissionTicket | None:
+    if _admission_controller is None:
+        return None
+    try:
+        with trace_span("admission", priority_class=priority_class) as admission_span:
+            ticket = await _admission_controller.admit(priority_class, wait_forever=wait_forever)
+            admission_span.set(wait_ms=ticket.wait_ms)
+            return ticket
+    except AdmissionRejected as exc:
+        logger.info("Scan shed by admission control. class=%s reason=%s", exc.priority_class, exc.reason)
+        raise _overloaded_error(exc.retry_after_seconds) from exc
+
+
+def _release_scan(ticket: AdmissionTicket | None, ran_pipeline: bool) -> None:
+    # Only pipeline runs feed the latency estimate; quota rejections and replays would drag it down.
+    if ticket is not None and _admission_controller is not None:
+        latency_ms = (time.monotonic() - ticket.admitted_at) * 1000 if ran_pipeline else None
+        _admission_controller.release(ticket, latency_ms=latency_ms)
+
+
+def _overloaded_error(retry_after_seconds: int) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail={
+            "code": "scan_queue_full",
+            "message": "Too many scans in progress. Retry later.",
+            "retry_after_seconds": retry_after_seconds,
+        },
+        headers={"Retry-After": str(retry_after_seconds)},
+    )
+
+
+async def _charge_scan(*, authenticated_uid: str | None, subject_key: str, request_id: str | None) -> UsageDecision:
+    with trace_span("quota") as quota_span:
+        if authenticated_uid and authenticated_uid in _DEV_BYPASS_QUOTA_UIDS:
+            logger.info("Developer quota bypass applied. uid=%s", authenticated_uid)
+            usage = _usage_store.developer_bypass_decision(subject_key=subject_key)
+        else:
+            # Backends block on SQLite locks or the counter service, so they never run on the event loop.
+            usage = await asyncio.to_thread(_usage_store.consume_scan, subject_key=subject_key, request_id=request_id)
+        quota_span.set(
+            plan=usage.plan,
+            allowed=usage.allowed,
+            remaining_scans=usage.remaining_scans,
+            duplicate_request=usage.duplicate_request,
+        )
     if not usage.allowed:
         raise HTTPException(
             status_code=402,
@@ -688,88 +1962,431 @@ async def scan_menu(
                 "remaining_scans": usage.remaining_scans,
             },
         )
-    _ = (device_id, app_version, timezone, authenticated_uid, request_id)
+    return usage
+
+
+def _reserve_replay(subject_key: str, request_id: str | None) -> ReplayReservation | None:
+    if _scan_replay_store is None or not request_id:
+        return None
+    return _scan_replay_store.reserve(subject_key, request_id)
+
+
+async def _claim_replay(reservation: ReplayReservation | None) -> None:
+    # Must finish before the charge: other processes only see a duplicate once this request is charged.
+    if reservation is not None:
+        await _scan_replay_store.claim(reservation)
+
+
+async def _release_replay(reservation: ReplayReservation | None) -> None:
+    if reservation is not None:
+        await _scan_replay_store.release(reservation)
+
+
+async def _replayed_scan(reservation: ReplayReservation | None) -> ScanMenuResponse | None:
+    if reservation is None or reservation.claimed:
+        return None
+    with trace_span("replay_lookup") as replay_span:
+        replayed = await _scan_replay_store.wait_for_response(reservation)
+        replay_span.set(cache_hit=replayed is not None)
+    if replayed is None:
+        return None
+    logger.info("Replaying stored scan response. subject=%s request_id=%s", *reservation.key)
+    return _mark_replayed(ScanMenuResponse.model_validate_json(replayed))
+
+
+async def _run_scan_once(
+    *,
+    image_bytes: bytes,
+    target_lang: str,
+    reservation: ReplayReservation | None,
+    usage: UsageDecision,
+    authenticated_uid: str | None,
+) -> ScanMenuResponse:
+    def run() -> Awaitable[ScanMenuResponse]:
+        return _run_scan_pipeline(
+            image_bytes=image_bytes,
+            target_lang=target_lang,
+            usage=usage,
+            authenticated_uid=authenticated_uid,
+        )
+
+    with trace_span("pipeline"):
+        if reservation is None:
+            return await run()
+        return await _scan_replay_store.run_once(reservation, run)
+
+
+@app.post("/v1/scan_jobs", response_model=ScanJobResponse, status_code=202)
+async def submit_scan_job(
+    image: UploadFile = File(...),
+    target_lang: str = Form(...),
+    device_id: str = Form(...),
+    app_version: str = Form(...),
+    timezone: str = Form(...),
+    request_id: str | None = Form(default=None),
+    authorization: str | None = Header(default=None),
+) -> Response:
+    _ = timezone
+    with _scan_trace("scan_jobs.submit", request_id) as root:
+        root.set(target_lang=target_lang, app_version=app_version)
+        return await _submit_scan_job(
+            image=image,
+            target_lang=target_lang,
+            device_id=device_id,
+            request_id=request_id,
+            authorization=authorization,
+            submit_span_id=root.span_id,
+        )
+
+
+async def _submit_scan_job(
+    *,
+    image: UploadFile,
+    target_lang: str,
+    device_id: str,
+    request_id: str | None,
+    authorization: str | None,
+    submit_span_id: str | None,
+) -> Response:
+    authenticated_uid = _traced_auth(authorization)
+    subject_key = _scan_subject_key(authenticated_uid, device_id)
+    reservation = _reserve_replay(subject_key, request_id)
+    try:
+        return await _enqueue_scan_job(
+            image=image,
+            target_lang=target_lang,
+            subject_key=subject_key,
+            request_id=request_id,
+            authenticated_uid=authenticated_uid,
+            reservation=reservation,
+            submit_span_id=submit_span_id,
+        )
+    except BaseException:
+        # Once the job is queued, its worker releases the reservation instead.
+        await _release_replay(reservation)
+        raise
+
+
+async def _enqueue_scan_job(
+    *,
+    image: UploadFile,
+    target_lang: str,
+    subject_key: str,
+    request_id: str | None,
+    authenticated_uid: str | None,
+    reservation: ReplayReservation | None,
+    submit_span_id: str | None,
+) -> Response:
     image_bytes = await image.read()
     if not image_bytes:
         raise HTTPException(status_code=400, detail="Uploaded image is empty")
 
-    vision_key = _require_env("GOOGLE_CLOUD_VISION_API_KEY")
-    gemini_key = _require_env("GEMINI_API_KEY")
+    # A queue slot is held before the quota charge and used by the submit after it, so a
+    # rejected job never costs the client a scan. Under admission control, each plan may
+    # only fill its share of the queue.
+    priority_class = await _scan_priority_class(authenticated_uid, subject_key)
+    queue_share = None
+    if _admission_controller is not None:
+        queue_share = max(1, math.ceil(_scan_job_queue.max_queued * _admission_controller.shares[priority_class]))
+    await _claim_replay(reservation)
+    try:
+        _scan_job_queue.hold_slot(queue_share)
+    except ScanQueueFullError as exc:
+        if _admission_controller is not None:
+            _admission_controller.reject(priority_class, "job_queue_full")
+        raise _overloaded_error(exc.retry_after_seconds) from exc
+    try:
+        usage = await _charge_scan(authenticated_uid=authenticated_uid, subject_key=subject_key, request_id=request_id)
+    except BaseException:
+        _scan_job_queue.release_slot()
+        raise
+    scan_id = str(uuid4())
+
+    async def run() -> ScanMenuResponse:
+        # The worker runs outside the request, so the job continues the submit's trace.
+        with _scan_trace("scan_jobs.run", request_id, parent_id=submit_span_id) as root:
+            root.set(scan_id=scan_id)
+            try:
+                # Accepted jobs are already charged, so they wait for a slot instead of being shed.
+                ticket = await _admit_scan(priority_class, wait_forever=True)
+                ran_pipeline = False
+                try:
+                    response = await _replayed_scan(reservation)
+                    if response is None:
+                        ran_pipeline = True
+                        response = await _run_scan_once(
+                            image_bytes=image_bytes,
+                            target_lang=target_lang,
+                            reservation=reservation,
+                            usage=usage,
+                            authenticated_uid=authenticated_uid,
+                        )
+                finally:
+                    _release_scan(ticket, ran_pipeline)
+            finally:
+                await _release_replay(reservation)
+            return response.model_copy(update={"scan_id": scan_id})
+
+    job = _scan_job_queue.submit(scan_id, run, slot_held=True)
+    return Response(content=_scan_job_body(job, None, _SCAN_RESPONSE_VERBOSE), status_code=202, media_type="application/json")
+
+
+@app.get("/v1/scan_jobs/metrics", response_model=ScanJobMetricsResponse)
+async def scan_job_metrics(x_ops_key: str | None = Header(default=None)) -> ScanJobMetricsResponse:
+    _require_ops_key(x_ops_key)
+    return ScanJobMetricsResponse(**_scan_job_queue.metrics())
+
+
+@app.get("/v1/admission/metrics", response_model=AdmissionMetricsResponse)
+async def admission_metrics(x_ops_key: str | None = Header(default=None)) -> AdmissionMetricsResponse:
+    if _admission_controller is None:
+        raise HTTPException(status_code=404, detail="Admission control is disabled")
+    _require_ops_key(x_ops_key)
+    return AdmissionMetricsResponse(**_admission_controller.metrics())
+
+
+@app.get("/v1/scan_jobs/{scan_id}", response_model=ScanJobResponse)
+async def get_scan_job(
+    scan_id: str,
+    wait: float = Query(default=0, ge=0, le=_SCAN_JOB_MAX_WAIT_SECONDS),
+    fields: str | None = Query(default=None),
+    verbose: bool | None = Query(default=None),
+    accept_encoding: str | None = Header(default=None),
+) -> Response:
+    job = _scan_job_queue.get(scan_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired scan job")
+    job = await _scan_job_queue.wait(job, wait)
+    body = _scan_job_body(job, fields, _SCAN_RESPONSE_VERBOSE if verbose is None else verbose)
+    return encoded_json_response(body, accept_encoding)
+
+
+def _scan_job_body(job: ScanJob, fields: str | None, verbose: bool) -> bytes:
+    include, exclude = _scan_response_projection(fields, verbose)
+    pending = not job.done.is_set()
+    response = ScanJobResponse.model_construct(
+        scan_id=job.scan_id,
+        status=job.status,
+        queue_position=_scan_job_queue.queue_position(job),
+        wait_ms=job.wait_ms,
+        poll_after_ms=_SCAN_JOB_POLL_AFTER_MS if pending else None,
+        result=job.result,
+        error=ScanJobFailure.model_construct(status_code=job.error.status_code, detail=job.error.detail)
+        if job.error is not None
+        else None,
+    )
+    # `fields` and `verbose` project the embedded scan result exactly as they do for /v1/scan_menu.
+    job_include = None
+    if include is not None:
+        job_include = {name: True for name in ScanJobResponse.model_fields if name != "result"}
+        job_include["result"] = {name: True for name in include}
+    job_exclude = {"result": exclude} if exclude is not None else None
+    return ScanJobResponse.__pydantic_serializer__.to_json(response, include=job_include, exclude=job_exclude)
+
+
+def _mark_replayed(response: ScanMenuResponse) -> ScanMenuResponse:
+    if response.pipeline_diagnostics is not None:
+        response.pipeline_diagnostics["usage_duplicate_request"] = True
+        response.pipeline_diagnostics["response_replayed"] = True
+    return response
+
+
+async def _run_scan_pipeline(
+    *,
+    image_bytes: bytes,
+    target_lang: str,
+    usage: UsageDecision,
+    authenticated_uid: str | None,
+) -> ScanMenuResponse:
     ocr_pipeline_mode = _resolve_ocr_pipeline_mode()
+    vision_key = _require_env("GOOGLE_CLOUD_VISION_API_KEY") if ocr_pipeline_mode != "gemini_vision" else ""
+    gemini_key = _require_env("GEMINI_API_KEY")
     max_menu_items = _resolve_max_menu_items()
-    enable_image_search = os.getenv("ENABLE_IMAGE_SEARCH", "true").strip().lower() == "true"
     provider = _resolve_image_search_provider()
-    if not enable_image_search:
-        provider = "none"
 
     cse_key = _require_env("GOOGLE_CSE_API_KEY") if provider == "cse" else ""
     cse_cx = _require_env("GOOGLE_CSE_CX") if provider == "cse" else ""
     vertex_project_id = _require_env("GCP_PROJECT_ID") if provider == "vertex" else ""
     vertex_location = _require_env("VERTEX_SEARCH_LOCATION") if provider == "vertex" else ""
     vertex_app_id = _require_env("VERTEX_SEARCH_APP_ID") if provider == "vertex" else ""
-    vertex_access_token = _vertex_access_token() if provider == "vertex" else ""
+    vertex_access_token = await asyncio.to_thread(_vertex_access_token) if provider == "vertex" else ""
+    streaming = _settings.gemini_streaming
+    parse_prompt_name = _parse_prompt_name(ocr_pipeline_mode)
+    token_usage = GeminiTokenUsage()
+    max_scan_items = _resolve_max_scan_items(ocr_pipeline_mode)
+    # Keyed by id() of the LlmItem; searches may start during parsing, before item order is final.
+    image_tasks: dict[int, asyncio.Task[list[ImagePreview]]] = {}
+    image_search_slots = asyncio.Semaphore(_IMAGE_SEARCH_CONCURRENCY)
+    warm_image_hits = 0
+
+    async def search_images(raw_item: LlmItem) -> list[ImagePreview]:
+        nonlocal warm_image_hits
+        query = raw_item.image_query or raw_item.en_title
+        with trace_span("image_search", provider=provider, query=query) as image_span:
+            if _image_warm_cache is not None and provider != "none":
+                _image_warm_cache.record(query)
+                warm = _image_warm_cache.get(query)
+                image_span.set(cache_hit=warm is not None)
+                if warm is not None:
+                    warm_image_hits += 1
+                    image_span.set(result_count=len(warm))
+                    return warm
+            async with image_search_slots:
+                images = await _image_search_by_provider(
+                    query=query,
+                    provider=provider,
+                    cse_api_key=cse_key,
+                    cse_cx=cse_cx,
+                    vertex_project_id=vertex_project_id,
+                    vertex_location=vertex_location,
+                    vertex_app_id=vertex_app_id,
+                    vertex_access_token=vertex_access_token,
+                )
+            image_span.set(result_count=len(images))
+            return images
+
+    def start_image_search(raw_item: LlmItem) -> None:
+        if id(raw_item) not in image_tasks:
+            image_tasks[id(raw_item)] = asyncio.create_task(search_images(raw_item))
+
+    def start_image_search_early(raw_item: LlmItem) -> None:
+        if len(image_tasks) < max_scan_items:
+            start_image_search(raw_item)
 
     try:
         scan_start = time.perf_counter()
         prompt_versions = {
-            "menu_parse_prompt_version": get_active_prompt_version("menu_parse"),
+            "menu_parse_prompt_version": get_active_prompt_version(parse_prompt_name),
             "ocr_normalize_prompt_version": get_active_prompt_version("ocr_normalize"),
         }
         stage_latency_ms: dict[str, int] = {}
-        vision_start = time.perf_counter()
-        vision_ocr_text = await _vision_ocr(image_bytes=image_bytes, api_key=vision_key)
-        stage_latency_ms["vision_ocr"] = int((time.perf_counter() - vision_start) * 1000)
-        if not vision_ocr_text:
-            return _fallback_response()
+        text_blocks: list[TextBlock] = []
+        layout: RegionParseResult | None = None
+        gemini_image: tuple[bytes, str] | None = None
+        if ocr_pipeline_mode == "gemini_vision":
+            # The model reads the photo itself; its transcription stands in for Vision OCR text below.
+            prepare_start = time.perf_counter()
+            with trace_span("image_prepare"):
+                gemini_image = await asyncio.to_thread(
+                    _prepare_gemini_image, image_bytes, _resolve_gemini_vision_max_image_side()
+                )
+            stage_latency_ms["image_prepare"] = int((time.perf_counter() - prepare_start) * 1000)
+            vision_ocr_text = ""
+        else:
+            vision_start = time.perf_counter()
+            with trace_span("vision_ocr") as vision_span:
+                if ocr_pipeline_mode == "layout_chunked":
+                    vision_ocr_text, text_blocks = await _vision_ocr_layout(image_bytes=image_bytes, api_key=vision_key)
+                else:
+                    vision_ocr_text = await _vision_ocr(image_bytes=image_bytes, api_key=vision_key)
+                vision_span.set(text_chars=len(vision_ocr_text))
+            capture_note(ocr_text=vision_ocr_text)
+            stage_latency_ms["vision_ocr"] = int((time.perf_counter() - vision_start) * 1000)
+            if not vision_ocr_text:
+                return _fallback_response()
 
         normalized_ocr_text: str | None = None
         normalization_fallback_used = False
         if ocr_pipeline_mode == "hybrid":
             normalize_start = time.perf_counter()
-            try:
-                normalized_ocr_text = await _gemini_normalize_ocr_text(ocr_text=vision_ocr_text, api_key=gemini_key)
-            except Exception:
-                normalization_fallback_used = True
-                logger.exception("OCR normalization failed. Falling back to raw Vision OCR text.")
+            with trace_span("ocr_normalize") as normalize_span:
+                try:
+                    normalized_ocr_text = await _gemini_normalize_ocr_text(
+                        ocr_text=vision_ocr_text,
+                        api_key=gemini_key,
+                        token_usage=token_usage,
+                    )
+                except Exception as exc:
+                    normalization_fallback_used = True
+                    normalize_span.fail(exc)
+                    logger.exception("OCR normalization failed. Falling back to raw Vision OCR text.")
+                normalize_span.set(fallback_used=normalization_fallback_used)
             stage_latency_ms["ocr_normalize"] = int((time.perf_counter() - normalize_start) * 1000)
         else:
             stage_latency_ms["ocr_normalize"] = 0
 
         parse_source_text = normalized_ocr_text or vision_ocr_text
-        normalization_changed = (
-            normalized_ocr_text is not None
-            and _normalize_for_match(normalized_ocr_text) != _normalize_for_match(vision_ocr_text)
-        )
-
         parse_start = time.perf_counter()
-        llm = await _gemini_parse_menu(ocr_text=parse_source_text, target_lang=target_lang, api_key=gemini_key)
+        with trace_span("dish_match") as dish_span:
+            dish_plan = _plan_dish_dictionary(ocr_pipeline_mode, target_lang, parse_source_text)
+            dish_span.set(applied=dish_plan is not None and dish_plan.applied)
+        if dish_plan is not None:
+            stage_latency_ms["dish_match"] = int((time.perf_counter() - parse_start) * 1000)
+            for _, dictionary_item in dish_plan.items:
+                start_image_search_early(dictionary_item)
+            parse_source_text = dish_plan.llm_text
+        with trace_span("menu_parse", mode=ocr_pipeline_mode, streaming=streaming):
+            if dish_plan is not None and dish_plan.skips_llm:
+                llm = LlmOutput.model_construct(detected_type="dish", items=[])
+            elif ocr_pipeline_mode == "layout_chunked":
+                # Regions parse concurrently; each region's image lookups start when it finishes.
+                layout = await _gemini_parse_menu_regions(
+                    _layout_regions(vision_ocr_text, text_blocks),
+                    target_lang=target_lang,
+                    api_key=gemini_key,
+                    token_usage=token_usage,
+                    on_item=start_image_search_early,
+                )
+                llm = layout.output
+            elif streaming:
+                # Image lookups start while the model is still generating later items.
+                llm = await _gemini_parse_menu_streaming(
+                    ocr_text=parse_source_text,
+                    target_lang=target_lang,
+                    api_key=gemini_key,
+                    on_item=start_image_search_early,
+                    prompt_name=parse_prompt_name,
+                    token_usage=token_usage,
+                    image=gemini_image,
+                )
+            else:
+                llm = await _gemini_parse_menu(
+                    ocr_text=parse_source_text,
+                    target_lang=target_lang,
+                    api_key=gemini_key,
+                    prompt_name=parse_prompt_name,
+                    token_usage=token_usage,
+                    image=gemini_image,
+                )
+        if dish_plan is not None:
+            llm = dish_plan.merge(llm)
         stage_latency_ms["menu_parse"] = int((time.perf_counter() - parse_start) * 1000)
         if not llm.items:
             return _fallback_response()
 
-        estimated_candidates = _estimate_ocr_candidate_count(parse_source_text)
+        if isinstance(llm, FusedLlmOutput):
+            normalized_ocr_text = llm.normalized_text.strip() or None
+        elif isinstance(llm, VisionLlmOutput):
+            vision_ocr_text = llm.ocr_text.strip()
+            capture_note(ocr_text=vision_ocr_text)
+        source_index = _build_ocr_source_index(normalized_ocr_text or vision_ocr_text)
+        normalization_changed = (
+            normalized_ocr_text is not None
+            and source_index.normalized != _normalize_for_match(vision_ocr_text)
+        )
+
+        estimated_candidates = source_index.candidate_count
         items: list[ScanItem] = []
         image_search_start = time.perf_counter()
-        for raw_item in llm.items[:max_menu_items]:
-            query = raw_item.image_query or raw_item.en_title
-            images = await _image_search_by_provider(
-                query=query,
-                provider=provider,
-                cse_api_key=cse_key,
-                cse_cx=cse_cx,
-                vertex_project_id=vertex_project_id,
-                vertex_location=vertex_location,
-                vertex_app_id=vertex_app_id,
-                vertex_access_token=vertex_access_token,
-            )
+        streamed_image_searches = len(image_tasks)
+        for raw_item in llm.items[:max_scan_items]:
+            start_image_search(raw_item)
+        for item_index, raw_item in enumerate(llm.items[:max_scan_items]):
+            images = await image_tasks[id(raw_item)]
+            if _REWRITE_IMAGE_URLS:
+                images = [
+                    ImagePreview.model_construct(url=_image_proxy.proxy_url(image.url), score=image.score)
+                    for image in images
+                ]
+            # Inputs are already validated (LlmItem, ImagePreview), so skip re-validating them here.
             items.append(
-                ScanItem(
+                ScanItem.model_construct(
                     item_id=str(uuid4()),
                     jp_text=raw_item.jp_text,
                     price_text=raw_item.price_text,
                     confidence=0.0,
                     ocr_diagnostics={},
-                    preview=Preview(
+                    preview=Preview.model_construct(
                         en_title=raw_item.en_title,
                         en_description=raw_item.en_description,
                         tags=raw_item.tags[:5],
@@ -782,13 +2399,15 @@ async def scan_menu(
             diagnostics, final_confidence = _build_ocr_diagnostics(
                 item_jp_text=raw_item.jp_text,
                 en_title=raw_item.en_title,
-                source_text_for_matching=parse_source_text,
+                source_index=source_index,
                 ocr_pipeline=ocr_pipeline_mode,
                 normalization_changed=normalization_changed,
                 vision_text_len=len(vision_ocr_text),
                 normalized_text_len=len(normalized_ocr_text) if normalized_ocr_text else None,
                 llm_confidence=llm_confidence,
             )
+            if layout is not None:
+                diagnostics["layout_region"] = layout.item_regions[item_index]
             items[-1].confidence = final_confidence
             items[-1].ocr_diagnostics = diagnostics
         stage_latency_ms["image_retrieval_total"] = int((time.perf_counter() - image_search_start) * 1000)
@@ -801,9 +2420,9 @@ async def scan_menu(
             total_latency_ms,
         )
         coverage_ratio = min(1.0, len(items) / estimated_candidates) if estimated_candidates > 0 else None
-        return ScanMenuResponse(
+        return ScanMenuResponse.model_construct(
             scan_id=str(uuid4()),
-            detected_type=DetectedType(type=llm.detected_type, confidence=0.8),
+            detected_type=DetectedType.model_construct(type=llm.detected_type, confidence=0.8),
             items=items,
             pipeline_diagnostics={
                 "ocr_pipeline_mode": ocr_pipeline_mode,
@@ -811,11 +2430,19 @@ async def scan_menu(
                 "estimated_ocr_candidate_count": estimated_candidates,
                 "returned_item_count": len(items),
                 "coverage_ratio": round(coverage_ratio, 3) if coverage_ratio is not None else None,
-                "model": os.getenv("GEMINI_MODEL", "gemini-1.5-flash"),
+                "model": _settings.gemini_model,
                 "image_search_provider": provider,
                 "normalization_fallback_used": normalization_fallback_used,
+                "gemini_streaming": streaming,
+                "gemini_response_schema": _settings.gemini_response_schema,
+                "image_searches_started_during_parse": streamed_image_searches,
+                "image_warm_cache_hits": warm_image_hits if _image_warm_cache is not None else None,
+                "gemini_tokens": token_usage.as_dict(),
+                "layout_regions": layout.regions if layout is not None else None,
+                "dish_dictionary": dish_plan.diagnostics() if dish_plan is not None else None,
                 "stage_latency_ms": stage_latency_ms,
                 "total_latency_ms": total_latency_ms,
+                "trace_id": current_trace_id(),
                 "auth_subject_type": "firebase" if authenticated_uid else "device",
                 "usage_period_ym": usage.period_ym,
                 "usage_plan": usage.plan,
@@ -832,3 +2459,143 @@ async def scan_menu(
         raise HTTPException(status_code=502, detail=f"Upstream API error: {exc}") from exc
     except Exception as exc:
         raise HTTPException(status_code=500, detail=f"Scan pipeline failed: {exc}") from exc
+    finally:
+        for image_task in image_tasks.values():
+            image_task.cancel()
+
+
+@app.get("/v1/images/{image_id}")
+async def proxied_image(
+    image_id: str,
+    w: int | None = Query(default=None),
+    if_none_match: str | None = Header(default=None),
+) -> Response:
+    if _image_proxy is None:
+        raise HTTPException(status_code=404, detail="Image proxy is disabled")
+    try:
+        source_url = _image_proxy.resolve_source_url(image_id)
+        width = _image_proxy.resolve_width(w)
+        headers = {
+            "ETag": _image_proxy.etag_for(source_url, width),
+            "Cache-Control": "public, max-age=604800, immutable",
+        }
+        if if_none_match and headers["ETag"] in {tag.strip() for tag in if_none_match.split(",")}:
+            return Response(status_code=304, headers=headers)
+        image = await _image_proxy.get_thumbnail(source_url, width)
+    except ImageProxyError as exc:
+        raise HTTPException(status_code=exc.status_code, detail=exc.detail) from exc
+    return Response(content=image.body, media_type=image.media_type, headers=headers)
+
+
+@app.get("/v1/profiles/{profile_id}")
+def get_request_profile(
+    profile_id: str,
+    format: str = Query(default="svg", pattern="^(svg|folded|json)$"),
+    x_ops_key: str | None = Header(default=None),
+) -> Response:
+    if _request_profiler is None:
+        raise HTTPException(status_code=404, detail="Request profiling is disabled")
+    _require_ops_key(x_ops_key)
+    body = _request_profiler.load(profile_id, format)
+    if body is None:
+        raise HTTPException(status_code=404, detail="Unknown profile")
+    return Response(content=body, media_type=PROFILE_FORMATS[format])
+
+
+@app.get("/v1/image_cache/warm", response_model=ImageWarmCacheResponse)
+async def image_warm_cache_stats(
+    limit: int = Query(default=20, ge=1, le=500),
+    x_ops_key: str | None = Header(default=None),
+) -> ImageWarmCacheResponse:
+    if _image_warm_cache is None:
+        raise HTTPException(status_code=404, detail="Image warm cache is disabled")
+    _require_ops_key(x_ops_key)
+    return ImageWarmCacheResponse(
+        **_image_warm_cache.stats(),
+        top_queries=[
+            WarmImageQuery(query=query, estimated_count=count, warm=_image_warm_cache.is_warm(query))
+            for query, count in _image_warm_cache.top_queries()[:limit]
+        ],
+    )
+
+
+def _key_matches(provided: str | None, expected: str) -> bool:
+    # Compared as bytes: compare_digest raises TypeError for non-ASCII str, which would surface as a 500.
+    return bool(provided and expected) and hmac.compare_digest(provided.encode("utf-8"), expected.encode("utf-8"))
+
+
+def _require_analytics_key(analytics_key: str | None) -> None:
+    if not _key_matches(analytics_key, _USAGE_ANALYTICS_API_KEY):
+        raise HTTPException(status_code=401, detail="Invalid analytics key")
+
+
+def _require_ops_key(ops_key: str | None) -> None:
+    expected = _settings.ops_api_key
+    if not expected:
+        raise HTTPException(status_code=404, detail="Ops endpoints are disabled; set OPS_API_KEY")
+    if not _key_matches(ops_key, expected):
+        raise HTTPException(status_code=401, detail="Invalid ops key")
+
+
+def _require_usage_analytics(analytics_key: str | None) -> UsageAnalytics:
+    if _usage_analytics is None:
+        raise HTTPException(status_code=404, detail="Usage analytics is disabled")
+    _require_analytics_key(analytics_key)
+    return _usage_analytics
+
+
+def _analytics_refreshed_at(analytics: UsageAnalytics) -> str | None:
+    return analytics.refreshed_at.isoformat() if analytics.refreshed_at else None
+
+
+@app.get("/v1/usage/analytics/periods", response_model=UsagePeriodsResponse)
+def usage_analytics_periods(
+    period_ym: str | None = Query(default=None),
+    x_analytics_key: str | None = Header(default=None),
+) -> UsagePeriodsResponse:
+    analytics = _require_usage_analytics(x_analytics_key)
+    periods = analytics.period_summaries(period_ym)
+    return UsagePeriodsResponse(
+        refreshed_at=_analytics_refreshed_at(analytics),
+        periods=[UsagePeriodSummary(**asdict(summary)) for summary in periods],
+    )
+
+
+@app.get("/v1/usage/analytics/top_subjects", response_model=UsageTopSubjectsResponse)
+def usage_analytics_top_subjects(
+    period_ym: str | None = Query(default=None),
+    limit: int = Query(default=20, ge=1, le=500),
+    x_analytics_key: str | None = Header(default=None),
+) -> UsageTopSubjectsResponse:
+    analytics = _require_usage_analytics(x_analytics_key)
+    resolved_period = period_ym or analytics.latest_period()
+    subjects = analytics.top_subjects(resolved_period, limit) if resolved_period else []
+    return UsageTopSubjectsResponse(
+        refreshed_at=_analytics_refreshed_at(analytics),
+        period_ym=resolved_period,
+        subjects=[UsageSubject(**asdict(subject)) for subject in subjects],
+    )
+
+
+@app.get("/v1/usage/analytics/quota_exhaustion", response_model=UsageQuotaExhaustionResponse)
+def usage_analytics_quota_exhaustion(
+    period_ym: str | None = Query(default=None),
+    near_remaining: int = Query(default=2, ge=0),
+    x_analytics_key: str | None = Header(default=None),
+) -> UsageQuotaExhaustionResponse:
+    analytics = _require_usage_analytics(x_analytics_key)
+    resolved_period = period_ym or analytics.latest_period()
+    if resolved_period is None:
+        return UsageQuotaExhaustionResponse(
+            refreshed_at=_analytics_refreshed_at(analytics),
+            period_ym=None,
+            subjects=0,
+            exhausted_subjects=0,
+            near_quota_subjects=0,
+            near_remaining_threshold=near_remaining,
+        )
+    exhaustion = analytics.quota_exhaustion(resolved_period, near_remaining)
+    return UsageQuotaExhaustionResponse(
+        refreshed_at=_analytics_refreshed_at(analytics),
+        **asdict(exhaustion),
+    )
@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any
+
+
+_BREAK_TEXT = {
+    "SPACE": " ",
+    "SURE_SPACE": " ",
+    "EOL_SURE_SPACE": "\n",
+    "LINE_BREAK": "\n",
+    "HYPHEN": "-\n",
+}
+
+
+@dataclass(frozen=True)
+class TextBlock:
+    """One Vision paragraph with its bounding box in image pixels."""
+
+    text: str
+    x0: float
+    y0: float
+    x1: float
+    y1: float
+    block_index: int = 0
+
+
+@dataclass
+class MenuRegion:
+    blocks: list[TextBlock]
+
+    @property
+    def text(self) -> str:
+        return "\n".join(block.text for block in self.blocks)
+
+    @property
+    def char_count(self) -> int:
+        return sum(len(block.text) for block in self.blocks)
+
+    @property
+    def bbox(self) -> tuple[int, int, int, int]:
+        return (
+            int(min(block.x0 for block in self.blocks)),
+            int(min(block.y0 for block in self.blocks)),
+            int(max(block.x1 for block in self.blocks)),
+            int(max(block.y1 for block in self.blocks)),
+        )
+
+
+def blocks_from_annotation(full_text_annotation: dict[str, Any]) -> list[TextBlock]:
+    """Rebuild paragraph text and boxes from a Vision `fullTextAnnotation`."""
+    blocks: list[TextBlock] = []
+    block_index = 0
+    for page in full_text_annotation.get("pages", []):
+        for block in page.get("blocks", []):
+            for paragraph in block.get("paragraphs", []):
+                text = _paragraph_text(paragraph)
+                box = _bounding_box(paragraph.get("boundingBox") or block.get("boundingBox") or {})
+                if text and box is not None:
+                    blocks.append(TextBlock(text, *box, block_index=block_index))
+            block_index += 1
+    return blocks
+
+
+def segment_menu(
+    blocks: list[TextBlock],
+    max_chars: int = 1200,
+    max_regions: int = 6,
+    min_chars: int = 40,
+) -> list[MenuRegion]:
+    """Split a page into reading-order regions of at most `max_chars` each (when possible).
+
+    Uses a recursive XY-cut: a region that is too large is split at a wide empty band
+    between its paragraphs, horizontal or vertical, so columns and sections stay whole.
+    Regions smaller than `min_chars` (stray headers, footers) and any beyond `max_regions`
+    are merged into a neighbour.
+    """
+    if not blocks:
+        return []
+    regions = [MenuRegion(group) for group in _xy_cut(blocks, max_chars)]
+
+    while len(regions) > 1:
+        smallest = min(range(len(regions)), key=lambda index: regions[index].char_count)
+        if len(regions) <= max_regions and regions[smallest].char_count >= min_chars:
+            break
+        if len(regions) > max_regions:
+            # Merge the adjacent pair with the fewest characters.
+            index = min(range(len(regions) - 1), key=lambda i: regions[i].char_count + regions[i + 1].char_count)
+        elif smallest == 0:
+            index = 0
+        elif smallest == len(regions) - 1:
+            index = smallest - 1
+        else:
+            before, after = regions[smallest - 1], regions[smallest + 1]
+            index = smallest - 1 if before.char_count <= after.char_count else smallest
+        regions[index : index + 2] = [MenuRegion(regions[index].blocks + regions[index + 1].blocks)]
+    return regions
+
+
+def _xy_cut(blocks: list[TextBlock], max_chars: int) -> list[list[TextBlock]]:
+    if len(blocks) == 1 or sum(len(block.text) for block in blocks) <= max_chars:
+        return [sorted(blocks, key=lambda block: (block.y0, block.x0))]
+
+    y_gap = _best_gap(blocks, vertical=True)
+    x_gap = _best_gap(blocks, vertical=False)
+    if y_gap is not None and (x_gap is None or y_gap[0] >= x_gap[0]):
+        cut = y_gap[1]
+        first = [block for block in blocks if block.y1 <= cut]
+        second = [block for block in blocks if block.y1 > cut]
+    elif x_gap is not None:
+        cut = x_gap[1]
+        first = [block for block in blocks if block.x1 <= cut]
+        second = [block for block in blocks if block.x1 > cut]
+    else:
+        first, second = _split_overlapping(blocks)
+    return _xy_cut(first, max_chars) + _xy_cut(second, max_chars)
+
+
+def _best_gap(blocks: list[TextBlock], vertical: bool) -> tuple[float, float] | None:
+    """Return (width, midpoint) of the band, covered by no block, to cut along.
+
+    Menus repeat the same spacing between rows, so among bands within 80% of the widest
+    one, the cut that splits the characters most evenly wins.
+    """
+    spans = sorted(
+        ((block.y0, block.y1) if vertical else (block.x0, block.x1), len(block.text)) for block in blocks
+    )
+    total = sum(chars for _, chars in spans)
+    gaps: list[tuple[float, float, int]] = []
+    reach = spans[0][0][1]
+    before = spans[0][1]
+    for (start, end), chars in spans[1:]:
+        if start > reach:
+            gaps.append((start - reach, (reach + start) / 2, before))
+        reach = max(reach, end)
+        before += chars
+    if not gaps:
+        return None
+    widest = max(width for width, _, _ in gaps)
+    width, cut, _ = min(
+        (gap for gap in gaps if gap[0] >= 0.8 * widest),
+        key=lambda gap: abs(gap[2] - total / 2),
+    )
+    return width, cut
+
+
+def _split_overlapping(blocks: list[TextBlock]) -> tuple[list[TextBlock], list[TextBlock]]:
+    # No empty band in either direction: split top-to-bottom near half the characters,
+    # preferring a boundary between Vision blocks over one inside a block.
+    ordered = sorted(blocks, key=lambda block: (block.y0, block.x0))
+    half = sum(len(block.text) for block in ordered) / 2
+    running = 0
+    best_index, best_score = 1, float("inf")
+    for index in range(1, len(ordered)):
+        running += len(ordered[index - 1].text)
+        score = abs(running - half)
+        if ordered[index].block_index == ordered[index - 1].block_index:
+            score += half / 2
+        if score < best_score:
+            best_index, best_score = index, score
+    return ordered[:best_index], ordered[best_index:]
+
+
+def _paragraph_text(paragraph: dict[str, Any]) -> str:
+    parts: list[str] = []
+    for word in paragraph.get("words", []):
+        for symbol in word.get("symbols", []):
+            parts.append(symbol.get("text", ""))
+            detected_break = symbol.get("property", {}).get("detectedBreak", {}).get("type")
+            parts.append(_BREAK_TEXT.get(detected_break, ""))
+    return "".join(parts).strip()
+
+
+def _bounding_box(box: dict[str, Any]) -> tuple[float, float, float, float] | None:
+    vertices = box.get("vertices") or []
+    if not vertices:
+        return None
+    xs = [float(vertex.get("x", 0)) for vertex in vertices]
+    ys = [float(vertex.get("y", 0)) for vertex in vertices]
+    return min(xs), min(ys), max(xs), max(ys)
@@ -1,4 +1,6 @@
+import hashlib
 import os
+from functools import lru_cache
 from pathlib import Path
 
 
@@ -6,10 +8,14 @@ _PROMPTS_DIR = Path(__file__).resolve().parent
 _PROMPT_ENV_VARS = {
     "ocr_normalize": "OCR_NORMALIZE_PROMPT_VERSION",
     "menu_parse": "MENU_PARSE_PROMPT_VERSION",
+    "menu_parse_fused": "MENU_PARSE_FUSED_PROMPT_VERSION",
+    "menu_parse_vision": "MENU_PARSE_VISION_PROMPT_VERSION",
 }
 _DEFAULT_VERSIONS = {
     "ocr_normalize": "ocr_normalize_v1",
     "menu_parse": "menu_parse_v2",
+    "menu_parse_fused": "menu_parse_fused_v1",
+    "menu_parse_vision": "menu_parse_vision_v1",
 }
 
 
@@ -17,16 +23,35 @@ def get_active_prompt_version(prompt_name: str) -> str:
     env_var = _PROMPT_ENV_VARS[prompt_name]
     default_version = _DEFAULT_VERSIONS[prompt_name]
     version = os.getenv(env_var, default_version).strip() or default_version
-    prompt_path = _PROMPTS_DIR / f"{version}.txt"
-    if not prompt_path.exists():
-        raise RuntimeError(f"Prompt file not found for {prompt_name}: {prompt_path.name}")
+    try:
+        _load_prompt_bytes(version)
+    except FileNotFoundError:
+        raise RuntimeError(f"Prompt file not found for {prompt_name}: {version}.txt") from None
     return version
 
 
+@lru_cache(maxsize=None)
+def _load_prompt_bytes(version: str) -> bytes:
+    return (_PROMPTS_DIR / f"{version}.txt").read_bytes()
+
+
+def prime_prompts() -> list[str]:
+    """Load every active prompt into memory so the first request does no file IO."""
+    return [get_active_prompt_version(prompt_name) for prompt_name in _PROMPT_ENV_VARS]
+
+
+def clear_prompt_cache() -> None:
+    _load_prompt_bytes.cache_clear()
+
+
+def get_prompt_fingerprint(prompt_name: str) -> str:
+    version = get_active_prompt_version(prompt_name)
+    return hashlib.sha256(_load_prompt_bytes(version)).hexdigest()
+
+
 def render_prompt(prompt_name: str, **values: object) -> tuple[str, str]:
     version = get_active_prompt_version(prompt_name)
-    prompt_path = _PROMPTS_DIR / f"{version}.txt"
-    prompt = prompt_path.read_text(encoding="utf-8").strip()
+    prompt = _load_prompt_bytes(version).decode("utf-8").strip()
     for key, value in values.items():
         prompt = prompt.replace(f"{{{key}}}", str(value))
     return version, prompt
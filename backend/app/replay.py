@@ -0,0 +1,251 @@
+from __future__ import annotations
+
+import asyncio
+import sqlite3
+import threading
+import time
+import zlib
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import TypeVar
+
+from pydantic import BaseModel
+
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+
+@dataclass
+class ReplayReservation:
+    """One request's claim on a (subject_key, request_id) key, see `ScanReplayStore.reserve`."""
+
+    key: tuple[str, str]
+    future: asyncio.Future[str | None]
+    # Owners registered the in-process future; non-owners are duplicates of a request in this process.
+    owner: bool
+    # Set once the owner holds the `pending` row, so duplicates in other processes wait for it.
+    claimed: bool = False
+
+
+class ScanReplayStore:
+    """Stores final scan responses per (subject_key, request_id) so retries can be replayed.
+
+    Responses are kept as zlib-compressed JSON. While the original request is still running,
+    duplicates in the same process wait on its reservation directly; duplicates in other
+    processes poll the `pending` row until it turns `done` or disappears (the original failed).
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        wait_timeout_seconds: float = 30.0,
+        poll_interval_seconds: float = 0.25,
+        retention_days: int = 7,
+        purge_every_writes: int = 200,
+    ) -> None:
+        if wait_timeout_seconds <= 0:
+            raise ValueError("wait_timeout_seconds must be > 0")
+        if retention_days <= 0:
+            raise ValueError("retention_days must be > 0")
+
+        self.wait_timeout_seconds = wait_timeout_seconds
+        self.poll_interval_seconds = poll_interval_seconds
+        self.retention_days = retention_days
+        self._purge_every_writes = purge_every_writes
+        self._writes_since_purge = 0
+        self._db_path = str(Path(db_path))
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self._db_path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._inflight: dict[tuple[str, str], asyncio.Future[str | None]] = {}
+        self._initialize_schema()
+
+    def _initialize_schema(self) -> None:
+        with self._lock:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS scan_responses (
+                    subject_key TEXT NOT NULL,
+                    request_id TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    payload BLOB NULL,
+                    created_at TEXT NOT NULL,
+                    PRIMARY KEY(subject_key, request_id)
+                )
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_scan_responses_created_at ON scan_responses(created_at)")
+
+    def reserve(self, subject_key: str, request_id: str) -> ReplayReservation:
+        """Register the request as in flight for its key.
+
+        Call this before the first await of the request, so a duplicate arriving while the
+        original is still being charged or read finds its future. Every reservation must
+        end in `release`.
+        """
+        key = (subject_key, request_id)
+        future = self._inflight.get(key)
+        if future is not None:
+            return ReplayReservation(key, future, owner=False)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        return ReplayReservation(key, future, owner=True)
+
+    async def claim(self, reservation: ReplayReservation) -> None:
+        """Take the `pending` row unless another process holds it or already stored a response.
+
+        Call this before charging the scan: a duplicate in another process is only charged as
+        a duplicate after the original's charge, so it always finds this row.
+        """
+        if reservation.owner:
+            reservation.claimed = await asyncio.to_thread(self._claim, reservation.key)
+
+    async def wait_for_response(self, reservation: ReplayReservation) -> str | None:
+        """Return the stored response JSON, waiting for the original request if there is one."""
+        if not reservation.owner:
+            try:
+                return await asyncio.wait_for(asyncio.shield(reservation.future), timeout=self.wait_timeout_seconds)
+            except asyncio.TimeoutError:
+                return None
+        if reservation.claimed:
+            return None
+
+        deadline = time.monotonic() + self.wait_timeout_seconds
+        while True:
+            row = await asyncio.to_thread(self._load, reservation.key)
+            if row is None:
+                return None
+            status, payload, created_at = row
+            if status == "done" and payload is not None:
+                response = zlib.decompress(payload).decode("utf-8")
+                # Duplicates in this process are waiting on this owner's future.
+                _resolve(reservation.future, response)
+                return response
+            if self._is_abandoned(created_at) or time.monotonic() >= deadline:
+                return None
+            await asyncio.sleep(self.poll_interval_seconds)
+
+    async def run_once(self, reservation: ReplayReservation, produce: Callable[[], Awaitable[ModelT]]) -> ModelT:
+        """Run `produce` as the original request for this key and store its response.
+
+        Non-owners only get here when the original failed or timed out; they run `produce`
+        without storing anything.
+        """
+        if not reservation.owner:
+            return await produce()
+        if not reservation.claimed:
+            await asyncio.to_thread(self._mark_pending, reservation.key)
+            reservation.claimed = True
+        try:
+            response = await produce()
+        except BaseException:
+            await self.release(reservation)
+            raise
+        payload = response.model_dump_json()
+        await asyncio.to_thread(self._store_done, reservation.key, payload)
+        reservation.claimed = False
+        _resolve(reservation.future, payload)
+        return response
+
+    async def release(self, reservation: ReplayReservation) -> None:
+        """End a reservation; a `pending` row it still holds is deleted so duplicates stop waiting."""
+        if not reservation.owner:
+            return
+        _resolve(reservation.future, None)
+        if self._inflight.get(reservation.key) is reservation.future:
+            del self._inflight[reservation.key]
+        if reservation.claimed:
+            reservation.claimed = False
+            await asyncio.to_thread(self._delete, reservation.key)
+
+    def _is_abandoned(self, created_at: str) -> bool:
+        try:
+            created = datetime.fromisoformat(created_at)
+        except ValueError:
+            return True
+        age = datetime.now(timezone.utc) - created
+        return age > timedelta(seconds=self.wait_timeout_seconds * 2)
+
+    def _load(self, key: tuple[str, str]) -> tuple[str, bytes | None, str] | None:
+        with self._lock:
+            row = self._conn.execute(
+                """
+                SELECT status, payload, created_at
+                FROM scan_responses
+                WHERE subject_key = ? AND request_id = ?
+                """,
+                key,
+            ).fetchone()
+        if row is None:
+            return None
+        return str(row[0]), row[1], str(row[2])
+
+    def _claim(self, key: tuple[str, str]) -> bool:
+        now = datetime.now(timezone.utc)
+        abandoned_before = now - timedelta(seconds=self.wait_timeout_seconds * 2)
+        with self._lock:
+            # One statement, so two processes racing for the same key cannot both win.
+            cursor = self._conn.execute(
+                """
+                INSERT INTO scan_responses(subject_key, request_id, status, payload, created_at)
+                VALUES (?, ?, 'pending', NULL, ?)
+                ON CONFLICT(subject_key, request_id) DO UPDATE SET
+                    created_at = excluded.created_at
+                WHERE scan_responses.status = 'pending' AND scan_responses.created_at < ?
+                """,
+                (*key, now.isoformat(), abandoned_before.isoformat()),
+            )
+        return cursor.rowcount == 1
+
+    def _mark_pending(self, key: tuple[str, str]) -> None:
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO scan_responses(subject_key, request_id, status, payload, created_at)
+                VALUES (?, ?, 'pending', NULL, ?)
+                ON CONFLICT(subject_key, request_id) DO UPDATE SET
+                    status = 'pending',
+                    payload = NULL,
+                    created_at = excluded.created_at
+                """,
+                (*key, datetime.now(timezone.utc).isoformat()),
+            )
+
+    def _store_done(self, key: tuple[str, str], payload: str) -> None:
+        compressed = zlib.compress(payload.encode("utf-8"), level=6)
+        with self._lock:
+            self._conn.execute(
+                """
+                UPDATE scan_responses
+                SET status = 'done', payload = ?
+                WHERE subject_key = ? AND request_id = ?
+                """,
+                (compressed, *key),
+            )
+            self._writes_since_purge += 1
+            if self._writes_since_purge >= self._purge_every_writes:
+                self._writes_since_purge = 0
+                cutoff = datetime.now(timezone.utc) - timedelta(days=self.retention_days)
+                self._conn.execute(
+                    """
+                    DELETE FROM scan_responses
+                    WHERE rowid IN (
+                        SELECT rowid FROM scan_responses WHERE created_at < ? LIMIT 500
+                    )
+                    """,
+                    (cutoff.isoformat(),),
+                )
+
+    def _delete(self, key: tuple[str, str]) -> None:
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM scan_responses WHERE subject_key = ? AND request_id = ?",
+                key,
+            )
+
+
+def _resolve(future: asyncio.Future[str | None], payload: str | None) -> None:
+    if not future.done():
+        future.set_result(payload)
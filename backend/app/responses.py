@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import gzip
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse, Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+MIN_COMPRESS_BYTES = 1024
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered with orjson when it is installed, compact stdlib JSON otherwise."""
+
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def negotiate_encoding(accept_encoding: str | None) -> str | None:
+    """Pick `br` (when brotli is installed) or `gzip` from an Accept-Encoding header."""
+    if not accept_encoding:
+        return None
+    accepted: dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[token.strip().lower()] = quality
+
+    candidates = (["br"] if brotli is not None else []) + ["gzip"]
+    wildcard = accepted.get("*", 0.0)
+    ranked = [(accepted.get(name, wildcard), -index, name) for index, name in enumerate(candidates)]
+    quality, _, name = max(ranked)
+    return name if quality > 0 else None
+
+
+def encoded_json_response(body: bytes, accept_encoding: str | None, status_code: int = 200) -> Response:
+    """Wrap pre-serialized JSON, compressing it when the client accepts it and it is worth it."""
+    headers = {"Vary": "Accept-Encoding"}
+    encoding = negotiate_encoding(accept_encoding) if len(body) >= MIN_COMPRESS_BYTES else None
+    if encoding == "br":
+        body = brotli.compress(body, quality=5)
+        headers["Content-Encoding"] = "br"
+    elif encoding == "gzip":
+        body = gzip.compress(body, compresslevel=6)
+        headers["Content-Encoding"] = "gzip"
+    return Response(content=body, status_code=status_code, media_type="application/json", headers=headers)
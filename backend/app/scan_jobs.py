@@ -0,0 +1,244 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import statistics
+import time
+from collections import OrderedDict, deque
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from typing import Any
+
+
+logger = logging.getLogger("menulens")
+
+
+class ScanQueueFullError(Exception):
+    def __init__(self, retry_after_seconds: int) -> None:
+        super().__init__("Scan queue is full")
+        self.retry_after_seconds = retry_after_seconds
+
+
+@dataclass
+class ScanJobError:
+    status_code: int
+    detail: Any
+
+
+@dataclass
+class ScanJob:
+    scan_id: str
+    run: Callable[[], Awaitable[Any]] | None
+    status: str = "queued"
+    submitted_at: float = field(default_factory=time.monotonic)
+    started_at: float | None = None
+    finished_at: float | None = None
+    result: Any = None
+    error: ScanJobError | None = None
+    done: asyncio.Event = field(default_factory=asyncio.Event)
+
+    @property
+    def wait_ms(self) -> int:
+        started = self.started_at if self.started_at is not None else time.monotonic()
+        return int((started - self.submitted_at) * 1000)
+
+    @property
+    def run_ms(self) -> int | None:
+        if self.started_at is None or self.finished_at is None:
+            return None
+        return int((self.finished_at - self.started_at) * 1000)
+
+
+def _percentile(samples: list[float], fraction: float) -> float | None:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class ScanJobQueue:
+    """Bounded in-process queue of scan jobs drained by a fixed number of worker tasks.
+
+    `submit` never blocks: when `max_queued` jobs are already waiting it raises
+    `ScanQueueFullError` with a Retry-After estimate from recent run times, so a spike
+    turns into fast 429s instead of unbounded concurrent upstream calls. Finished jobs are
+    kept for `result_ttl_seconds` for clients to poll. Workers start on the first submit,
+    inside the serving event loop.
+    """
+
+    def __init__(
+        self,
+        workers: int = 4,
+        max_queued: int = 32,
+        result_ttl_seconds: float = 600.0,
+        sample_size: int = 200,
+    ) -> None:
+        if workers <= 0 or max_queued <= 0:
+            raise ValueError("workers and max_queued must be > 0")
+        self.workers = workers
+        self.max_queued = max_queued
+        self.result_ttl_seconds = result_ttl_seconds
+        self.submitted = 0
+        self.rejected = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.running = 0
+        self._held_slots = 0
+        self._jobs: OrderedDict[str, ScanJob] = OrderedDict()
+        self._queue: asyncio.Queue[ScanJob] | None = None
+        self._workers: list[asyncio.Task[None]] = []
+        self._wait_ms: deque[int] = deque(maxlen=sample_size)
+        self._run_ms: deque[int] = deque(maxlen=sample_size)
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def retry_after_seconds(self) -> int:
+        mean_run_seconds = statistics.fmean(self._run_ms) / 1000 if self._run_ms else 5.0
+        return max(1, math.ceil((self.queue_depth + 1) / self.workers * mean_run_seconds))
+
+    def check_capacity(self, max_queued: int | None = None) -> None:
+        """Raise `ScanQueueFullError` if a submit right now would be rejected.
+
+        `max_queued` lowers the bound for one caller, so lower-priority traffic can be held
+        to part of the queue.
+        """
+        if self.queue_depth + self._held_slots >= min(self.max_queued, max_queued or self.max_queued):
+            self.rejected += 1
+            raise ScanQueueFullError(self.retry_after_seconds())
+
+    def hold_slot(self, max_queued: int | None = None) -> None:
+        """Check capacity and keep one queue slot for a `submit(..., slot_held=True)` after an await.
+
+        Every held slot must end in that submit or in `release_slot`.
+        """
+        self.check_capacity(max_queued)
+        self._held_slots += 1
+
+    def release_slot(self) -> None:
+        self._held_slots -= 1
+
+    def submit(self, scan_id: str, run: Callable[[], Awaitable[Any]], slot_held: bool = False) -> ScanJob:
+        self._ensure_started()
+        self._purge_expired()
+        if slot_held:
+            self.release_slot()
+        else:
+            self.check_capacity()
+        job = ScanJob(scan_id=scan_id, run=run)
+        self._jobs[scan_id] = job
+        self._queue.put_nowait(job)
+        self.submitted += 1
+        return job
+
+    def get(self, scan_id: str) -> ScanJob | None:
+        self._purge_expired()
+        return self._jobs.get(scan_id)
+
+    def queue_position(self, job: ScanJob) -> int | None:
+        """1-based position among queued jobs, or None once the job has started."""
+        if job.status != "queued":
+            return None
+        position = 1
+        for queued in self._jobs.values():
+            if queued is job:
+                return position
+            if queued.status == "queued":
+                position += 1
+        return None
+
+    async def wait(self, job: ScanJob, timeout_seconds: float) -> ScanJob:
+        if timeout_seconds > 0 and not job.done.is_set():
+            try:
+                await asyncio.wait_for(job.done.wait(), timeout=timeout_seconds)
+            except asyncio.TimeoutError:
+                pass
+        return job
+
+    def _ensure_started(self) -> None:
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if not self._workers:
+            self._workers = [
+                asyncio.create_task(self._worker(), name=f"scan-job-worker-{index}") for index in range(self.workers)
+            ]
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            job.started_at = time.monotonic()
+            job.status = "running"
+            self._wait_ms.append(job.wait_ms)
+            self.running += 1
+            try:
+                job.result = await job.run()
+                job.status = "succeeded"
+                self.succeeded += 1
+            except asyncio.CancelledError:
+                job.error = ScanJobError(503, "Server is shutting down")
+                job.status = "failed"
+                raise
+            except Exception as exc:
+                status_code = getattr(exc, "status_code", 500)
+                detail = getattr(exc, "detail", None) or f"Scan job failed: {exc}"
+                if status_code >= 500:
+                    logger.warning("Scan job %s failed: %s", job.scan_id, detail)
+                job.error = ScanJobError(status_code, detail)
+                job.status = "failed"
+                self.failed += 1
+            finally:
+                job.finished_at = time.monotonic()
+                job.run = None
+                if job.run_ms is not None:
+                    self._run_ms.append(job.run_ms)
+                self.running -= 1
+                job.done.set()
+                self._queue.task_done()
+
+    def _purge_expired(self) -> None:
+        cutoff = time.monotonic() - self.result_ttl_seconds
+        for scan_id in [
+            scan_id
+            for scan_id, job in self._jobs.items()
+            if job.finished_at is not None and job.finished_at < cutoff
+        ]:
+            del self._jobs[scan_id]
+
+    async def aclose(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        # Jobs no worker picked up would otherwise stay "queued" forever: fail them so pollers get an
+        # answer and the TTL purge can drop them.
+        while self._queue is not None and not self._queue.empty():
+            job = self._queue.get_nowait()
+            job.error = ScanJobError(503, "Server is shutting down")
+            job.status = "failed"
+            job.finished_at = time.monotonic()
+            job.run = None
+            job.done.set()
+        # The queue belongs to the loop that is shutting down; a later submit starts fresh.
+        self._queue = None
+
+    def metrics(self) -> dict[str, Any]:
+        wait_samples = list(self._wait_ms)
+        run_samples = list(self._run_ms)
+        return {
+            "workers": self.workers,
+            "max_queued": self.max_queued,
+            "queue_depth": self.queue_depth,
+            "running": self.running,
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "retained_jobs": len(self._jobs),
+            "wait_ms_p50": _percentile(wait_samples, 0.5),
+            "wait_ms_p95": _percentile(wait_samples, 0.95),
+            "run_ms_p50": _percentile(run_samples, 0.5),
+            "run_ms_p95": _percentile(run_samples, 0.95),
+            "retry_after_seconds": self.retry_after_seconds(),
+        }
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import os
+from collections.abc import Mapping
+from dataclasses import dataclass
+from types import MappingProxyType
+
+
+OCR_PIPELINE_MODES = ("vision_only", "hybrid", "fused", "gemini_vision", "layout_chunked")
+IMAGE_SEARCH_PROVIDERS = ("none", "cse", "vertex")
+_CREDENTIAL_ENV_VARS = (
+    "GOOGLE_CLOUD_VISION_API_KEY",
+    "GEMINI_API_KEY",
+    "GOOGLE_CSE_API_KEY",
+    "GOOGLE_CSE_CX",
+    "GCP_PROJECT_ID",
+    "VERTEX_SEARCH_LOCATION",
+    "VERTEX_SEARCH_APP_ID",
+)
+
+
+class SettingsError(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class Settings:
+    """Per-request pipeline configuration, read from the environment once and never mutated.
+
+    Invalid or missing values do not fail the load: they are recorded in `invalid` and
+    raised by `check`/`require` when a request actually needs them, so a misconfigured
+    provider only breaks the requests that use it.
+    """
+
+    ocr_pipeline_mode: str
+    max_menu_items: int
+    image_search_provider: str
+    gemini_model: str
+    gemini_response_schema: bool
+    gemini_streaming: bool
+    gemini_vision_max_image_side: int
+    layout_max_regions: int
+    layout_region_max_chars: int
+    layout_max_total_items: int
+    dish_dictionary_enabled: bool
+    dish_dictionary_version: str
+    dish_dictionary_min_coverage: float
+    # Guards the ops endpoints (metrics, warm cache, profiles); they are disabled when empty.
+    ops_api_key: str
+    credentials: Mapping[str, str]
+    invalid: Mapping[str, str]
+
+    def check(self, name: str) -> None:
+        if name in self.invalid:
+            raise SettingsError(self.invalid[name])
+
+    def require(self, name: str) -> str:
+        value = self.credentials.get(name, "")
+        if not value:
+            raise SettingsError(f"Missing required env var: {name}")
+        return value
+
+
+def load_settings(environ: Mapping[str, str] | None = None) -> Settings:
+    env = os.environ if environ is None else environ
+    invalid: dict[str, str] = {}
+
+    ocr_pipeline_mode = env.get("OCR_PIPELINE_MODE", "hybrid").strip().lower()
+    if ocr_pipeline_mode not in OCR_PIPELINE_MODES:
+        invalid["OCR_PIPELINE_MODE"] = f"Invalid OCR_PIPELINE_MODE. Use one of: {', '.join(OCR_PIPELINE_MODES)}."
+        ocr_pipeline_mode = "hybrid"
+
+    max_menu_items = _bounded_int(env, invalid, "MAX_MENU_ITEMS", 10, 1, 20)
+    gemini_vision_max_image_side = _bounded_int(env, invalid, "GEMINI_VISION_MAX_IMAGE_SIDE", 1536, 256, 4096)
+    layout_max_regions = _bounded_int(env, invalid, "LAYOUT_MAX_REGIONS", 6, 1, 16)
+    layout_region_max_chars = _bounded_int(env, invalid, "LAYOUT_REGION_MAX_CHARS", 1200, 200, 8000)
+    layout_max_total_items = _bounded_int(env, invalid, "LAYOUT_MAX_TOTAL_ITEMS", 60, 1, 200)
+    dish_dictionary_min_coverage_pct = _bounded_int(env, invalid, "DISH_DICTIONARY_MIN_COVERAGE_PCT", 60, 0, 100)
+
+    provider = env.get("IMAGE_SEARCH_PROVIDER", "cse").strip().lower() or "cse"
+    if provider not in IMAGE_SEARCH_PROVIDERS:
+        invalid["IMAGE_SEARCH_PROVIDER"] = (
+            f"Invalid IMAGE_SEARCH_PROVIDER. Use one of: {', '.join(IMAGE_SEARCH_PROVIDERS)}."
+        )
+        provider = "none"
+    if env.get("ENABLE_IMAGE_SEARCH", "true").strip().lower() != "true":
+        provider = "none"
+
+    return Settings(
+        ocr_pipeline_mode=ocr_pipeline_mode,
+        max_menu_items=max_menu_items,
+        image_search_provider=provider,
+        gemini_model=env.get("GEMINI_MODEL", "gemini-1.5-flash"),
+        gemini_response_schema=env.get("GEMINI_RESPONSE_SCHEMA", "true").strip().lower() == "true",
+        gemini_streaming=env.get("GEMINI_STREAMING", "false").strip().lower() == "true",
+        gemini_vision_max_image_side=gemini_vision_max_image_side,
+        layout_max_regions=layout_max_regions,
+        layout_region_max_chars=layout_region_max_chars,
+        layout_max_total_items=layout_max_total_items,
+        dish_dictionary_enabled=env.get("ENABLE_DISH_DICTIONARY", "false").strip().lower() == "true",
+        dish_dictionary_version=env.get("DISH_DICTIONARY_VERSION", "dishes_v1").strip() or "dishes_v1",
+        dish_dictionary_min_coverage=dish_dictionary_min_coverage_pct / 100,
+        ops_api_key=env.get("OPS_API_KEY", "").strip(),
+        credentials=MappingProxyType({name: env.get(name, "").strip() for name in _CREDENTIAL_ENV_VARS}),
+        invalid=MappingProxyType(invalid),
+    )
+
+
+def _bounded_int(
+    env: Mapping[str, str],
+    invalid: dict[str, str],
+    name: str,
+    default: int,
+    low: int,
+    high: int,
+) -> int:
+    message = f"Invalid {name}. Use an integer between {low} and {high}."
+    try:
+        value = int(env.get(name, str(default)).strip())
+    except ValueError:
+        invalid[name] = message
+        return default
+    if value < low or value > high:
+        invalid[name] = message
+        return default
+    return value
@@ -0,0 +1,410 @@
+from __future__ import annotations
+
+import abc
+import argparse
+import contextvars
+import hashlib
+import json
+import logging
+import queue
+import re
+import sys
+import threading
+import time
+from collections import defaultdict
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any
+from uuid import uuid4
+
+import httpx
+
+
+logger = logging.getLogger("menulens")
+
+_HEX32_RE = re.compile(r"^[0-9a-f]{32}$")
+_current_span: contextvars.ContextVar[Span | None] = contextvars.ContextVar("menulens_trace_span", default=None)
+
+
+def trace_id_for(request_id: str | None) -> str:
+    """Trace id shared with the client: its `request_id` as 32 hex chars, or a hash of it."""
+    if not request_id:
+        return uuid4().hex
+    compact = request_id.strip().replace("-", "").lower()
+    if _HEX32_RE.match(compact):
+        return compact
+    return hashlib.sha256(request_id.strip().encode("utf-8")).hexdigest()[:32]
+
+
+@dataclass
+class Span:
+    name: str
+    trace: _Trace
+    parent_id: str | None
+    span_id: str = field(default_factory=lambda: uuid4().hex[:16])
+    attributes: dict[str, Any] = field(default_factory=dict)
+    start_unix_ms: float = field(default_factory=lambda: time.time() * 1000)
+    _start: float = field(default_factory=time.perf_counter)
+    duration_ms: float | None = None
+    status: str = "ok"
+
+    @property
+    def trace_id(self) -> str:
+        return self.trace.trace_id
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def fail(self, error: BaseException) -> None:
+        self.status = "error"
+        self.attributes["error"] = f"{type(error).__name__}: {error}"[:300]
+
+    def end(self) -> None:
+        if self.duration_ms is None:
+            self.duration_ms = (time.perf_counter() - self._start) * 1000
+            self.trace.finish(self)
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id,
+            "name": self.name,
+            "start_unix_ms": round(self.start_unix_ms, 3),
+            "duration_ms": round(self.duration_ms, 3) if self.duration_ms is not None else None,
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    trace_id = None
+    span_id = None
+
+    def set(self, **attributes: Any) -> None:
+        pass
+
+    def fail(self, error: BaseException) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class _Trace:
+    """Buffers one trace's finished spans and exports them together when the root ends."""
+
+    def __init__(self, trace_id: str, exporter: SpanExporter) -> None:
+        self.trace_id = trace_id
+        self.exporter = exporter
+        self.root: Span | None = None
+        self._finished: list[Span] = []
+
+    def finish(self, span: Span) -> None:
+        if self.root is None or self.root.duration_ms is None:
+            self._finished.append(span)
+            return
+        if span is self.root:
+            spans, self._finished = self._finished + [span], []
+            self.exporter.export(spans)
+            return
+        # Background work (an image lookup outliving the response) still gets recorded.
+        self.exporter.export([span])
+
+
+class Tracer:
+    def __init__(self, exporter: SpanExporter) -> None:
+        self.exporter = exporter
+
+    @contextmanager
+    def trace(self, name: str, trace_id: str, parent_id: str | None = None, **attributes: Any) -> Iterator[Span]:
+        """Root span of a request (or of a queued job continuing a request's trace)."""
+        root = Span(name=name, trace=_Trace(trace_id, self.exporter), parent_id=parent_id, attributes=attributes)
+        root.trace.root = root
+        with _activate(root):
+            yield root
+
+    def close(self) -> None:
+        self.exporter.close()
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span | _NoopSpan]:
+    """Child span of the current span; a no-op outside a traced request."""
+    parent = _current_span.get()
+    if parent is None:
+        yield NOOP_SPAN
+        return
+    with _activate(Span(name=name, trace=parent.trace, parent_id=parent.span_id, attributes=attributes)) as child:
+        yield child
+
+
+def start_span(name: str, **attributes: Any) -> Span | _NoopSpan:
+    """Child span that the caller ends explicitly, for work that outlives the calling frame."""
+    parent = _current_span.get()
+    if parent is None:
+        return NOOP_SPAN
+    return Span(name=name, trace=parent.trace, parent_id=parent.span_id, attributes=attributes)
+
+
+def current_trace_id() -> str | None:
+    active = _current_span.get()
+    return active.trace_id if active is not None else None
+
+
+@contextmanager
+def _activate(active: Span) -> Iterator[Span]:
+    token = _current_span.set(active)
+    try:
+        yield active
+    except BaseException as exc:
+        active.fail(exc)
+        raise
+    finally:
+        _current_span.reset(token)
+        active.end()
+
+
+class TracingTransport(httpx.AsyncBaseTransport):
+    """Records one span per upstream HTTP call made inside a traced request.
+
+    The span ends when the response body is closed, so streamed Gemini responses are
+    timed to the last byte; `ttfb_ms` is when the headers arrived. Query strings are
+    dropped because they carry API keys.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport) -> None:
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        upstream = start_span(
+            f"http {request.method} {request.url.host}",
+            http_method=request.method,
+            http_host=request.url.host,
+            http_path=request.url.path,
+            request_bytes=int(request.headers.get("content-length", 0)),
+        )
+        if upstream is NOOP_SPAN:
+            return await self._transport.handle_async_request(request)
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException as exc:
+            upstream.fail(exc)
+            upstream.end()
+            raise
+        upstream.set(status_code=response.status_code, ttfb_ms=round((time.perf_counter() - upstream._start) * 1000, 3))
+        if response.status_code >= 500:
+            upstream.status = "error"
+        if response.is_closed:
+            # Transports that hand back an already-read body (mocks, stand-ins) never close the stream.
+            upstream.set(response_bytes=len(response.content))
+            upstream.end()
+        else:
+            response.stream = _SpanClosingStream(response.stream, upstream)
+        return response
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+class _SpanClosingStream(httpx.AsyncByteStream):
+    def __init__(self, stream: Any, upstream: Span) -> None:
+        self._stream = stream
+        self._span = upstream
+        self._bytes = 0
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            self._bytes += len(chunk)
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            self._span.set(response_bytes=self._bytes)
+            self._span.end()
+
+
+class SpanExporter(abc.ABC):
+    """Writes finished spans from a background thread so request handling never blocks on I/O.
+
+    At most `max_queued_batches` batches wait for the writer. When a slow or unreachable
+    sink falls that far behind, new batches are dropped and counted in `failures`, rather
+    than letting memory grow with every traced request.
+    """
+
+    def __init__(self, max_queued_batches: int = 1000) -> None:
+        if max_queued_batches <= 0:
+            raise ValueError("max_queued_batches must be > 0")
+        self.exported = 0
+        self.failures = 0
+        self._queue: queue.Queue[list[dict[str, Any]] | None] = queue.Queue(maxsize=max_queued_batches)
+        self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, spans: list[Span]) -> None:
+        try:
+            self._queue.put_nowait([finished.as_dict() for finished in spans])
+        except queue.Full:
+            self.failures += 1
+            logger.warning("Span export queue is full; dropped %s spans.", len(spans))
+
+    def close(self) -> None:
+        try:
+            self._queue.put(None, timeout=5)
+        except queue.Full:
+            logger.warning("Span exporter did not drain before shutdown; queued spans are lost.")
+            return
+        self._thread.join(timeout=5)
+
+    def _run(self) -> None:
+        while True:
+            batch = self._queue.get()
+            if batch is None:
+                self._close()
+                return
+            try:
+                self._write(batch)
+                self.exported += len(batch)
+            except Exception:
+                self.failures += 1
+                logger.exception("Span export failed; dropped %s spans.", len(batch))
+
+    @abc.abstractmethod
+    def _write(self, batch: list[dict[str, Any]]) -> None:
+        """Persist one batch; runs on the exporter thread."""
+
+    def _close(self) -> None:
+        pass
+
+
+class JsonlSpanExporter(SpanExporter):
+    def __init__(self, path: str | Path, max_queued_batches: int = 1000) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        super().__init__(max_queued_batches)
+
+    def _write(self, batch: list[dict[str, Any]]) -> None:
+        with self.path.open("a", encoding="utf-8") as handle:
+            for record in batch:
+                handle.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+
+
+class HttpSpanExporter(SpanExporter):
+    """POSTs each batch as a JSON array, e.g. to `python -m app.tracing collect`."""
+
+    def __init__(self, url: str, timeout_seconds: float = 2.0, max_queued_batches: int = 1000) -> None:
+        self.url = url
+        self._client = httpx.Client(timeout=timeout_seconds)
+        super().__init__(max_queued_batches)
+
+    def _write(self, batch: list[dict[str, Any]]) -> None:
+        self._client.post(self.url, content=json.dumps(batch, default=str)).raise_for_status()
+
+    def _close(self) -> None:
+        self._client.close()
+
+
+def _percentile(ordered: list[float], fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summarize(records: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Per span-name latency distribution across traces, slowest p99 first."""
+    durations: dict[str, list[float]] = defaultdict(list)
+    errors: dict[str, int] = defaultdict(int)
+    for record in records:
+        if record.get("duration_ms") is None:
+            continue
+        durations[record["name"]].append(float(record["duration_ms"]))
+        if record.get("status") == "error":
+            errors[record["name"]] += 1
+    rows = []
+    for name, values in durations.items():
+        ordered = sorted(values)
+        rows.append(
+            {
+                "name": name,
+                "count": len(ordered),
+                "errors": errors[name],
+                "p50_ms": round(_percentile(ordered, 0.5), 1),
+                "p95_ms": round(_percentile(ordered, 0.95), 1),
+                "p99_ms": round(_percentile(ordered, 0.99), 1),
+                "max_ms": round(ordered[-1], 1),
+            }
+        )
+    return sorted(rows, key=lambda row: row["p99_ms"], reverse=True)
+
+
+def _load_records(paths: list[str]) -> list[dict[str, Any]]:
+    records = []
+    for path in paths:
+        with open(path, encoding="utf-8") as handle:
+            records.extend(json.loads(line) for line in handle if line.strip())
+    return records
+
+
+def make_collector(port: int, output: Path) -> ThreadingHTTPServer:
+    """Local stand-in for a trace collector: appends every POSTed span batch to `output`."""
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self) -> None:
+            body = self.rfile.read(int(self.headers.get("Content-Length", "0")))
+            try:
+                batch = json.loads(body)
+            except json.JSONDecodeError:
+                self.send_response(400)
+                self.end_headers()
+                return
+            with lock, output.open("a", encoding="utf-8") as handle:
+                for record in batch:
+                    handle.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+    return ThreadingHTTPServer(("127.0.0.1", port), Handler)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Collect or summarize MenuLens trace spans.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    collect = commands.add_parser("collect", help="Run a local collector that appends posted spans to a JSONL file.")
+    collect.add_argument("--port", type=int, default=4318)
+    collect.add_argument("--output", type=Path, default=Path("traces.jsonl"))
+    report = commands.add_parser("summarize", help="Per-span p50/p95/p99 latency from span JSONL files.")
+    report.add_argument("paths", nargs="+")
+    args = parser.parse_args(argv)
+
+    if args.command == "collect":
+        server = make_collector(args.port, args.output)
+        print(f"Collecting spans on http://127.0.0.1:{server.server_port}/ into {args.output}", file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        return 0
+    rows = summarize(_load_records(args.paths))
+    print(f"{'span':<48} {'count':>7} {'errors':>6} {'p50_ms':>9} {'p95_ms':>9} {'p99_ms':>9} {'max_ms':>9}")
+    for row in rows:
+        print(
+            f"{row['name'][:48]:<48} {row['count']:>7} {row['errors']:>6} "
+            f"{row['p50_ms']:>9} {row['p95_ms']:>9} {row['p99_ms']:>9} {row['max_ms']:>9}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
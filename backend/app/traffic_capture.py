@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import contextvars
+import hashlib
+import json
+import logging
+import queue
+import random
+import secrets
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any
+
+
+logger = logging.getLogger("menulens")
+
+# Noted in the clear by callers and hashed just before the record is queued for writing.
+_PSEUDONYMIZED_FIELDS = ("subject_key",)
+_current_record: contextvars.ContextVar[dict[str, Any] | None] = contextvars.ContextVar(
+    "menulens_traffic_capture", default=None
+)
+
+
+class TrafficCapture:
+    """Appends one sanitized JSONL record per captured scan, for `benchmarks.traffic_replay`.
+
+    Records never hold the image, the device id, the account uid or the raw request id:
+    subjects and request ids are replaced by pseudonyms that are salted per process, so
+    retries of one request still share a key within a capture file.
+    """
+
+    def __init__(self, path: str | Path, sample_rate: float = 1.0, max_records: int = 100_000) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.sample_rate = sample_rate
+        self.max_records = max_records
+        self.captured = 0
+        self.dropped = 0
+        self._salt = secrets.token_bytes(16)
+        self._queue: queue.SimpleQueue[dict[str, Any] | None] = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="traffic-capture", daemon=True)
+        self._thread.start()
+
+    def pseudonym(self, value: str | None) -> str | None:
+        if not value:
+            return None
+        return hashlib.sha256(self._salt + value.encode("utf-8")).hexdigest()[:16]
+
+    def should_capture(self, request_id: str | None) -> bool:
+        if self.captured >= self.max_records:
+            return False
+        if self.sample_rate >= 1.0:
+            return True
+        # Sampled per request id, so a captured request keeps its retries.
+        draw = random.random() if not request_id else int(self.pseudonym(request_id), 16) / 16**16
+        return draw < self.sample_rate
+
+    @contextmanager
+    def capture(self, request_id: str | None, **fields: Any) -> Iterator[dict[str, Any]]:
+        """Collect one scan's record; `note()` calls anywhere below this frame add to it."""
+        if not self.should_capture(request_id):
+            yield {}
+            return
+        self.captured += 1
+        record: dict[str, Any] = {
+            "arrival_unix_ms": round(time.time() * 1000, 3),
+            "request_key": self.pseudonym(request_id),
+            **fields,
+        }
+        token = _current_record.set(record)
+        start = time.perf_counter()
+        try:
+            yield record
+            record.setdefault("status_code", 200)
+        except BaseException as exc:
+            record["status_code"] = getattr(exc, "status_code", 500)
+            detail = getattr(exc, "detail", None)
+            if isinstance(detail, dict):
+                record["error_code"] = detail.get("code")
+            raise
+        finally:
+            _current_record.reset(token)
+            for field in _PSEUDONYMIZED_FIELDS:
+                record[field] = self.pseudonym(record.get(field))
+            record["latency_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            self._queue.put(record)
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+    def _run(self) -> None:
+        while True:
+            record = self._queue.get()
+            if record is None:
+                return
+            try:
+                with self.path.open("a", encoding="utf-8") as handle:
+                    handle.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            except OSError:
+                self.dropped += 1
+                logger.exception("Traffic capture write failed; dropped one record.")
+
+
+def note(**fields: Any) -> None:
+    """Add fields to the scan being captured; a no-op when the current request is not captured."""
+    record = _current_record.get()
+    if record is not None:
+        record.update(fields)
+
+
+def note_image(image_bytes: bytes) -> None:
+    # Hashing a multi-megabyte upload is only worth it for captured requests.
+    record = _current_record.get()
+    if record is not None:
+        record.update(image_sha256=hashlib.sha256(image_bytes).hexdigest(), image_bytes=len(image_bytes))
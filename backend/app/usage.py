@@ -1,13 +1,19 @@
 from __future__ import annotations
 
-import sqlite3
+import logging
 import threading
-from dataclasses import dataclass
+from collections.abc import Callable
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta, timezone
-from pathlib import Path
+
+from app.usage_backends import CompactionResult, PendingUsage, SQLiteUsageBackend, UsageBackend
 
 
 TOKYO_TZ = timezone(timedelta(hours=9))
+COUNTER_MODES = ("direct", "memory")
+# "sqlite" named the direct mode before usage backends became pluggable.
+_COUNTER_MODE_ALIASES = {"sqlite": "direct"}
+logger = logging.getLogger("menulens")
 
 
 @dataclass
@@ -22,247 +28,333 @@ class UsageDecision:
     duplicate_request: bool
 
 
+@dataclass
+class _CounterEntry:
+    used_scans: int
+    quota_scans: int
+    plan: str
+    seen_request_ids: set[str] = field(default_factory=set)
+    pending_request_ids: list[tuple[str, str]] = field(default_factory=list)
+    pending_anonymous_scans: int = 0
+
+    @property
+    def has_pending(self) -> bool:
+        return bool(self.pending_request_ids) or self.pending_anonymous_scans > 0
+
+
 class UsageStore:
-    def __init__(self, db_path: str, free_quota: int, pro_quota: int) -> None:
+    def __init__(
+        self,
+        db_path: str,
+        free_quota: int,
+        pro_quota: int,
+        counter_mode: str = "direct",
+        flush_interval_seconds: float = 5.0,
+        backend: UsageBackend | None = None,
+        idempotency_retention_days: int = 30,
+        usage_retention_months: int = 3,
+        compaction_batch_size: int = 500,
+        compaction_interval_seconds: float | None = None,
+    ) -> None:
         if free_quota <= 0:
             raise ValueError("free_quota must be > 0")
         if pro_quota <= 0:
             raise ValueError("pro_quota must be > 0")
+        counter_mode = _COUNTER_MODE_ALIASES.get(counter_mode, counter_mode)
+        if counter_mode not in COUNTER_MODES:
+            raise ValueError(f"counter_mode must be one of: {', '.join(COUNTER_MODES)}")
+        if flush_interval_seconds <= 0:
+            raise ValueError("flush_interval_seconds must be > 0")
+        if idempotency_retention_days <= 0:
+            raise ValueError("idempotency_retention_days must be > 0")
+        if usage_retention_months <= 0:
+            raise ValueError("usage_retention_months must be > 0")
+        if compaction_batch_size <= 0:
+            raise ValueError("compaction_batch_size must be > 0")
+        if compaction_interval_seconds is not None and compaction_interval_seconds <= 0:
+            raise ValueError("compaction_interval_seconds must be > 0")
 
         self.free_quota = free_quota
         self.pro_quota = pro_quota
-        self._db_path = str(Path(db_path))
-        self._lock = threading.Lock()
-        self._conn = sqlite3.connect(self._db_path, check_same_thread=False, isolation_level=None)
-        self._conn.row_factory = sqlite3.Row
-        self._initialize_schema()
+        self.counter_mode = counter_mode
+        self.flush_interval_seconds = flush_interval_seconds
+        self.idempotency_retention_days = idempotency_retention_days
+        self.usage_retention_months = usage_retention_months
+        self.compaction_batch_size = compaction_batch_size
+        self.compaction_interval_seconds = compaction_interval_seconds
+        self.backend = backend if backend is not None else SQLiteUsageBackend(db_path)
 
-    def _initialize_schema(self) -> None:
-        with self._lock:
-            self._conn.execute(
-                """
-                CREATE TABLE IF NOT EXISTS user_entitlements (
-                    subject_key TEXT PRIMARY KEY,
-                    plan TEXT NOT NULL,
-                    pro_expires_at TEXT NULL,
-                    updated_at TEXT NOT NULL
-                )
-                """
-            )
-            self._conn.execute(
-                """
-                CREATE TABLE IF NOT EXISTS monthly_scan_usage (
-                    subject_key TEXT NOT NULL,
-                    period_ym TEXT NOT NULL,
-                    used_scans INTEGER NOT NULL,
-                    quota_scans INTEGER NOT NULL,
-                    plan_snapshot TEXT NOT NULL,
-                    updated_at TEXT NOT NULL,
-                    PRIMARY KEY(subject_key, period_ym)
-                )
-                """
-            )
-            self._conn.execute(
-                """
-                CREATE TABLE IF NOT EXISTS processed_scan_requests (
-                    subject_key TEXT NOT NULL,
-                    request_id TEXT NOT NULL,
-                    period_ym TEXT NOT NULL,
-                    created_at TEXT NOT NULL,
-                    PRIMARY KEY(subject_key, request_id)
-                )
-                """
-            )
+        # Memory mode: counters are authoritative between flushes; the backend is reconciled on flush.
+        # `_lock` only guards the dict and counter entries, never backend I/O.
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._counters: dict[tuple[str, str], _CounterEntry] = {}
+        # Bumped whenever a flush drops counters, so an entry loaded before that flush is reloaded.
+        self._flush_generation = 0
+        self._stop_background = threading.Event()
+        self._background_threads: list[threading.Thread] = []
+        if counter_mode == "memory":
+            self._start_background(self._flush_loop, "usage-flush")
+        if compaction_interval_seconds is not None:
+            self._start_background(self._compaction_loop, "usage-compaction")
 
     def set_plan(self, subject_key: str, plan: str, pro_expires_at: str | None = None) -> None:
         normalized_plan = plan.strip().lower()
         if normalized_plan not in {"free", "pro"}:
             raise ValueError("plan must be one of: free, pro")
 
-        now_iso = self._now_utc().isoformat()
+        now_utc = self._now_utc()
+        self.backend.set_entitlement(subject_key, normalized_plan, pro_expires_at, now_utc.isoformat())
+        if not self._counters:
+            return
+        resolved_plan = self.resolve_plan(subject_key, now_utc=now_utc)
         with self._lock:
-            self._conn.execute(
-                """
-                INSERT INTO user_entitlements(subject_key, plan, pro_expires_at, updated_at)
-                VALUES (?, ?, ?, ?)
-                ON CONFLICT(subject_key) DO UPDATE SET
-                    plan = excluded.plan,
-                    pro_expires_at = excluded.pro_expires_at,
-                    updated_at = excluded.updated_at
-                """,
-                (subject_key, normalized_plan, pro_expires_at, now_iso),
-            )
+            for (counter_subject_key, _), entry in self._counters.items():
+                if counter_subject_key == subject_key:
+                    entry.plan = resolved_plan
+                    entry.quota_scans = self._quota_for(resolved_plan)
+
+    def resolve_plan(self, subject_key: str, now_utc: datetime | None = None) -> str:
+        entitlement = self.backend.get_entitlement(subject_key)
+        if entitlement is None:
+            return "free"
+
+        plan = str(entitlement[0]).strip().lower()
+        if plan not in {"free", "pro"}:
+            return "free"
+
+        if plan == "pro":
+            expires_at_raw = entitlement[1]
+            if expires_at_raw:
+                now = now_utc or self._now_utc()
+                try:
+                    expires_at = datetime.fromisoformat(str(expires_at_raw))
+                    if expires_at.tzinfo is None:
+                        expires_at = expires_at.replace(tzinfo=TOKYO_TZ)
+                    if expires_at.astimezone(timezone.utc) <= now.astimezone(timezone.utc):
+                        plan = "free"
+                except ValueError:
+                    plan = "free"
+
+        return plan
 
     def consume_scan(self, subject_key: str, request_id: str | None = None) -> UsageDecision:
         now_utc = self._now_utc()
-        now_tokyo = now_utc.astimezone(TOKYO_TZ)
-        period_ym = f"{now_tokyo.year:04d}-{now_tokyo.month:02d}"
-        now_iso = now_utc.isoformat()
+        period_ym = self._period_ym(now_utc)
 
-        with self._lock:
-            self._conn.execute("BEGIN IMMEDIATE")
-            try:
-                plan = self._resolve_plan_locked(subject_key=subject_key, now_utc=now_utc)
-                quota = self.pro_quota if plan == "pro" else self.free_quota
+        if self.counter_mode == "memory":
+            return self._consume_scan_memory(
+                subject_key=subject_key,
+                request_id=request_id,
+                period_ym=period_ym,
+                now_utc=now_utc,
+            )
 
-                usage = self._upsert_and_fetch_usage_locked(
-                    subject_key=subject_key,
-                    period_ym=period_ym,
-                    quota=quota,
+        plan = self.resolve_plan(subject_key, now_utc=now_utc)
+        result = self.backend.consume(
+            subject_key=subject_key,
+            period_ym=period_ym,
+            request_id=request_id,
+            quota=self._quota_for(plan),
+            plan=plan,
+            now_iso=now_utc.isoformat(),
+        )
+        return self._to_decision(
+            allowed=result.allowed,
+            duplicate_request=result.duplicate_request,
+            subject_key=subject_key,
+            period_ym=period_ym,
+            used_scans=result.used_scans,
+            quota_scans=result.quota_scans,
+            plan=result.plan,
+        )
+
+    def _consume_scan_memory(
+        self,
+        *,
+        subject_key: str,
+        request_id: str | None,
+        period_ym: str,
+        now_utc: datetime,
+    ) -> UsageDecision:
+        key = (subject_key, period_ym)
+        loaded: tuple[int, _CounterEntry] | None = None
+        while True:
+            with self._lock:
+                entry = self._counters.get(key)
+                if entry is None and loaded is not None and loaded[0] == self._flush_generation:
+                    entry = self._counters[key] = loaded[1]
+                if entry is not None:
+                    return self._charge_entry(entry, subject_key, request_id, period_ym, now_utc)
+                generation = self._flush_generation
+            # Loaded without the lock, so a slow backend only delays scans for this subject.
+            plan = self.resolve_plan(subject_key, now_utc=now_utc)
+            used_scans, seen_request_ids = self.backend.load_counter(subject_key, period_ym)
+            loaded = (
+                generation,
+                _CounterEntry(
+                    used_scans=used_scans,
+                    quota_scans=self._quota_for(plan),
                     plan=plan,
-                    updated_at=now_iso,
-                )
+                    seen_request_ids=seen_request_ids,
+                ),
+            )
 
-                if request_id:
-                    duplicate = self._conn.execute(
-                        """
-                        SELECT 1
-                        FROM processed_scan_requests
-                        WHERE subject_key = ? AND request_id = ?
-                        """,
-                        (subject_key, request_id),
-                    ).fetchone()
-                    if duplicate:
-                        self._conn.execute("COMMIT")
-                        return self._to_decision(
-                            allowed=True,
-                            duplicate_request=True,
-                            subject_key=subject_key,
-                            period_ym=period_ym,
-                            used_scans=int(usage["used_scans"]),
-                            quota_scans=int(usage["quota_scans"]),
-                            plan=str(usage["plan_snapshot"]),
-                        )
-
-                used_scans = int(usage["used_scans"])
-                quota_scans = int(usage["quota_scans"])
-                if used_scans >= quota_scans:
-                    self._conn.execute("COMMIT")
-                    return self._to_decision(
-                        allowed=False,
-                        duplicate_request=False,
+    def _charge_entry(
+        self,
+        entry: _CounterEntry,
+        subject_key: str,
+        request_id: str | None,
+        period_ym: str,
+        now_utc: datetime,
+    ) -> UsageDecision:
+        # Called with `_lock` held.
+        if request_id and request_id in entry.seen_request_ids:
+            allowed, duplicate_request = True, True
+        elif entry.used_scans >= entry.quota_scans:
+            allowed, duplicate_request = False, False
+        else:
+            allowed, duplicate_request = True, False
+            entry.used_scans += 1
+            if request_id:
+                entry.seen_request_ids.add(request_id)
+                entry.pending_request_ids.append((request_id, now_utc.isoformat()))
+            else:
+                entry.pending_anonymous_scans += 1
+
+        return self._to_decision(
+            allowed=allowed,
+            duplicate_request=duplicate_request,
+            subject_key=subject_key,
+            period_ym=period_ym,
+            used_scans=entry.used_scans,
+            quota_scans=entry.quota_scans,
+            plan=entry.plan,
+        )
+
+    def flush(self) -> int:
+        """Write pending in-memory scans to the backend and drop flushed counters.
+
+        Backends charge only request_ids they have not recorded yet, so a flush retried
+        after a failure (or racing another process) never double-counts. Dropped counters
+        are reloaded from the backend on next use, which reconciles them with writes made
+        by other processes.
+        """
+        if self.counter_mode != "memory":
+            return 0
+
+        with self._flush_lock:
+            return self._flush_pending()
+
+    def _flush_pending(self) -> int:
+        with self._lock:
+            batches: list[PendingUsage] = []
+            for (subject_key, period_ym), entry in self._counters.items():
+                if not entry.has_pending:
+                    continue
+                batches.append(
+                    PendingUsage(
                         subject_key=subject_key,
                         period_ym=period_ym,
-                        used_scans=used_scans,
-                        quota_scans=quota_scans,
-                        plan=str(usage["plan_snapshot"]),
+                        quota_scans=entry.quota_scans,
+                        plan=entry.plan,
+                        anonymous_scans=entry.pending_anonymous_scans,
+                        request_ids=list(entry.pending_request_ids),
                     )
-
-                self._conn.execute(
-                    """
-                    UPDATE monthly_scan_usage
-                    SET used_scans = used_scans + 1,
-                        updated_at = ?
-                    WHERE subject_key = ? AND period_ym = ?
-                    """,
-                    (now_iso, subject_key, period_ym),
                 )
+                entry.pending_anonymous_scans = 0
+                entry.pending_request_ids = []
 
-                if request_id:
-                    self._conn.execute(
-                        """
-                        INSERT INTO processed_scan_requests(subject_key, request_id, period_ym, created_at)
-                        VALUES (?, ?, ?, ?)
-                        """,
-                        (subject_key, request_id, period_ym, now_iso),
-                    )
-
-                usage_after = self._conn.execute(
-                    """
-                    SELECT used_scans, quota_scans, plan_snapshot
-                    FROM monthly_scan_usage
-                    WHERE subject_key = ? AND period_ym = ?
-                    """,
-                    (subject_key, period_ym),
-                ).fetchone()
-
-                self._conn.execute("COMMIT")
-                return self._to_decision(
-                    allowed=True,
-                    duplicate_request=False,
-                    subject_key=subject_key,
-                    period_ym=period_ym,
-                    used_scans=int(usage_after["used_scans"]),
-                    quota_scans=int(usage_after["quota_scans"]),
-                    plan=str(usage_after["plan_snapshot"]),
-                )
+        applied = 0
+        if batches:
+            try:
+                applied = self.backend.apply_pending(batches, self._now_utc().isoformat())
             except Exception:
-                self._conn.execute("ROLLBACK")
+                with self._lock:
+                    for batch in batches:
+                        entry = self._counters[(batch.subject_key, batch.period_ym)]
+                        entry.pending_anonymous_scans += batch.anonymous_scans
+                        entry.pending_request_ids[:0] = batch.request_ids
                 raise
 
+        with self._lock:
+            for key in [key for key, entry in self._counters.items() if not entry.has_pending]:
+                del self._counters[key]
+            self._flush_generation += 1
+        return applied
+
+    def compact(self) -> CompactionResult:
+        """Expire old idempotency keys and archive monthly rows outside the retention window."""
+        now_utc = self._now_utc()
+        request_id_cutoff = now_utc - timedelta(days=self.idempotency_retention_days)
+        usage_cutoff_period = self._shift_period(self._period_ym(now_utc), -(self.usage_retention_months - 1))
+        result = self.backend.compact(
+            request_id_cutoff_iso=request_id_cutoff.isoformat(),
+            usage_cutoff_period=usage_cutoff_period,
+            batch_size=self.compaction_batch_size,
+            archived_at=now_utc.isoformat(),
+        )
+        if result.expired_request_ids or result.archived_usage_rows:
+            logger.info(
+                "Usage compaction finished. expired_request_ids=%s archived_usage_rows=%s batches=%s",
+                result.expired_request_ids,
+                result.archived_usage_rows,
+                result.batches,
+            )
+        return result
+
+    def close(self) -> None:
+        self._stop_background.set()
+        for thread in self._background_threads:
+            thread.join(timeout=self.flush_interval_seconds + 1.0)
+        self._background_threads.clear()
+        self.flush()
+        self.backend.close()
+
+    def _start_background(self, target: Callable[[], None], name: str) -> None:
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self._background_threads.append(thread)
+
+    def _flush_loop(self) -> None:
+        while not self._stop_background.wait(self.flush_interval_seconds):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Usage counter flush failed; pending scans kept for the next attempt.")
+
+    def _compaction_loop(self) -> None:
+        interval = self.compaction_interval_seconds or 3600.0
+        while not self._stop_background.wait(interval):
+            try:
+                self.compact()
+            except Exception:
+                logger.exception("Usage compaction failed; will retry on the next interval.")
+
     def developer_bypass_decision(self, subject_key: str) -> UsageDecision:
-        now_tokyo = self._now_utc().astimezone(TOKYO_TZ)
-        period_ym = f"{now_tokyo.year:04d}-{now_tokyo.month:02d}"
         return self._to_decision(
             allowed=True,
             duplicate_request=False,
             subject_key=subject_key,
-            period_ym=period_ym,
+            period_ym=self._period_ym(self._now_utc()),
             used_scans=0,
             quota_scans=-1,
             plan="dev_unlimited",
         )
-    def _upsert_and_fetch_usage_locked(
-        self,
-        *,
-        subject_key: str,
-        period_ym: str,
-        quota: int,
-        plan: str,
-        updated_at: str,
-    ) -> sqlite3.Row:
-        self._conn.execute(
-            """
-            INSERT INTO monthly_scan_usage(subject_key, period_ym, used_scans, quota_scans, plan_snapshot, updated_at)
-            VALUES (?, ?, 0, ?, ?, ?)
-            ON CONFLICT(subject_key, period_ym) DO UPDATE SET
-                quota_scans = excluded.quota_scans,
-                plan_snapshot = excluded.plan_snapshot,
-                updated_at = excluded.updated_at
-            """,
-            (subject_key, period_ym, quota, plan, updated_at),
-        )
-        usage = self._conn.execute(
-            """
-            SELECT used_scans, quota_scans, plan_snapshot
-            FROM monthly_scan_usage
-            WHERE subject_key = ? AND period_ym = ?
-            """,
-            (subject_key, period_ym),
-        ).fetchone()
-        if usage is None:
-            raise RuntimeError("monthly_scan_usage row missing after upsert")
-        return usage
-
-    def _resolve_plan_locked(self, *, subject_key: str, now_utc: datetime) -> str:
-        row = self._conn.execute(
-            """
-            SELECT plan, pro_expires_at
-            FROM user_entitlements
-            WHERE subject_key = ?
-            """,
-            (subject_key,),
-        ).fetchone()
-        if row is None:
-            return "free"
 
-        plan = str(row["plan"]).strip().lower()
-        if plan not in {"free", "pro"}:
-            return "free"
+    def _quota_for(self, plan: str) -> int:
+        return self.pro_quota if plan == "pro" else self.free_quota
 
-        if plan == "pro":
-            expires_at_raw = row["pro_expires_at"]
-            if expires_at_raw:
-                try:
-                    expires_at = datetime.fromisoformat(str(expires_at_raw))
-                    if expires_at.tzinfo is None:
-                        expires_at = expires_at.replace(tzinfo=TOKYO_TZ)
-                    if expires_at.astimezone(timezone.utc) <= now_utc.astimezone(timezone.utc):
-                        plan = "free"
-                except ValueError:
-                    plan = "free"
+    @staticmethod
+    def _period_ym(now_utc: datetime) -> str:
+        now_tokyo = now_utc.astimezone(TOKYO_TZ)
+        return f"{now_tokyo.year:04d}-{now_tokyo.month:02d}"
 
-        return plan
+    @staticmethod
+    def _shift_period(period_ym: str, months: int) -> str:
+        year, month = (int(part) for part in period_ym.split("-"))
+        index = year * 12 + (month - 1) + months
+        return f"{index // 12:04d}-{index % 12 + 1:02d}"
 
     @staticmethod
     def _to_decision(
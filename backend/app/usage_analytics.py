@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import heapq
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+
+from app.usage_backends import UsageBackend, UsageRow
+
+
+logger = logging.getLogger("menulens")
+
+
+@dataclass
+class PeriodSummary:
+    period_ym: str
+    subjects: int = 0
+    total_scans: int = 0
+    exhausted_subjects: int = 0
+    subjects_by_plan: dict[str, int] = field(default_factory=dict)
+    scans_by_plan: dict[str, int] = field(default_factory=dict)
+
+
+@dataclass
+class SubjectUsage:
+    subject_key: str
+    plan: str
+    used_scans: int
+    quota_scans: int
+    remaining_scans: int
+
+
+@dataclass
+class QuotaExhaustion:
+    period_ym: str
+    subjects: int
+    exhausted_subjects: int
+    near_quota_subjects: int
+    near_remaining_threshold: int
+
+
+class UsageAnalytics:
+    """Materialized usage summary, refreshed incrementally from the backend's read path.
+
+    Each refresh only pulls monthly rows updated since the last watermark (minus a short
+    lookback for writers whose clocks or commits lag) and folds them into per-period
+    aggregates by subtracting the previous version of each row. Rows that disappear (periods
+    archived or deleted by compaction) never show up as changes, so every
+    `full_resync_interval_seconds` a refresh reloads all rows and rebuilds the summary instead.
+    Dashboard reads are served from memory and never reach the database the scan path writes to.
+    """
+
+    def __init__(
+        self,
+        backend: UsageBackend,
+        refresh_interval_seconds: float = 30.0,
+        lookback_seconds: float = 5.0,
+        full_resync_interval_seconds: float = 3600.0,
+        start_background: bool = True,
+    ) -> None:
+        if refresh_interval_seconds <= 0 or full_resync_interval_seconds <= 0:
+            raise ValueError("refresh_interval_seconds and full_resync_interval_seconds must be > 0")
+
+        self.backend = backend
+        self.refresh_interval_seconds = refresh_interval_seconds
+        self.lookback_seconds = lookback_seconds
+        self.full_resync_interval_seconds = full_resync_interval_seconds
+        self.refreshed_at: datetime | None = None
+        self._full_resync_at: float | None = None
+        self._watermark: str | None = None
+        self._rows: dict[tuple[str, str], UsageRow] = {}
+        self._periods: dict[str, PeriodSummary] = {}
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        if start_background:
+            self._thread = threading.Thread(target=self._refresh_loop, name="usage-analytics", daemon=True)
+            self._thread.start()
+
+    def refresh(self, full: bool = False) -> int:
+        """Fold rows changed since the last refresh into the summary; returns rows changed.
+
+        A full resync (forced by `full`, or when one is due) also counts evicted rows.
+        """
+        with self._refresh_lock:
+            now = time.monotonic()
+            due = self._full_resync_at is None or now - self._full_resync_at >= self.full_resync_interval_seconds
+            if full or due:
+                return self._resync(now)
+            watermark = datetime.fromisoformat(self._watermark) if self._watermark is not None else None
+            since_iso = (watermark - timedelta(seconds=self.lookback_seconds)).isoformat() if watermark else None
+            rows = self.backend.usage_rows_since(since_iso)
+
+            changed = 0
+            with self._lock:
+                for row in rows:
+                    key = (row.subject_key, row.period_ym)
+                    previous = self._rows.get(key)
+                    if previous == row:
+                        continue
+                    if previous is not None:
+                        self._fold(self._periods, previous, -1)
+                    self._fold(self._periods, row, 1)
+                    self._rows[key] = row
+                    changed += 1
+                    if self._watermark is None or row.updated_at > self._watermark:
+                        self._watermark = row.updated_at
+                self.refreshed_at = datetime.now(timezone.utc)
+            return changed
+
+    def _resync(self, now: float) -> int:
+        # Built outside `_lock` so dashboard reads keep the previous summary until the swap.
+        rows = {(row.subject_key, row.period_ym): row for row in self.backend.usage_rows_since(None)}
+        periods: dict[str, PeriodSummary] = {}
+        for row in rows.values():
+            self._fold(periods, row, 1)
+        with self._lock:
+            changed = sum(1 for key, row in rows.items() if self._rows.get(key) != row)
+            changed += sum(1 for key in self._rows if key not in rows)
+            self._rows = rows
+            self._periods = periods
+            self._watermark = max((row.updated_at for row in rows.values()), default=None)
+            self.refreshed_at = datetime.now(timezone.utc)
+        self._full_resync_at = now
+        return changed
+
+    @staticmethod
+    def _fold(periods: dict[str, PeriodSummary], row: UsageRow, sign: int) -> None:
+        summary = periods.setdefault(row.period_ym, PeriodSummary(period_ym=row.period_ym))
+        summary.subjects += sign
+        summary.total_scans += sign * row.used_scans
+        summary.exhausted_subjects += sign * int(row.used_scans >= row.quota_scans)
+        summary.subjects_by_plan[row.plan] = summary.subjects_by_plan.get(row.plan, 0) + sign
+        summary.scans_by_plan[row.plan] = summary.scans_by_plan.get(row.plan, 0) + sign * row.used_scans
+        if summary.subjects_by_plan[row.plan] == 0:
+            del summary.subjects_by_plan[row.plan]
+            del summary.scans_by_plan[row.plan]
+
+    def _ensure_loaded(self) -> None:
+        if self.refreshed_at is None:
+            self.refresh()
+
+    def latest_period(self) -> str | None:
+        self._ensure_loaded()
+        with self._lock:
+            return max(self._periods, default=None)
+
+    def period_summaries(self, period_ym: str | None = None) -> list[PeriodSummary]:
+        self._ensure_loaded()
+        with self._lock:
+            summaries = [
+                PeriodSummary(
+                    period_ym=summary.period_ym,
+                    subjects=summary.subjects,
+                    total_scans=summary.total_scans,
+                    exhausted_subjects=summary.exhausted_subjects,
+                    subjects_by_plan=dict(summary.subjects_by_plan),
+                    scans_by_plan=dict(summary.scans_by_plan),
+                )
+                for summary in self._periods.values()
+                if summary.subjects > 0 and (period_ym is None or summary.period_ym == period_ym)
+            ]
+        return sorted(summaries, key=lambda summary: summary.period_ym, reverse=True)
+
+    def top_subjects(self, period_ym: str, limit: int = 20) -> list[SubjectUsage]:
+        self._ensure_loaded()
+        with self._lock:
+            rows = [row for (_, row_period), row in self._rows.items() if row_period == period_ym]
+        top = heapq.nlargest(limit, rows, key=lambda row: (row.used_scans, row.subject_key))
+        return [
+            SubjectUsage(
+                subject_key=row.subject_key,
+                plan=row.plan,
+                used_scans=row.used_scans,
+                quota_scans=row.quota_scans,
+                remaining_scans=max(0, row.quota_scans - row.used_scans),
+            )
+            for row in top
+        ]
+
+    def quota_exhaustion(self, period_ym: str, near_remaining_threshold: int = 2) -> QuotaExhaustion:
+        self._ensure_loaded()
+        with self._lock:
+            rows = [row for (_, row_period), row in self._rows.items() if row_period == period_ym]
+        exhausted = sum(1 for row in rows if row.used_scans >= row.quota_scans)
+        near = sum(1 for row in rows if 0 < row.quota_scans - row.used_scans <= near_remaining_threshold)
+        return QuotaExhaustion(
+            period_ym=period_ym,
+            subjects=len(rows),
+            exhausted_subjects=exhausted,
+            near_quota_subjects=near,
+            near_remaining_threshold=near_remaining_threshold,
+        )
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.refresh_interval_seconds + 1.0)
+            self._thread = None
+
+    def _refresh_loop(self) -> None:
+        while True:
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception("Usage analytics refresh failed; serving the previous summary.")
+            if self._stop.wait(self.refresh_interval_seconds):
+                return
@@ -0,0 +1 @@
+# Local performance benchmarks for the MenuLens backend.
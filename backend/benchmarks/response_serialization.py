@@ -0,0 +1,126 @@
+import argparse
+import gzip
+import json
+import statistics
+import time
+from pathlib import Path
+from typing import Any
+from uuid import uuid4
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.main import (
+    DetectedType,
+    ImagePreview,
+    Preview,
+    ScanItem,
+    ScanMenuResponse,
+    _scan_response_projection,
+)
+from app.responses import brotli, encoded_json_response
+from evals.shards import iter_report_examples
+
+
+_RESULTS_DIR = Path(__file__).resolve().parents[1] / "evals" / "results"
+_IMAGES_PER_ITEM = 3
+
+
+def _latest_report() -> Path | None:
+    reports = sorted(_RESULTS_DIR.glob("eval_report_*.json"))
+    return reports[-1] if reports else None
+
+
+def _build_responses(report: dict[str, Any], report_path: Path) -> list[ScanMenuResponse]:
+    """Rebuild the scan_menu payload each eval example would have produced.
+
+    Eval runs skip image search, so every item gets placeholder image URLs of realistic length.
+    """
+    responses = []
+    for example in iter_report_examples(report, report_path):
+        predicted = example["predicted"]
+        items = [
+            ScanItem(
+                item_id=str(uuid4()),
+                jp_text=item["jp_text"],
+                price_text=item.get("price_text"),
+                confidence=item["confidence"],
+                ocr_diagnostics=item.get("ocr_diagnostics"),
+                preview=Preview(
+                    en_title=item["en_title"],
+                    en_description=item.get("en_description", ""),
+                    tags=item.get("tags", [])[:5],
+                    images=[
+                        ImagePreview(url=f"https://images.example.com/{uuid4().hex}/{index}.jpg", score=0.9 - index * 0.1)
+                        for index in range(_IMAGES_PER_ITEM)
+                    ],
+                ),
+            )
+            for item in predicted["items"]
+        ]
+        responses.append(
+            ScanMenuResponse(
+                scan_id=str(uuid4()),
+                detected_type=DetectedType(type=predicted.get("detected_type", "dish"), confidence=0.8),
+                items=items,
+                pipeline_diagnostics=example.get("pipeline"),
+            )
+        )
+    return responses
+
+
+def _default_path(response: ScanMenuResponse) -> bytes:
+    # What FastAPI does for a `response_model` route: re-validate, jsonable_encoder, json.dumps.
+    validated = ScanMenuResponse.model_validate(response.model_dump())
+    return JSONResponse(content=jsonable_encoder(validated)).body
+
+
+def _compact_path(response: ScanMenuResponse, verbose: bool) -> bytes:
+    include, exclude = _scan_response_projection(None, verbose)
+    return ScanMenuResponse.__pydantic_serializer__.to_json(response, include=include, exclude=exclude)
+
+
+def _time_us(func: Any, repeats: int) -> float:
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1_000_000)
+    return statistics.median(samples)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Compare scan_menu response size and serialization time.")
+    parser.add_argument("--report", type=Path, default=None, help="eval report JSON (default: latest in evals/results)")
+    parser.add_argument("--repeats", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    report_path = args.report or _latest_report()
+    if report_path is None:
+        raise SystemExit("No eval report found. Run `python -m evals.run_evals` first or pass --report.")
+    responses = _build_responses(json.loads(report_path.read_text(encoding="utf-8")), report_path)
+    if not responses:
+        raise SystemExit(f"{report_path} has no successful examples.")
+
+    cases = {
+        "default": _default_path,
+        "compact": lambda response: _compact_path(response, verbose=True),
+        "compact_lean": lambda response: _compact_path(response, verbose=False),
+    }
+    print(f"report={report_path} responses={len(responses)} repeats={args.repeats}")
+    print(f"{'path':<14}{'json_b':>10}{'gzip_b':>10}{'br_b':>10}{'ser_us':>10}{'ser+enc_us':>12}")
+    for name, serialize in cases.items():
+        bodies = [serialize(response) for response in responses]
+        raw = statistics.mean(len(body) for body in bodies)
+        gz = statistics.mean(len(gzip.compress(body, compresslevel=6)) for body in bodies)
+        br = statistics.mean(len(brotli.compress(body, quality=5)) for body in bodies) if brotli is not None else 0.0
+        ser_us = statistics.mean(_time_us(lambda: serialize(response), args.repeats) for response in responses)
+        enc_us = statistics.mean(
+            _time_us(lambda: encoded_json_response(serialize(response), "gzip, br"), args.repeats)
+            for response in responses
+        )
+        print(f"{name:<14}{raw:>10.0f}{gz:>10.0f}{br:>10.0f}{ser_us:>10.1f}{enc_us:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
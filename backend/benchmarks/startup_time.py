@@ -0,0 +1,106 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+
+_BACKEND_DIR = Path(__file__).resolve().parents[1]
+_PROBE = """
+import json
+import time
+
+start = time.perf_counter()
+import app.main as main
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+
+client_ready = time.perf_counter()
+with TestClient(main.app) as client:
+    started = time.perf_counter()
+    client.get("/healthz")
+    first = time.perf_counter()
+    client.get("/healthz")
+    second = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "lifespan_startup_ms": (started - client_ready) * 1000,
+    "first_request_ms": (first - started) * 1000,
+    "second_request_ms": (second - first) * 1000,
+}))
+"""
+
+
+def _probe_env(workdir: Path, warmup: bool) -> dict[str, str]:
+    env = dict(os.environ)
+    env.update(
+        {
+            "PYTHONPATH": str(_BACKEND_DIR),
+            "SCAN_USAGE_DB_PATH": str(workdir / "scan_usage.db"),
+            "SCAN_REPLAY_DB_PATH": str(workdir / "scan_replay.db"),
+            "ENABLE_STARTUP_WARMUP": "true" if warmup else "false",
+        }
+    )
+    return env
+
+
+def _run_probe(workdir: Path, warmup: bool) -> dict[str, float]:
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-c", _PROBE],
+        cwd=workdir,
+        env=_probe_env(workdir, warmup),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result["process_total_ms"] = (time.perf_counter() - start) * 1000
+    return result
+
+
+def _slowest_imports(workdir: Path, top: int) -> list[tuple[float, str]]:
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=workdir,
+        env=_probe_env(workdir, warmup=False),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    parsed = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, raw_name = line[len("import time:") :].split("|")
+        parsed.append((len(raw_name) - len(raw_name.lstrip()), int(cumulative_us) / 1000, raw_name.strip()))
+    # Report the modules app.main imports directly: they sit one level (two spaces) below it.
+    app_indent = next(indent for indent, _, name in parsed if name == "app.main")
+    entries = [(cumulative_ms, name) for indent, cumulative_ms, name in parsed if indent == app_indent + 2]
+    return sorted(entries, reverse=True)[:top]
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Measure cold-start cost of app.main in fresh interpreters.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--no-warmup", action="store_true", help="set ENABLE_STARTUP_WARMUP=false")
+    parser.add_argument("--top-imports", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="startup_time_") as raw_workdir:
+        workdir = Path(raw_workdir)
+        runs = [_run_probe(workdir, warmup=not args.no_warmup) for _ in range(args.runs)]
+        print(f"runs={args.runs} warmup={'off' if args.no_warmup else 'on'} (median ms)")
+        for key in ("import_ms", "lifespan_startup_ms", "first_request_ms", "second_request_ms", "process_total_ms"):
+            print(f"  {key:<22}{statistics.median(run[key] for run in runs):>10.1f}")
+        print("slowest direct imports of app.main (cumulative ms):")
+        for cumulative_ms, name in _slowest_imports(workdir, args.top_imports):
+            print(f"  {name:<40}{cumulative_ms:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+import argparse
+import asyncio
+import contextvars
+import hashlib
+import json
+import os
+import tempfile
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Any
+
+import httpx
+
+
+# One replayed scan per task; the stub upstreams read it to answer and to time their responses.
+_replaying: contextvars.ContextVar[dict[str, Any]] = contextvars.ContextVar("traffic_replay_record")
+_DEFAULT_ITEMS = 8
+
+
+def _percentile(ordered: list[float], fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+
+def load_records(paths: list[str], limit: int | None = None) -> tuple[list[dict[str, Any]], int]:
+    """Captured records in arrival order, each with the OCR text and timings its stubs replay.
+
+    Retries that were answered from the replay store never reached the pipeline, so they borrow
+    the OCR text of their request's original (or of an earlier scan of the same image).
+    Records with neither are skipped and counted.
+    """
+    records = []
+    for path in paths:
+        with open(path, encoding="utf-8") as handle:
+            records.extend(json.loads(line) for line in handle if line.strip())
+    records.sort(key=lambda record: record["arrival_unix_ms"])
+    by_request = {record["request_key"]: record for record in records if record.get("request_key") and "ocr_text" in record}
+    by_image = {record["image_sha256"]: record for record in records if record.get("image_sha256") and "ocr_text" in record}
+    replayable, skipped = [], 0
+    for record in records:
+        source = record if "ocr_text" in record else by_request.get(record.get("request_key")) or by_image.get(
+            record.get("image_sha256")
+        )
+        if source is None:
+            skipped += 1
+            continue
+        replayable.append({**record, "upstream": source})
+        if limit is not None and len(replayable) >= limit:
+            break
+    return replayable, skipped
+
+
+def _synthetic_image(record: dict[str, Any]) -> bytes:
+    # Same captured image -> same bytes, sized like the original upload.
+    seed = hashlib.sha256((record.get("image_sha256") or record["request_key"] or "").encode("utf-8")).digest()
+    size = int(record.get("image_bytes") or record["upstream"].get("image_bytes") or 200_000)
+    return (seed * (size // len(seed) + 1))[:size]
+
+
+def _menu_items(source: dict[str, Any]) -> list[dict[str, Any]]:
+    lines = [line.strip() for line in source.get("ocr_text", "").splitlines() if line.strip()]
+    count = source.get("returned_item_count") or _DEFAULT_ITEMS
+    return [
+        {
+            "jp_text": line,
+            "en_title": line[:60],
+            "en_description": "Replayed menu item.",
+            "tags": [],
+            "confidence": 0.8,
+        }
+        for line in lines[:count]
+    ]
+
+
+class StubUpstreams:
+    """Answers Vision, Gemini and image-search calls from the replayed record.
+
+    Each call sleeps for the record's captured stage latency times `latency_scale`, so the
+    backend sees production-like upstream timing without sending traffic anywhere.
+    """
+
+    def __init__(self, latency_scale: float) -> None:
+        self.latency_scale = latency_scale
+        self.calls: Counter[str] = Counter()
+
+    async def _sleep_for(self, stage: str) -> None:
+        source = _replaying.get()["upstream"]
+        latency_ms = (source.get("stage_latency_ms") or {}).get(stage) or 0
+        await asyncio.sleep(latency_ms * self.latency_scale / 1000)
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        state = _replaying.get()
+        source = state["upstream"]
+        host = request.url.host
+        self.calls[host] += 1
+        if host == "vision.googleapis.com":
+            await self._sleep_for("vision_ocr")
+            return httpx.Response(200, json={"responses": [{"fullTextAnnotation": {"text": source.get("ocr_text", "")}}]})
+        if host == "generativelanguage.googleapis.com":
+            state["gemini_calls"] = state.get("gemini_calls", 0) + 1
+            normalizing = state["gemini_calls"] == 1 and (source.get("stage_latency_ms") or {}).get("ocr_normalize")
+            text = json.dumps(
+                {
+                    "detected_type": "menu",
+                    # One body answers every prompt: normalization, two-stage, fused and vision parses.
+                    "normalized_text": source.get("ocr_text", ""),
+                    "ocr_text": source.get("ocr_text", ""),
+                    "items": _menu_items(source),
+                },
+                ensure_ascii=False,
+            )
+            event = {"candidates": [{"content": {"parts": [{"text": text}]}}]}
+            if request.url.path.endswith(":streamGenerateContent"):
+                return httpx.Response(200, content=self._sse(text, event))
+            await self._sleep_for("ocr_normalize" if normalizing else "menu_parse")
+            return httpx.Response(200, json=event)
+        # Image search: CSE results, with one stable URL set per query.
+        await self._sleep_for("image_retrieval_total")
+        query_hash = hashlib.sha256(request.url.params.get("q", "").encode("utf-8")).hexdigest()[:16]
+        return httpx.Response(
+            200, json={"items": [{"link": f"https://images.example.com/{query_hash}/{index}.jpg"} for index in range(2)]}
+        )
+
+    async def _sse(self, text: str, event: dict[str, Any]):
+        source = _replaying.get()["upstream"]
+        latency_ms = (source.get("stage_latency_ms") or {}).get("menu_parse") or 0
+        chunk_count = 4
+        step = -(-len(text) // chunk_count)
+        for index in range(chunk_count):
+            await asyncio.sleep(latency_ms * self.latency_scale / 1000 / chunk_count)
+            chunk = {**event, "candidates": [{"content": {"parts": [{"text": text[index * step : (index + 1) * step]}]}}]}
+            yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+async def _send(
+    client: httpx.AsyncClient, record: dict[str, Any], run_nonce: str, scheduled_at: float
+) -> dict[str, Any]:
+    _replaying.set({"upstream": record["upstream"]})
+    start = time.perf_counter()
+    request_id = (
+        str(uuid.uuid5(uuid.NAMESPACE_URL, f"{run_nonce}:{record['request_key']}")) if record.get("request_key") else None
+    )
+    data = {
+        "target_lang": record.get("target_lang") or "en",
+        "device_id": f"replay-{record.get('subject_key') or 'anonymous'}",
+        "app_version": record.get("app_version") or "replay",
+        "timezone": "UTC",
+        "verbose": "true",
+    }
+    if request_id:
+        data["request_id"] = request_id
+    response = await client.post(
+        "/v1/scan_menu", data=data, files={"image": ("menu.jpg", _synthetic_image(record), "image/jpeg")}
+    )
+    outcome = {
+        "status_code": response.status_code,
+        "latency_ms": (time.perf_counter() - start) * 1000,
+        "start_lag_ms": (start - scheduled_at) * 1000,
+        "captured_status_code": record.get("status_code"),
+        "captured_latency_ms": record.get("latency_ms"),
+        "captured_warm_hits": record.get("image_warm_cache_hits"),
+        "captured_replayed": record.get("response_replayed"),
+    }
+    if response.status_code == 200:
+        body = response.json()
+        diagnostics = body.get("pipeline_diagnostics") or {}
+        outcome.update(
+            item_count=len(body.get("items", [])),
+            warm_hits=diagnostics.get("image_warm_cache_hits"),
+            replayed=bool(diagnostics.get("response_replayed")),
+        )
+    return outcome
+
+
+async def replay(records: list[dict[str, Any]], speed: float, latency_scale: float) -> dict[str, Any]:
+    import app.main as main
+
+    stubs = StubUpstreams(latency_scale)
+    transport: httpx.AsyncBaseTransport = httpx.MockTransport(stubs.handle)
+    if main._tracer is not None:
+        transport = main.TracingTransport(transport)
+    main._http_client_state = (asyncio.get_running_loop(), httpx.AsyncClient(transport=transport), None)
+    run_nonce = uuid.uuid4().hex
+    first_arrival = records[0]["arrival_unix_ms"]
+    async with main.app.router.lifespan_context(main.app):
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=main.app), base_url="http://replay", timeout=None
+        ) as client:
+            started = time.perf_counter()
+            tasks = []
+            # Open loop: each request leaves at its (scaled) captured offset, however slow earlier ones are.
+            for record in records:
+                scheduled_at = started + (record["arrival_unix_ms"] - first_arrival) / 1000 / speed
+                await asyncio.sleep(max(0.0, scheduled_at - time.perf_counter()))
+                tasks.append(asyncio.create_task(_send(client, record, run_nonce, scheduled_at)))
+            outcomes = await asyncio.gather(*tasks)
+            elapsed = time.perf_counter() - started
+    return _report(outcomes, elapsed, stubs.calls)
+
+
+def _report(outcomes: list[dict[str, Any]], elapsed_s: float, upstream_calls: Counter[str]) -> dict[str, Any]:
+    ok = [outcome for outcome in outcomes if outcome["status_code"] == 200]
+    latencies = sorted(outcome["latency_ms"] for outcome in ok)
+    captured = sorted(
+        float(outcome["captured_latency_ms"])
+        for outcome in outcomes
+        if outcome["captured_status_code"] == 200 and outcome["captured_latency_ms"] is not None
+    )
+    lags = sorted(outcome["start_lag_ms"] for outcome in outcomes)
+    # Warm-cache hits are only reported when the backend runs with the warm cache enabled.
+    scanned = [outcome for outcome in ok if not outcome.get("replayed") and outcome.get("warm_hits") is not None]
+    items = sum(outcome["item_count"] for outcome in scanned)
+    warm_hits = sum(outcome["warm_hits"] for outcome in scanned)
+    return {
+        "requests": len(outcomes),
+        "elapsed_s": round(elapsed_s, 3),
+        "throughput_rps": round(len(ok) / elapsed_s, 2) if elapsed_s > 0 else 0.0,
+        "status_codes": dict(Counter(str(outcome["status_code"]) for outcome in outcomes)),
+        "captured_status_codes": dict(Counter(str(outcome["captured_status_code"]) for outcome in outcomes)),
+        "latency_ms": {
+            "p50": round(_percentile(latencies, 0.5), 1),
+            "p90": round(_percentile(latencies, 0.9), 1),
+            "p99": round(_percentile(latencies, 0.99), 1),
+            "max": round(latencies[-1], 1) if latencies else 0.0,
+        },
+        "captured_latency_ms": {
+            "p50": round(_percentile(captured, 0.5), 1),
+            "p90": round(_percentile(captured, 0.9), 1),
+            "p99": round(_percentile(captured, 0.99), 1),
+        },
+        # A high start lag means the replay machine, not the backend, was the bottleneck.
+        "start_lag_ms_p99": round(_percentile(lags, 0.99), 1),
+        "responses_replayed": sum(1 for outcome in ok if outcome.get("replayed")),
+        "captured_responses_replayed": sum(1 for outcome in outcomes if outcome["captured_replayed"]),
+        "image_warm_cache_hit_rate": round(warm_hits / items, 3) if items else None,
+        "upstream_calls": dict(upstream_calls),
+    }
+
+
+def _prepare_environment(workdir: Path) -> None:
+    # The backend reads its configuration at import; stub credentials keep every upstream in-process.
+    for name, value in {
+        "GOOGLE_CLOUD_VISION_API_KEY": "replay",
+        "GEMINI_API_KEY": "replay",
+        "GOOGLE_CSE_API_KEY": "replay",
+        "GOOGLE_CSE_CX": "replay",
+        "FREE_SCAN_LIMIT_PER_MONTH": "100000000",
+        "PRO_SCAN_LIMIT_PER_MONTH": "100000000",
+        "SCAN_USAGE_DB_PATH": str(workdir / "scan_usage.db"),
+        "ENABLE_SCAN_REPLAY": "true",
+        "SCAN_REPLAY_DB_PATH": str(workdir / "scan_replay.db"),
+    }.items():
+        os.environ.setdefault(name, value)
+    os.environ["ENABLE_STARTUP_WARMUP"] = "false"
+    os.environ["ENABLE_FIREBASE_AUTH"] = "false"
+    os.environ["ENABLE_TRAFFIC_CAPTURE"] = "false"
+    if os.getenv("IMAGE_SEARCH_PROVIDER", "").strip().lower() == "vertex":
+        os.environ["IMAGE_SEARCH_PROVIDER"] = "cse"
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Re-drive captured scan_menu traffic against this backend, with upstreams stubbed in-process."
+    )
+    parser.add_argument("captures", nargs="+", help="JSONL files written with ENABLE_TRAFFIC_CAPTURE=true.")
+    parser.add_argument("--speed", type=float, default=1.0, help="Arrival-rate multiplier (2 = twice the captured rate).")
+    parser.add_argument(
+        "--upstream-latency-scale", type=float, default=1.0, help="Multiplier on captured upstream latency (0 = instant)."
+    )
+    parser.add_argument("--limit", type=int, default=None, help="Replay at most this many records.")
+    parser.add_argument("--output", type=Path, default=None, help="Also write the report as JSON.")
+    args = parser.parse_args(argv)
+    if args.speed <= 0 or args.upstream_latency_scale < 0:
+        parser.error("--speed must be > 0 and --upstream-latency-scale >= 0")
+
+    records, skipped = load_records(args.captures, args.limit)
+    if not records:
+        print(f"No replayable records ({skipped} skipped).")
+        return 1
+    with tempfile.TemporaryDirectory(prefix="traffic_replay_") as workdir:
+        _prepare_environment(Path(workdir))
+        report = asyncio.run(replay(records, args.speed, args.upstream_latency_scale))
+    report["skipped_records"] = skipped
+
+    print(f"requests={report['requests']} skipped={skipped} elapsed_s={report['elapsed_s']} rps={report['throughput_rps']}")
+    print(f"status codes: replay={report['status_codes']} captured={report['captured_status_codes']}")
+    print(f"{'latency_ms':<12}{'p50':>10}{'p90':>10}{'p99':>10}")
+    for name, key in (("replay", "latency_ms"), ("captured", "captured_latency_ms")):
+        row = report[key]
+        print(f"{name:<12}{row['p50']:>10}{row['p90']:>10}{row['p99']:>10}")
+    print(
+        f"replayed responses: replay={report['responses_replayed']} captured={report['captured_responses_replayed']}"
+        f" warm image hit rate={report['image_warm_cache_hit_rate']} start_lag_p99_ms={report['start_lag_ms_p99']}"
+    )
+    print(f"upstream calls: {report['upstream_calls']}")
+    if args.output is not None:
+        args.output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
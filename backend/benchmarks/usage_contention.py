@@ -0,0 +1,105 @@
+import argparse
+import statistics
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from uuid import uuid4
+
+from app.usage import UsageStore
+from app.usage_backends import ShardedMemoryUsageBackend, UsageBackend, UsageCounterServer, build_usage_backend
+
+
+_LARGE_QUOTA = 10_000_000
+
+
+def _consume_loop(store: UsageStore, worker_index: int, ops: int, subjects: int) -> list[float]:
+    latencies_ms: list[float] = []
+    for op in range(ops):
+        subject_key = f"device:{(worker_index * 7919 + op) % subjects}"
+        start = time.perf_counter()
+        store.consume_scan(subject_key, request_id=str(uuid4()))
+        latencies_ms.append((time.perf_counter() - start) * 1000)
+    return latencies_ms
+
+
+def _process_worker(kind: str, db_path: str, url: str, worker_index: int, ops: int, subjects: int) -> list[float]:
+    store = UsageStore(
+        db_path=db_path,
+        free_quota=_LARGE_QUOTA,
+        pro_quota=_LARGE_QUOTA,
+        backend=build_usage_backend(kind, db_path=db_path, url=url),
+    )
+    try:
+        return _consume_loop(store, worker_index, ops, subjects)
+    finally:
+        store.close()
+
+
+def _run_case(kind: str, mode: str, workers: int, ops: int, subjects: int, workdir: Path) -> dict[str, float]:
+    db_path = str(workdir / f"{kind}_{mode}_{workers}_{uuid4().hex[:8]}.db")
+    server: UsageCounterServer | None = None
+    url = ""
+    if kind == "http":
+        server = UsageCounterServer(ShardedMemoryUsageBackend()).start()
+        url = server.url
+
+    start = time.perf_counter()
+    try:
+        if mode == "process":
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [
+                    pool.submit(_process_worker, kind, db_path, url, index, ops, subjects) for index in range(workers)
+                ]
+                latencies = [value for future in futures for value in future.result()]
+        else:
+            backend: UsageBackend = build_usage_backend(kind, db_path=db_path, url=url)
+            store = UsageStore(db_path=db_path, free_quota=_LARGE_QUOTA, pro_quota=_LARGE_QUOTA, backend=backend)
+            try:
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    futures = [pool.submit(_consume_loop, store, index, ops, subjects) for index in range(workers)]
+                    latencies = [value for future in futures for value in future.result()]
+            finally:
+                store.close()
+    finally:
+        if server is not None:
+            server.stop()
+    elapsed = time.perf_counter() - start
+
+    ordered = sorted(latencies)
+    return {
+        "ops": float(len(latencies)),
+        "elapsed_s": elapsed,
+        "throughput_ops_s": len(latencies) / elapsed if elapsed > 0 else 0.0,
+        "p50_ms": statistics.median(ordered),
+        "p99_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))],
+    }
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Measure quota consumption throughput under worker contention.")
+    parser.add_argument("--backends", default="sqlite,sharded_memory,http")
+    parser.add_argument("--workers", default="1,2,4,8")
+    parser.add_argument("--mode", choices=("thread", "process"), default="process")
+    parser.add_argument("--ops", type=int, default=300, help="consume_scan calls per worker")
+    parser.add_argument("--subjects", type=int, default=64)
+    args = parser.parse_args(argv)
+
+    worker_counts = [int(value) for value in args.workers.split(",") if value.strip()]
+    with tempfile.TemporaryDirectory(prefix="usage_contention_") as workdir:
+        print(f"mode={args.mode} ops_per_worker={args.ops} subjects={args.subjects}")
+        print(f"{'backend':<16}{'workers':>8}{'ops/s':>12}{'p50_ms':>10}{'p99_ms':>10}")
+        for kind in [value.strip() for value in args.backends.split(",") if value.strip()]:
+            if kind == "sharded_memory" and args.mode == "process":
+                print(f"{kind:<16}{'-':>8}  skipped: state is process-local, use --mode thread")
+                continue
+            for workers in worker_counts:
+                result = _run_case(kind, args.mode, workers, args.ops, args.subjects, Path(workdir))
+                print(
+                    f"{kind:<16}{workers:>8}{result['throughput_ops_s']:>12.0f}"
+                    f"{result['p50_ms']:>10.2f}{result['p99_ms']:>10.2f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import math
+import statistics
+from typing import Any
+
+
+TOTAL_STAGE = "total"
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    """Linearly interpolated percentile; `fraction` is in [0, 1]."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * fraction
+    lower = math.floor(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return float(ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower))
+
+
+def latency_profile(values: list[float]) -> dict[str, float]:
+    return {
+        "count": float(len(values)),
+        "mean_ms": round(statistics.fmean(values), 1) if values else 0.0,
+        "p50_ms": round(percentile(values, 0.5), 1),
+        "p90_ms": round(percentile(values, 0.9), 1),
+        "p99_ms": round(percentile(values, 0.99), 1),
+    }
+
+
+def stage_samples(samples: list[dict[str, Any]]) -> dict[str, list[float]]:
+    """Group benchmark samples by stage; the end-to-end latency is reported as `total`."""
+    by_stage: dict[str, list[float]] = {TOTAL_STAGE: []}
+    for sample in samples:
+        by_stage[TOTAL_STAGE].append(float(sample["latency_ms"]))
+        for stage, latency in sample.get("stage_latency_ms", {}).items():
+            by_stage.setdefault(stage, []).append(float(latency))
+    # Stages a pipeline mode skips are recorded as 0 ms; they carry no signal.
+    return {stage: values for stage, values in by_stage.items() if any(values)}
+
+
+def mann_whitney_p_value(head: list[float], base: list[float]) -> float:
+    """One-sided Mann-Whitney U p-value that `head` latencies are larger than `base`.
+
+    Uses the normal approximation with tie and continuity corrections, which holds up
+    from roughly ten samples per side; latency distributions are too skewed for a t-test.
+    """
+    n_head, n_base = len(head), len(base)
+    if not n_head or not n_base:
+        return 1.0
+    combined = sorted([(value, 0) for value in head] + [(value, 1) for value in base])
+    total = len(combined)
+    head_rank_sum = 0.0
+    tie_term = 0.0
+    index = 0
+    while index < total:
+        end = index
+        while end + 1 < total and combined[end + 1][0] == combined[index][0]:
+            end += 1
+        average_rank = (index + end) / 2 + 1
+        ties = end - index + 1
+        tie_term += ties**3 - ties
+        head_rank_sum += average_rank * sum(1 for _, side in combined[index : end + 1] if side == 0)
+        index = end + 1
+    u_head = head_rank_sum - n_head * (n_head + 1) / 2
+    variance = n_head * n_base / 12 * ((total + 1) - tie_term / (total * (total - 1)))
+    if variance <= 0:
+        return 1.0
+    z = (u_head - n_head * n_base / 2 - 0.5) / math.sqrt(variance)
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def compare_latency(
+    head: dict[str, list[float]],
+    base: dict[str, list[float]],
+    max_regression_pct: float,
+    alpha: float,
+) -> list[dict[str, Any]]:
+    """Per-stage p50/p90 change against the baseline.
+
+    A stage regresses only when its p50 or p90 grew by more than `max_regression_pct`
+    and the shift is significant at `alpha`, so one slow upstream call cannot fail the gate.
+    """
+    rows: list[dict[str, Any]] = []
+    for stage in sorted(set(head) & set(base), key=lambda name: (name != TOTAL_STAGE, name)):
+        head_values, base_values = head[stage], base[stage]
+        p_value = mann_whitney_p_value(head_values, base_values)
+        row: dict[str, Any] = {"stage": stage, "head_count": len(head_values), "base_count": len(base_values)}
+        exceeded = False
+        for name, fraction in (("p50", 0.5), ("p90", 0.9)):
+            head_ms = percentile(head_values, fraction)
+            base_ms = percentile(base_values, fraction)
+            change_pct = (head_ms - base_ms) / base_ms * 100 if base_ms > 0 else 0.0
+            row[f"base_{name}_ms"] = round(base_ms, 1)
+            row[f"head_{name}_ms"] = round(head_ms, 1)
+            row[f"{name}_change_pct"] = round(change_pct, 1)
+            exceeded = exceeded or change_pct > max_regression_pct
+        row["p_value"] = round(p_value, 4)
+        row["regressed"] = exceeded and p_value < alpha
+        rows.append(row)
+    return rows
+
+
+def quality_regressions(
+    head_summary: dict[str, Any],
+    base_run: dict[str, Any],
+    max_recall_drop: float,
+    max_hallucination_increase: float,
+) -> list[str]:
+    reasons = []
+    recall_delta = float(head_summary["item_recall"]) - float(base_run["item_recall"])
+    if recall_delta < -max_recall_drop:
+        reasons.append(f"item_recall dropped by {-recall_delta:.4f} (allowed {max_recall_drop})")
+    hallucination_delta = float(head_summary["hallucinated_item_rate"]) - float(base_run["hallucinated_item_rate"])
+    if hallucination_delta > max_hallucination_increase:
+        reasons.append(
+            f"hallucinated_item_rate rose by {hallucination_delta:.4f} (allowed {max_hallucination_increase})"
+        )
+    return reasons
@@ -0,0 +1,560 @@
+import argparse
+import json
+import os
+import sqlite3
+from pathlib import Path
+from typing import Any
+
+from evals.shards import iter_report_examples
+
+
+DEFAULT_DB_PATH = Path(
+    os.getenv(
+        "EVAL_RESULTS_DB_PATH",
+        Path(os.getenv("EVAL_RESULTS_DIR", Path(__file__).resolve().parent / "results")) / "eval_results.db",
+    )
+)
+RUN_COLUMNS = [
+    "run_at_utc",
+    "report_path",
+    "dataset_path",
+    "target_lang",
+    "model",
+    "ocr_pipeline_mode",
+    "menu_parse_prompt_version",
+    "ocr_normalize_prompt_version",
+    "example_count",
+    "failure_count",
+    "parse_success_rate",
+    "item_recall",
+    "item_precision_proxy",
+    "hallucinated_item_rate",
+    "coverage_ratio",
+    "mean_latency_ms",
+    "p95_latency_ms",
+]
+GROUPABLE_COLUMNS = (
+    "model",
+    "ocr_pipeline_mode",
+    "menu_parse_prompt_version",
+    "ocr_normalize_prompt_version",
+    "target_lang",
+    "dataset_path",
+)
+_EXAMPLE_METRIC_COLUMNS = (
+    "parse_success",
+    "item_recall",
+    "item_precision_proxy",
+    "hallucinated_item_rate",
+    "coverage_ratio",
+    "latency_ms",
+)
+
+
+class EvalResultsStore:
+    def __init__(self, db_path: str | Path = DEFAULT_DB_PATH) -> None:
+        self._db_path = str(Path(db_path))
+        Path(self._db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self._db_path)
+        self._conn.row_factory = sqlite3.Row
+        self._initialize_schema()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def _initialize_schema(self) -> None:
+        with self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS eval_runs (
+                    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    run_at_utc TEXT NOT NULL,
+                    report_path TEXT NULL,
+                    dataset_path TEXT NULL,
+                    target_lang TEXT NULL,
+                    model TEXT NULL,
+                    ocr_pipeline_mode TEXT NULL,
+                    menu_parse_prompt_version TEXT NULL,
+                    ocr_normalize_prompt_version TEXT NULL,
+                    example_count REAL NOT NULL,
+                    failure_count INTEGER NOT NULL,
+                    parse_success_rate REAL NOT NULL,
+                    item_recall REAL NOT NULL,
+                    item_precision_proxy REAL NOT NULL,
+                    hallucinated_item_rate REAL NOT NULL,
+                    coverage_ratio REAL NOT NULL,
+                    mean_latency_ms REAL NOT NULL,
+                    p95_latency_ms REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS eval_examples (
+                    run_id INTEGER NOT NULL REFERENCES eval_runs(run_id) ON DELETE CASCADE,
+                    fixture_id TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    error TEXT NULL,
+                    expected_item_count INTEGER NULL,
+                    predicted_item_count INTEGER NULL,
+                    matched_item_count INTEGER NULL,
+                    parse_success REAL NULL,
+                    item_recall REAL NULL,
+                    item_precision_proxy REAL NULL,
+                    hallucinated_item_rate REAL NULL,
+                    coverage_ratio REAL NULL,
+                    latency_ms REAL NULL,
+                    PRIMARY KEY(run_id, fixture_id)
+                )
+                """
+            )
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS eval_items (
+                    run_id INTEGER NOT NULL REFERENCES eval_runs(run_id) ON DELETE CASCADE,
+                    fixture_id TEXT NOT NULL,
+                    item_index INTEGER NOT NULL,
+                    jp_text TEXT NOT NULL,
+                    en_title TEXT NULL,
+                    price_text TEXT NULL,
+                    confidence REAL NULL,
+                    match_score REAL NULL,
+                    matched INTEGER NOT NULL,
+                    PRIMARY KEY(run_id, fixture_id, item_index)
+                )
+                """
+            )
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS eval_stages (
+                    run_id INTEGER NOT NULL REFERENCES eval_runs(run_id) ON DELETE CASCADE,
+                    fixture_id TEXT NOT NULL,
+                    stage TEXT NOT NULL,
+                    latency_ms REAL NOT NULL,
+                    PRIMARY KEY(run_id, fixture_id, stage)
+                )
+                """
+            )
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS eval_latency_samples (
+                    run_id INTEGER NOT NULL REFERENCES eval_runs(run_id) ON DELETE CASCADE,
+                    fixture_id TEXT NOT NULL,
+                    repeat_index INTEGER NOT NULL,
+                    stage TEXT NOT NULL,
+                    latency_ms REAL NOT NULL,
+                    PRIMARY KEY(run_id, fixture_id, repeat_index, stage)
+                )
+                """
+            )
+            self._conn.execute(
+                """
+                CREATE INDEX IF NOT EXISTS idx_eval_runs_versions
+                ON eval_runs(menu_parse_prompt_version, model, ocr_pipeline_mode, run_at_utc)
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_eval_runs_run_at ON eval_runs(run_at_utc)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_eval_examples_fixture ON eval_examples(fixture_id, run_id)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_eval_items_jp_text ON eval_items(jp_text)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_eval_stages_stage ON eval_stages(stage, fixture_id)")
+
+    def record_run(self, run_row: dict[str, Any], result: dict[str, Any]) -> int:
+        values = [run_row.get(column) for column in RUN_COLUMNS]
+        placeholders = ", ".join("?" for _ in RUN_COLUMNS)
+        with self._conn:
+            cursor = self._conn.execute(
+                f"INSERT INTO eval_runs({', '.join(RUN_COLUMNS)}) VALUES ({placeholders})",
+                values,
+            )
+            run_id = int(cursor.lastrowid)
+
+            for example in iter_report_examples(result, run_row["report_path"]):
+                self._insert_example_locked(run_id, example)
+            for failure in result.get("failures", []):
+                self._conn.execute(
+                    """
+                    INSERT OR REPLACE INTO eval_examples(run_id, fixture_id, status, error)
+                    VALUES (?, ?, 'failed', ?)
+                    """,
+                    (run_id, str(failure.get("fixture_id", "unknown")), str(failure.get("error", ""))),
+                )
+            for sample in (result.get("benchmark") or {}).get("samples", []):
+                stages = {"total": sample["latency_ms"], **sample.get("stage_latency_ms", {})}
+                self._conn.executemany(
+                    """
+                    INSERT OR REPLACE INTO eval_latency_samples(run_id, fixture_id, repeat_index, stage, latency_ms)
+                    VALUES (?, ?, ?, ?, ?)
+                    """,
+                    [
+                        (run_id, str(sample["fixture_id"]), int(sample["repeat"]), stage, float(latency))
+                        for stage, latency in stages.items()
+                    ],
+                )
+        return run_id
+
+    def _insert_example_locked(self, run_id: int, example: dict[str, Any]) -> None:
+        fixture_id = str(example["fixture_id"])
+        metrics = example.get("metrics", {})
+        self._conn.execute(
+            """
+            INSERT OR REPLACE INTO eval_examples(
+                run_id, fixture_id, status, error,
+                expected_item_count, predicted_item_count, matched_item_count,
+                parse_success, item_recall, item_precision_proxy,
+                hallucinated_item_rate, coverage_ratio, latency_ms
+            )
+            VALUES (?, ?, 'ok', NULL, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                run_id,
+                fixture_id,
+                metrics.get("expected_item_count"),
+                metrics.get("predicted_item_count"),
+                metrics.get("matched_item_count"),
+                *(metrics.get(column) for column in _EXAMPLE_METRIC_COLUMNS),
+            ),
+        )
+
+        matched_names = {str(match.get("predicted", "")) for match in metrics.get("matches", [])}
+        items = example.get("predicted", {}).get("items", [])
+        self._conn.executemany(
+            """
+            INSERT OR REPLACE INTO eval_items(
+                run_id, fixture_id, item_index, jp_text, en_title, price_text, confidence, match_score, matched
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            [
+                (
+                    run_id,
+                    fixture_id,
+                    index,
+                    str(item.get("jp_text", "")),
+                    item.get("en_title"),
+                    item.get("price_text"),
+                    item.get("confidence"),
+                    (item.get("ocr_diagnostics") or {}).get("match_score"),
+                    1 if str(item.get("jp_text", "")).strip() in matched_names else 0,
+                )
+                for index, item in enumerate(items)
+            ],
+        )
+
+        stage_latency_ms = example.get("pipeline", {}).get("stage_latency_ms", {})
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO eval_stages(run_id, fixture_id, stage, latency_ms) VALUES (?, ?, ?, ?)",
+            [(run_id, fixture_id, stage, float(latency)) for stage, latency in stage_latency_ms.items()],
+        )
+
+    def resolve_run_id(self, ref: str) -> int:
+        """Accept a numeric run id, `latest`, or `latest~N` (N runs before the latest)."""
+        ref = ref.strip().lower()
+        if ref.isdigit():
+            run_id = int(ref)
+            row = self._conn.execute("SELECT run_id FROM eval_runs WHERE run_id = ?", (run_id,)).fetchone()
+        elif ref == "latest" or ref.startswith("latest~"):
+            offset = int(ref.split("~", 1)[1]) if "~" in ref else 0
+            row = self._conn.execute(
+                "SELECT run_id FROM eval_runs ORDER BY run_at_utc DESC, run_id DESC LIMIT 1 OFFSET ?",
+                (offset,),
+            ).fetchone()
+        else:
+            raise ValueError(f"Invalid run reference: {ref}")
+        if row is None:
+            raise ValueError(f"Eval run not found: {ref}")
+        return int(row["run_id"])
+
+    def get_run(self, run_id: int) -> dict[str, Any]:
+        row = self._conn.execute("SELECT * FROM eval_runs WHERE run_id = ?", (run_id,)).fetchone()
+        if row is None:
+            raise ValueError(f"Eval run not found: {run_id}")
+        return dict(row)
+
+    def latency_samples(self, run_id: int) -> list[dict[str, Any]]:
+        """Benchmark samples in the shape `run_evals` records them.
+
+        Runs recorded without benchmark mode fall back to their single measurement per
+        fixture, so any earlier run can serve as a (noisier) baseline.
+        """
+        rows = self._conn.execute(
+            """
+            SELECT fixture_id, repeat_index, stage, latency_ms
+            FROM eval_latency_samples
+            WHERE run_id = ?
+            ORDER BY fixture_id, repeat_index
+            """,
+            (run_id,),
+        ).fetchall()
+        if not rows:
+            rows = self._conn.execute(
+                """
+                SELECT fixture_id, 0 AS repeat_index, 'total' AS stage, latency_ms
+                FROM eval_examples
+                WHERE run_id = ? AND status = 'ok' AND latency_ms IS NOT NULL
+                UNION ALL
+                SELECT fixture_id, 0, stage, latency_ms FROM eval_stages WHERE run_id = ?
+                """,
+                (run_id, run_id),
+            ).fetchall()
+        samples: dict[tuple[str, int], dict[str, Any]] = {}
+        for row in rows:
+            key = (row["fixture_id"], int(row["repeat_index"]))
+            sample = samples.setdefault(
+                key, {"fixture_id": key[0], "repeat": key[1], "latency_ms": 0.0, "stage_latency_ms": {}}
+            )
+            if row["stage"] == "total":
+                sample["latency_ms"] = float(row["latency_ms"])
+            else:
+                sample["stage_latency_ms"][row["stage"]] = float(row["latency_ms"])
+        return list(samples.values())
+
+    def list_runs(self, limit: int = 20) -> list[dict[str, Any]]:
+        rows = self._conn.execute(
+            """
+            SELECT run_id, run_at_utc, model, ocr_pipeline_mode, menu_parse_prompt_version,
+                   ocr_normalize_prompt_version, example_count, failure_count,
+                   item_recall, item_precision_proxy, hallucinated_item_rate, mean_latency_ms, p95_latency_ms
+            FROM eval_runs
+            ORDER BY run_at_utc DESC, run_id DESC
+            LIMIT ?
+            """,
+            (limit,),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def diff_runs(self, base_run_id: int, head_run_id: int, tolerance: float = 0.0) -> list[dict[str, Any]]:
+        rows = self._conn.execute(
+            """
+            SELECT COALESCE(base.fixture_id, head.fixture_id) AS fixture_id,
+                   base.status AS base_status,
+                   head.status AS head_status,
+                   base.item_recall AS base_recall,
+                   head.item_recall AS head_recall,
+                   base.item_precision_proxy AS base_precision,
+                   head.item_precision_proxy AS head_precision,
+                   base.hallucinated_item_rate AS base_hallucinated,
+                   head.hallucinated_item_rate AS head_hallucinated,
+                   base.latency_ms AS base_latency_ms,
+                   head.latency_ms AS head_latency_ms
+            FROM (SELECT * FROM eval_examples WHERE run_id = ?) AS base
+            LEFT JOIN (SELECT * FROM eval_examples WHERE run_id = ?) AS head
+                ON head.fixture_id = base.fixture_id
+            UNION ALL
+            SELECT head.fixture_id, NULL, head.status, NULL, head.item_recall, NULL, head.item_precision_proxy,
+                   NULL, head.hallucinated_item_rate, NULL, head.latency_ms
+            FROM eval_examples AS head
+            WHERE head.run_id = ?
+              AND head.fixture_id NOT IN (SELECT fixture_id FROM eval_examples WHERE run_id = ?)
+            ORDER BY fixture_id
+            """,
+            (base_run_id, head_run_id, head_run_id, base_run_id),
+        ).fetchall()
+
+        diffs: list[dict[str, Any]] = []
+        for row in rows:
+            entry = dict(row)
+            entry["recall_delta"] = _delta(entry["base_recall"], entry["head_recall"])
+            entry["precision_delta"] = _delta(entry["base_precision"], entry["head_precision"])
+            entry["hallucinated_delta"] = _delta(entry["base_hallucinated"], entry["head_hallucinated"])
+            entry["latency_delta_ms"] = _delta(entry["base_latency_ms"], entry["head_latency_ms"])
+            entry["status"] = _classify_diff(entry, tolerance)
+            diffs.append(entry)
+        return diffs
+
+    def aggregate(self, group_by: str, limit: int | None = None) -> list[dict[str, Any]]:
+        if group_by not in GROUPABLE_COLUMNS:
+            raise ValueError(f"group_by must be one of: {', '.join(GROUPABLE_COLUMNS)}")
+        rows = self._conn.execute(
+            f"""
+            SELECT {group_by} AS group_value,
+                   COUNT(*) AS run_count,
+                   MAX(run_at_utc) AS last_run_at_utc,
+                   ROUND(AVG(item_recall), 4) AS avg_item_recall,
+                   ROUND(AVG(item_precision_proxy), 4) AS avg_item_precision_proxy,
+                   ROUND(AVG(hallucinated_item_rate), 4) AS avg_hallucinated_item_rate,
+                   ROUND(AVG(mean_latency_ms), 1) AS avg_mean_latency_ms,
+                   ROUND(MAX(p95_latency_ms), 1) AS max_p95_latency_ms,
+                   SUM(failure_count) AS total_failures
+            FROM eval_runs
+            GROUP BY {group_by}
+            ORDER BY last_run_at_utc DESC
+            LIMIT ?
+            """,
+            (limit if limit is not None else -1,),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def fixture_history(self, fixture_id: str, limit: int = 20) -> list[dict[str, Any]]:
+        rows = self._conn.execute(
+            """
+            SELECT r.run_id, r.run_at_utc, r.model, r.ocr_pipeline_mode, r.menu_parse_prompt_version,
+                   e.status, e.item_recall, e.item_precision_proxy, e.hallucinated_item_rate, e.latency_ms
+            FROM eval_examples AS e
+            JOIN eval_runs AS r ON r.run_id = e.run_id
+            WHERE e.fixture_id = ?
+            ORDER BY r.run_at_utc DESC, r.run_id DESC
+            LIMIT ?
+            """,
+            (fixture_id, limit),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def stage_latency_summary(self, run_id: int) -> list[dict[str, Any]]:
+        rows = self._conn.execute(
+            """
+            SELECT stage,
+                   COUNT(*) AS example_count,
+                   ROUND(AVG(latency_ms), 1) AS mean_latency_ms,
+                   ROUND(MAX(latency_ms), 1) AS max_latency_ms
+            FROM eval_stages
+            WHERE run_id = ?
+            GROUP BY stage
+            ORDER BY stage
+            """,
+            (run_id,),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+
+def build_run_row(result: dict[str, Any], report_path: Path) -> dict[str, Any]:
+    summary = result["summary"]
+    first_pipeline = result.get("pipeline") or next(iter_report_examples(result, report_path), {}).get("pipeline", {})
+    return {
+        "run_at_utc": result["run_at_utc"],
+        "report_path": str(report_path),
+        "dataset_path": result["dataset_path"],
+        "target_lang": result["target_lang"],
+        "model": first_pipeline.get("model"),
+        "ocr_pipeline_mode": first_pipeline.get("ocr_pipeline_mode"),
+        "menu_parse_prompt_version": first_pipeline.get("menu_parse_prompt_version"),
+        "ocr_normalize_prompt_version": first_pipeline.get("ocr_normalize_prompt_version"),
+        "example_count": summary["example_count"],
+        "failure_count": len(result["failures"]),
+        "parse_success_rate": summary["parse_success_rate"],
+        "item_recall": summary["item_recall"],
+        "item_precision_proxy": summary["item_precision_proxy"],
+        "hallucinated_item_rate": summary["hallucinated_item_rate"],
+        "coverage_ratio": summary["coverage_ratio"],
+        "mean_latency_ms": summary["mean_latency_ms"],
+        "p95_latency_ms": summary["p95_latency_ms"],
+    }
+
+
+def _delta(base: float | None, head: float | None) -> float | None:
+    if base is None or head is None:
+        return None
+    return round(float(head) - float(base), 4)
+
+
+def _classify_diff(entry: dict[str, Any], tolerance: float) -> str:
+    if entry["base_status"] is None:
+        return "added"
+    if entry["head_status"] is None:
+        return "removed"
+    if entry["base_status"] == "ok" and entry["head_status"] == "failed":
+        return "regressed"
+    if entry["base_status"] == "failed" and entry["head_status"] == "ok":
+        return "improved"
+    recall_delta = entry["recall_delta"] or 0.0
+    hallucinated_delta = entry["hallucinated_delta"] or 0.0
+    if recall_delta < -tolerance or hallucinated_delta > tolerance:
+        return "regressed"
+    if recall_delta > tolerance or hallucinated_delta < -tolerance:
+        return "improved"
+    return "unchanged"
+
+
+def _print_table(rows: list[dict[str, Any]]) -> None:
+    if not rows:
+        print("(no rows)")
+        return
+    columns = list(rows[0].keys())
+    widths = {column: max(len(column), *(len(_format_cell(row[column])) for row in rows)) for column in columns}
+    print("  ".join(column.ljust(widths[column]) for column in columns))
+    for row in rows:
+        print("  ".join(_format_cell(row[column]).ljust(widths[column]) for column in columns))
+
+
+def _format_cell(value: Any) -> str:
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:.4g}"
+    return str(value)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m evals.results_store", description="Query stored eval runs.")
+    parser.add_argument("--db", default=str(DEFAULT_DB_PATH), help="Path to the eval results SQLite store.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    runs_parser = subparsers.add_parser("runs", help="List recent runs.")
+    runs_parser.add_argument("--limit", type=int, default=20)
+
+    diff_parser = subparsers.add_parser("diff", help="Compare per-fixture results between two runs.")
+    diff_parser.add_argument("base", help="Base run id, `latest` or `latest~N`.")
+    diff_parser.add_argument("head", nargs="?", default="latest", help="Head run id (default: latest).")
+    diff_parser.add_argument("--tolerance", type=float, default=0.0)
+    diff_parser.add_argument("--all", action="store_true", help="Show unchanged fixtures too.")
+
+    aggregate_parser = subparsers.add_parser("aggregate", help="Aggregate summary metrics across runs.")
+    aggregate_parser.add_argument("--by", choices=GROUPABLE_COLUMNS, default="menu_parse_prompt_version")
+    aggregate_parser.add_argument("--limit", type=int, default=None)
+
+    fixture_parser = subparsers.add_parser("fixture", help="Show one fixture's history across runs.")
+    fixture_parser.add_argument("fixture_id")
+    fixture_parser.add_argument("--limit", type=int, default=20)
+
+    stages_parser = subparsers.add_parser("stages", help="Per-stage latency summary for one run.")
+    stages_parser.add_argument("run", nargs="?", default="latest")
+
+    import_parser = subparsers.add_parser("import", help="Backfill the store from existing JSON eval reports.")
+    import_parser.add_argument("reports", nargs="+")
+
+    args = parser.parse_args(argv)
+    store = EvalResultsStore(args.db)
+    try:
+        if args.command == "runs":
+            _print_table(store.list_runs(limit=args.limit))
+        elif args.command == "diff":
+            base_run_id = store.resolve_run_id(args.base)
+            head_run_id = store.resolve_run_id(args.head)
+            diffs = store.diff_runs(base_run_id, head_run_id, tolerance=args.tolerance)
+            shown = diffs if args.all else [entry for entry in diffs if entry["status"] != "unchanged"]
+            print(f"Diff run {base_run_id} -> {head_run_id}")
+            _print_table(
+                [
+                    {
+                        "fixture_id": entry["fixture_id"],
+                        "status": entry["status"],
+                        "base_recall": entry["base_recall"],
+                        "head_recall": entry["head_recall"],
+                        "recall_delta": entry["recall_delta"],
+                        "hallucinated_delta": entry["hallucinated_delta"],
+                        "latency_delta_ms": entry["latency_delta_ms"],
+                    }
+                    for entry in shown
+                ]
+            )
+            regressed = [entry["fixture_id"] for entry in diffs if entry["status"] == "regressed"]
+            print(f"Regressed fixtures: {len(regressed)}")
+            return 1 if regressed else 0
+        elif args.command == "aggregate":
+            _print_table(store.aggregate(group_by=args.by, limit=args.limit))
+        elif args.command == "fixture":
+            _print_table(store.fixture_history(args.fixture_id, limit=args.limit))
+        elif args.command == "stages":
+            _print_table(store.stage_latency_summary(store.resolve_run_id(args.run)))
+        elif args.command == "import":
+            for report in args.reports:
+                report_path = Path(report)
+                result = json.loads(report_path.read_text(encoding="utf-8"))
+                run_id = store.record_run(build_run_row(result, report_path), result)
+                print(f"Imported {report_path} as run {run_id}")
+    finally:
+        store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
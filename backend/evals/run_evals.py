@@ -1,25 +1,48 @@
+import argparse
 import asyncio
 import csv
 import json
+import logging
 import os
 import time
 from datetime import datetime, timezone
+from collections.abc import Iterator
 from pathlib import Path
 from typing import Any
 
 from app.main import (
+    _MENU_PARSE_PROMPTS,
+    FusedLlmOutput,
+    GeminiTokenUsage,
+    LlmOutput,
+    VisionLlmOutput,
     _build_ocr_diagnostics,
-    _estimate_ocr_candidate_count,
+    _build_ocr_source_index,
     _gemini_normalize_ocr_text,
     _gemini_parse_menu,
+    _gemini_parse_menu_regions,
+    _layout_regions,
     _normalize_for_match,
+    _parse_prompt_name,
+    _plan_dish_dictionary,
+    _prepare_gemini_image,
     _require_env,
+    _resolve_gemini_vision_max_image_side,
     _resolve_max_menu_items,
+    _resolve_max_scan_items,
     _resolve_ocr_pipeline_mode,
-    _vision_ocr,
+    _vision_ocr_layout,
 )
-from app.prompts.registry import get_active_prompt_version
+from app.menu_layout import TextBlock
+from app.prompts.registry import get_active_prompt_version, get_prompt_fingerprint
+from evals.benchmark import compare_latency, latency_profile, quality_regressions, stage_samples
+from evals.results_store import RUN_COLUMNS, EvalResultsStore, build_run_row
 from evals.scoring import score_example, summarize_results
+from evals.shards import iter_report_examples, merge_shards, parse_shard, read_dataset, shard_of, write_jsonl_line
+from evals.stage_cache import StageCache, sha256_bytes, sha256_text
+
+
+logger = logging.getLogger("menulens")
 
 
 DATASET_PATH = Path(os.getenv("EVAL_DATASET_PATH", Path(__file__).resolve().parent / "dataset" / "examples.json"))
@@ -27,34 +50,19 @@ RESULTS_DIR = Path(os.getenv("EVAL_RESULTS_DIR", Path(__file__).resolve().parent
 TARGET_LANG = os.getenv("EVAL_TARGET_LANG", "en").strip() or "en"
 INCLUDE_DISABLED = os.getenv("EVAL_INCLUDE_DISABLED", "false").strip().lower() == "true"
 RUN_LEDGER_PATH = Path(os.getenv("EVAL_RUN_LEDGER_PATH", RESULTS_DIR / "eval_runs.csv"))
-RUN_LEDGER_FIELDS = [
-    "run_at_utc",
-    "report_path",
-    "dataset_path",
-    "target_lang",
-    "model",
-    "ocr_pipeline_mode",
-    "menu_parse_prompt_version",
-    "ocr_normalize_prompt_version",
-    "example_count",
-    "failure_count",
-    "parse_success_rate",
-    "item_recall",
-    "item_precision_proxy",
-    "hallucinated_item_rate",
-    "coverage_ratio",
-    "mean_latency_ms",
-    "p95_latency_ms",
-]
-
-
-def _load_dataset() -> list[dict[str, Any]]:
-    dataset = json.loads(DATASET_PATH.read_text(encoding="utf-8"))
-    if not isinstance(dataset, list):
-        raise RuntimeError("Eval dataset must be a JSON array")
-    if INCLUDE_DISABLED:
-        return dataset
-    return [example for example in dataset if example.get("enabled", True)]
+RUN_LEDGER_FIELDS = RUN_COLUMNS
+RESULTS_DB_PATH = Path(os.getenv("EVAL_RESULTS_DB_PATH", RESULTS_DIR / "eval_results.db"))
+STAGE_CACHE_DIR = Path(os.getenv("EVAL_STAGE_CACHE_DIR", RESULTS_DIR / "stage_cache"))
+STAGE_CACHE_ENABLED = os.getenv("EVAL_STAGE_CACHE", "true").strip().lower() == "true"
+
+
+def _iter_dataset(shard: tuple[int, int] | None = None) -> Iterator[dict[str, Any]]:
+    for example in read_dataset(DATASET_PATH):
+        if not INCLUDE_DISABLED and not example.get("enabled", True):
+            continue
+        if shard is not None and shard_of(str(example.get("fixture_id", "unknown")), shard[1]) != shard[0]:
+            continue
+        yield example
 
 
 def _resolve_image_path(raw_path: str) -> Path:
@@ -64,74 +72,224 @@ def _resolve_image_path(raw_path: str) -> Path:
     return Path(__file__).resolve().parent.parent / raw_path
 
 
-async def _run_example(example: dict[str, Any]) -> dict[str, Any]:
+def _read_image_fixture(raw_path: str) -> bytes:
+    image_path = _resolve_image_path(raw_path)
+    if not image_path.exists():
+        raise FileNotFoundError(f"Image fixture not found: {image_path}")
+    return image_path.read_bytes()
+
+
+async def _run_example(example: dict[str, Any], stage_cache: StageCache) -> dict[str, Any]:
     fixture_id = str(example["fixture_id"])
     ocr_pipeline_mode = _resolve_ocr_pipeline_mode()
+    parse_prompt_name = _parse_prompt_name(ocr_pipeline_mode)
     max_menu_items = _resolve_max_menu_items()
+    max_scan_items = _resolve_max_scan_items(ocr_pipeline_mode)
+    model = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
     gemini_key = _require_env("GEMINI_API_KEY")
     vision_key = os.getenv("GOOGLE_CLOUD_VISION_API_KEY", "").strip()
 
     stage_latency_ms: dict[str, int] = {}
+    # Gemini tokens per stage; cached stages replay the counts recorded with them.
+    stage_tokens: dict[str, dict[str, int]] = {}
+    cached_stages: list[str] = []
+    # Cached stages replay their recorded latency so reports stay comparable with uncached runs.
+    replayed_latency_ms = 0
     start = time.perf_counter()
 
-    if example.get("image_path"):
-        image_path = _resolve_image_path(str(example["image_path"]))
-        if not image_path.exists():
-            raise FileNotFoundError(f"Image fixture not found: {image_path}")
-        if not vision_key:
-            raise RuntimeError("GOOGLE_CLOUD_VISION_API_KEY is required for image-based eval examples")
-        image_bytes = image_path.read_bytes()
+    gemini_image: tuple[bytes, str] | None = None
+    text_blocks: list[TextBlock] = []
+    if ocr_pipeline_mode == "gemini_vision":
+        # No Vision OCR call: Gemini transcribes the photo as part of the parse stage.
+        if not example.get("image_path"):
+            raise RuntimeError(f"Example {fixture_id} has no image_path; gemini_vision mode needs an image fixture")
+        image_bytes = _read_image_fixture(str(example["image_path"]))
         stage_start = time.perf_counter()
-        vision_ocr_text = await _vision_ocr(image_bytes=image_bytes, api_key=vision_key)
-        stage_latency_ms["vision_ocr"] = int((time.perf_counter() - stage_start) * 1000)
+        gemini_image = _prepare_gemini_image(image_bytes, _resolve_gemini_vision_max_image_side())
+        stage_latency_ms["image_prepare"] = int((time.perf_counter() - stage_start) * 1000)
+        vision_ocr_text = ""
+    elif example.get("image_path"):
+        image_bytes = _read_image_fixture(str(example["image_path"]))
+        vision_key_hash = StageCache.make_key("vision_ocr", image_sha256=sha256_bytes(image_bytes))
+        cached = stage_cache.get("vision_ocr", vision_key_hash)
+        if cached is not None and ocr_pipeline_mode == "layout_chunked" and "text_blocks" not in cached:
+            # Recorded before layout was cached; layout mode needs the paragraph boxes.
+            cached = None
+        if cached is not None:
+            vision_ocr_text = str(cached["ocr_text"])
+            text_blocks = [TextBlock(*block) for block in cached.get("text_blocks", [])]
+            stage_latency_ms["vision_ocr"] = int(cached["latency_ms"])
+            replayed_latency_ms += stage_latency_ms["vision_ocr"]
+            cached_stages.append("vision_ocr")
+        else:
+            if not vision_key:
+                raise RuntimeError("GOOGLE_CLOUD_VISION_API_KEY is required for image-based eval examples")
+            stage_start = time.perf_counter()
+            vision_ocr_text, text_blocks = await _vision_ocr_layout(image_bytes=image_bytes, api_key=vision_key)
+            stage_latency_ms["vision_ocr"] = int((time.perf_counter() - stage_start) * 1000)
+            if vision_ocr_text:
+                stage_cache.put(
+                    "vision_ocr",
+                    vision_key_hash,
+                    {
+                        "ocr_text": vision_ocr_text,
+                        "latency_ms": stage_latency_ms["vision_ocr"],
+                        "text_blocks": [
+                            [block.text, block.x0, block.y0, block.x1, block.y1, block.block_index]
+                            for block in text_blocks
+                        ],
+                    },
+                )
     else:
         vision_ocr_text = str(example.get("ocr_text", "")).strip()
         stage_latency_ms["vision_ocr"] = 0
 
-    if not vision_ocr_text:
+    if not vision_ocr_text and gemini_image is None:
         raise RuntimeError(f"Example {fixture_id} produced empty OCR text")
 
     normalized_ocr_text: str | None = None
-    normalization_changed = False
     normalization_fallback_used = False
     if ocr_pipeline_mode == "hybrid":
-        stage_start = time.perf_counter()
-        try:
-            normalized_ocr_text = await _gemini_normalize_ocr_text(ocr_text=vision_ocr_text, api_key=gemini_key)
-        except Exception:
-            normalization_fallback_used = True
-            normalized_ocr_text = None
-        stage_latency_ms["ocr_normalize"] = int((time.perf_counter() - stage_start) * 1000)
-        normalization_changed = (
-            normalized_ocr_text is not None
-            and _normalize_for_match(normalized_ocr_text) != _normalize_for_match(vision_ocr_text)
+        normalize_key = StageCache.make_key(
+            "ocr_normalize",
+            ocr_text_sha256=sha256_text(vision_ocr_text),
+            model=model,
+            prompt_version=get_active_prompt_version("ocr_normalize"),
+            prompt_sha256=get_prompt_fingerprint("ocr_normalize"),
+            ocr_pipeline_mode=ocr_pipeline_mode,
         )
+        cached = stage_cache.get("ocr_normalize", normalize_key)
+        if cached is not None:
+            normalized_ocr_text = str(cached["normalized_text"])
+            stage_latency_ms["ocr_normalize"] = int(cached["latency_ms"])
+            if cached.get("tokens"):
+                stage_tokens["ocr_normalize"] = dict(cached["tokens"])
+            replayed_latency_ms += stage_latency_ms["ocr_normalize"]
+            cached_stages.append("ocr_normalize")
+        else:
+            stage_start = time.perf_counter()
+            normalize_tokens = GeminiTokenUsage()
+            try:
+                normalized_ocr_text = await _gemini_normalize_ocr_text(
+                    ocr_text=vision_ocr_text,
+                    api_key=gemini_key,
+                    token_usage=normalize_tokens,
+                )
+            except Exception:
+                normalization_fallback_used = True
+                normalized_ocr_text = None
+            stage_latency_ms["ocr_normalize"] = int((time.perf_counter() - stage_start) * 1000)
+            stage_tokens["ocr_normalize"] = normalize_tokens.as_dict()
+            if normalized_ocr_text is not None:
+                stage_cache.put(
+                    "ocr_normalize",
+                    normalize_key,
+                    {
+                        "normalized_text": normalized_ocr_text,
+                        "latency_ms": stage_latency_ms["ocr_normalize"],
+                        "tokens": stage_tokens["ocr_normalize"],
+                    },
+                )
     else:
         stage_latency_ms["ocr_normalize"] = 0
 
     parse_source_text = normalized_ocr_text or vision_ocr_text
-    stage_start = time.perf_counter()
-    llm_output = await _gemini_parse_menu(
-        ocr_text=parse_source_text,
+    dish_plan = _plan_dish_dictionary(ocr_pipeline_mode, TARGET_LANG, parse_source_text)
+    if dish_plan is not None:
+        # Only Gemini's share of the menu is cached; dictionary items are merged in after.
+        parse_source_text = dish_plan.llm_text
+    regions = _layout_regions(vision_ocr_text, text_blocks) if ocr_pipeline_mode == "layout_chunked" else []
+    item_regions: list[int] = []
+    layout_regions: list[dict[str, Any]] | None = None
+    parse_key = StageCache.make_key(
+        "menu_parse",
+        ocr_text_sha256=sha256_text(parse_source_text),
+        model=model,
+        prompt_version=get_active_prompt_version(parse_prompt_name),
+        prompt_sha256=get_prompt_fingerprint(parse_prompt_name),
         target_lang=TARGET_LANG,
-        api_key=gemini_key,
+        max_menu_items=max_menu_items,
+        ocr_pipeline_mode=ocr_pipeline_mode,
+        **({"image_sha256": sha256_bytes(gemini_image[0])} if gemini_image is not None else {}),
+        **({"regions_sha256": sha256_text("\f".join(region.text for region in regions))} if regions else {}),
+    )
+    cached = stage_cache.get("menu_parse", parse_key)
+    if dish_plan is not None and dish_plan.skips_llm:
+        llm_output = LlmOutput(items=[])
+        stage_latency_ms["menu_parse"] = 0
+    elif cached is not None:
+        llm_output = _MENU_PARSE_PROMPTS[parse_prompt_name][1].model_validate(cached["llm_output"])
+        stage_latency_ms["menu_parse"] = int(cached["latency_ms"])
+        if cached.get("tokens"):
+            stage_tokens["menu_parse"] = dict(cached["tokens"])
+        item_regions = list(cached.get("item_regions", []))
+        layout_regions = cached.get("layout_regions")
+        replayed_latency_ms += stage_latency_ms["menu_parse"]
+        cached_stages.append("menu_parse")
+    else:
+        stage_start = time.perf_counter()
+        parse_tokens = GeminiTokenUsage()
+        llm_output: LlmOutput
+        if regions:
+            layout = await _gemini_parse_menu_regions(
+                regions,
+                target_lang=TARGET_LANG,
+                api_key=gemini_key,
+                token_usage=parse_tokens,
+            )
+            llm_output, item_regions, layout_regions = layout.output, layout.item_regions, layout.regions
+        else:
+            llm_output = await _gemini_parse_menu(
+                ocr_text=parse_source_text,
+                target_lang=TARGET_LANG,
+                api_key=gemini_key,
+                prompt_name=parse_prompt_name,
+                token_usage=parse_tokens,
+                image=gemini_image,
+            )
+        stage_latency_ms["menu_parse"] = int((time.perf_counter() - stage_start) * 1000)
+        stage_tokens["menu_parse"] = parse_tokens.as_dict()
+        stage_cache.put(
+            "menu_parse",
+            parse_key,
+            {
+                "llm_output": llm_output.model_dump(),
+                "latency_ms": stage_latency_ms["menu_parse"],
+                "tokens": stage_tokens["menu_parse"],
+                "item_regions": item_regions,
+                "layout_regions": layout_regions,
+            },
+        )
+    if dish_plan is not None:
+        llm_output = dish_plan.merge(llm_output)
+    total_latency_ms = (time.perf_counter() - start) * 1000 + replayed_latency_ms
+
+    if isinstance(llm_output, FusedLlmOutput):
+        normalized_ocr_text = llm_output.normalized_text.strip() or None
+    elif isinstance(llm_output, VisionLlmOutput):
+        vision_ocr_text = llm_output.ocr_text.strip()
+    source_index = _build_ocr_source_index(normalized_ocr_text or vision_ocr_text)
+    normalization_changed = (
+        normalized_ocr_text is not None
+        and source_index.normalized != _normalize_for_match(vision_ocr_text)
     )
-    stage_latency_ms["menu_parse"] = int((time.perf_counter() - stage_start) * 1000)
-    total_latency_ms = (time.perf_counter() - start) * 1000
+    gemini_tokens = sum(usage.get("total", 0) for usage in stage_tokens.values()) if stage_tokens else None
 
-    estimated_candidates = _estimate_ocr_candidate_count(parse_source_text)
+    estimated_candidates = source_index.candidate_count
     predictions: list[dict[str, Any]] = []
-    for item in llm_output.items[:max_menu_items]:
+    for item_index, item in enumerate(llm_output.items[:max_scan_items]):
         diagnostics, final_confidence = _build_ocr_diagnostics(
             item_jp_text=item.jp_text,
             en_title=item.en_title,
-            source_text_for_matching=parse_source_text,
+            source_index=source_index,
             ocr_pipeline=ocr_pipeline_mode,
             normalization_changed=normalization_changed,
             vision_text_len=len(vision_ocr_text),
             normalized_text_len=len(normalized_ocr_text) if normalized_ocr_text else None,
             llm_confidence=max(0.0, min(1.0, item.confidence)),
         )
+        if item_regions:
+            diagnostics["layout_region"] = item_regions[item_index]
         predictions.append(
             {
                 "jp_text": item.jp_text,
@@ -148,6 +306,7 @@ async def _run_example(example: dict[str, Any]) -> dict[str, Any]:
         expected_jp_names=list(example.get("expected_jp_names", [])),
         predicted_jp_names=[item["jp_text"] for item in predictions],
         latency_ms=total_latency_ms,
+        gemini_tokens=gemini_tokens,
     )
 
     return {
@@ -170,69 +329,156 @@ async def _run_example(example: dict[str, Any]) -> dict[str, Any]:
             "coverage_ratio": round(min(1.0, len(predictions) / estimated_candidates), 4)
             if estimated_candidates > 0
             else None,
-            "model": os.getenv("GEMINI_MODEL", "gemini-1.5-flash"),
-            "menu_parse_prompt_version": get_active_prompt_version("menu_parse"),
+            "model": model,
+            "menu_parse_prompt_version": get_active_prompt_version(parse_prompt_name),
             "ocr_normalize_prompt_version": get_active_prompt_version("ocr_normalize"),
             "stage_latency_ms": stage_latency_ms,
+            "stage_gemini_tokens": stage_tokens,
+            "normalized_ocr_text": normalized_ocr_text,
+            "gemini_transcribed_text": vision_ocr_text if gemini_image is not None else None,
+            "layout_regions": layout_regions,
+            "dish_dictionary": dish_plan.diagnostics() if dish_plan is not None else None,
             "normalization_fallback_used": normalization_fallback_used,
+            "cached_stages": cached_stages,
         },
     }
 
 
-async def _run() -> dict[str, Any]:
-    dataset = _load_dataset()
-    if not dataset:
-        raise RuntimeError("No eval examples found")
+async def _run(
+    examples_path: Path,
+    shard: tuple[int, int] | None = None,
+    benchmark: bool = False,
+    warmup: int = 0,
+    repeats: int = 1,
+) -> dict[str, Any]:
+    # Cached stages replay their recorded latency, which would make every repeat identical.
+    stage_cache = StageCache(STAGE_CACHE_DIR, enabled=STAGE_CACHE_ENABLED and not benchmark)
+    warmup_failures = 0
+    for _ in range(warmup if benchmark else 0):
+        for example in _iter_dataset(shard):
+            try:
+                await _run_example(example, stage_cache)
+            except Exception as exc:
+                # Warmup results are discarded, but a failing warmup usually means the measured passes fail too.
+                warmup_failures += 1
+                logger.warning("Warmup run of %s failed: %s", example.get("fixture_id", "unknown"), exc)
 
-    example_results: list[dict[str, Any]] = []
+    # Example results go straight to disk; only their metrics stay in memory for the summary.
+    scored: list[dict[str, Any]] = []
+    pipeline: dict[str, Any] = {}
     failures: list[dict[str, str]] = []
-    for example in dataset:
-        fixture_id = str(example.get("fixture_id", "unknown"))
-        try:
-            example_results.append(await _run_example(example))
-        except Exception as exc:
-            failures.append({"fixture_id": fixture_id, "error": str(exc)})
+    samples: list[dict[str, Any]] = []
+    failed_repeats = 0
+    with examples_path.open("w", encoding="utf-8") as examples_file:
+        # Repeats sweep the whole dataset in turn, so upstream drift spreads across fixtures.
+        for repeat in range(repeats if benchmark else 1):
+            for example in _iter_dataset(shard):
+                fixture_id = str(example.get("fixture_id", "unknown"))
+                try:
+                    example_result = await _run_example(example, stage_cache)
+                except Exception as exc:
+                    if repeat == 0:
+                        failures.append({"fixture_id": fixture_id, "error": str(exc)})
+                    else:
+                        failed_repeats += 1
+                    continue
+                # Quality is scored on the first measured pass; later passes only add latency samples.
+                if repeat == 0:
+                    write_jsonl_line(examples_file, example_result)
+                    scored.append({"metrics": example_result["metrics"]})
+                    pipeline = pipeline or {
+                        key: example_result["pipeline"][key]
+                        for key in ("model", "ocr_pipeline_mode", "menu_parse_prompt_version", "ocr_normalize_prompt_version")
+                    }
+                if benchmark:
+                    samples.append(
+                        {
+                            "fixture_id": fixture_id,
+                            "repeat": repeat,
+                            "latency_ms": example_result["metrics"]["latency_ms"],
+                            "stage_latency_ms": example_result["pipeline"]["stage_latency_ms"],
+                        }
+                    )
+    if not scored and not failures and shard is None:
+        raise RuntimeError("No eval examples found")
 
-    summary = summarize_results(example_results)
-    return {
+    result = {
         "run_at_utc": datetime.now(timezone.utc).isoformat(),
         "dataset_path": str(DATASET_PATH),
         "target_lang": TARGET_LANG,
-        "summary": summary,
+        "summary": summarize_results(scored),
+        "stage_cache": {
+            "enabled": stage_cache.enabled,
+            "hits": stage_cache.hits,
+            "misses": stage_cache.misses,
+        },
         "failures": failures,
-        "examples": example_results,
+        "pipeline": pipeline,
+        "examples_file": examples_path.name,
     }
+    if shard is not None:
+        result["shard"] = {"index": shard[0], "count": shard[1]}
+    if benchmark:
+        result["benchmark"] = {
+            "warmup": warmup,
+            "repeats": repeats,
+            "failed_repeats": failed_repeats,
+            "warmup_failures": warmup_failures,
+            "stages": {stage: latency_profile(values) for stage, values in stage_samples(samples).items()},
+            "samples": samples,
+        }
+    return result
 
 
-def _append_run_ledger(result: dict[str, Any], report_path: Path) -> None:
-    summary = result["summary"]
-    first_pipeline = result["examples"][0]["pipeline"] if result["examples"] else {}
-    row = {
-        "run_at_utc": result["run_at_utc"],
-        "report_path": str(report_path),
-        "dataset_path": result["dataset_path"],
-        "target_lang": result["target_lang"],
-        "model": first_pipeline.get("model", os.getenv("GEMINI_MODEL", "gemini-1.5-flash")),
-        "ocr_pipeline_mode": first_pipeline.get("ocr_pipeline_mode", _resolve_ocr_pipeline_mode()),
-        "menu_parse_prompt_version": first_pipeline.get(
-            "menu_parse_prompt_version",
-            get_active_prompt_version("menu_parse"),
-        ),
-        "ocr_normalize_prompt_version": first_pipeline.get(
-            "ocr_normalize_prompt_version",
-            get_active_prompt_version("ocr_normalize"),
-        ),
-        "example_count": summary["example_count"],
-        "failure_count": len(result["failures"]),
-        "parse_success_rate": summary["parse_success_rate"],
-        "item_recall": summary["item_recall"],
-        "item_precision_proxy": summary["item_precision_proxy"],
-        "hallucinated_item_rate": summary["hallucinated_item_rate"],
-        "coverage_ratio": summary["coverage_ratio"],
-        "mean_latency_ms": summary["mean_latency_ms"],
-        "p95_latency_ms": summary["p95_latency_ms"],
+def _compare_with_baseline(
+    result: dict[str, Any], report_path: Path, store: EvalResultsStore, baseline_run_id: int, args: argparse.Namespace
+) -> dict[str, Any]:
+    base_samples = store.latency_samples(baseline_run_id)
+    head_samples = (result.get("benchmark") or {}).get("samples") or [
+        {
+            "fixture_id": example["fixture_id"],
+            "latency_ms": example["metrics"]["latency_ms"],
+            "stage_latency_ms": example["pipeline"]["stage_latency_ms"],
+        }
+        for example in iter_report_examples(result, report_path)
+    ]
+    # Only fixtures measured in both runs are compared, so dataset edits do not read as latency shifts.
+    shared = {sample["fixture_id"] for sample in base_samples} & {sample["fixture_id"] for sample in head_samples}
+    latency = compare_latency(
+        stage_samples([sample for sample in head_samples if sample["fixture_id"] in shared]),
+        stage_samples([sample for sample in base_samples if sample["fixture_id"] in shared]),
+        max_regression_pct=args.max_latency_regression_pct,
+        alpha=args.alpha,
+    )
+    quality = quality_regressions(
+        result["summary"],
+        store.get_run(baseline_run_id),
+        max_recall_drop=args.max_recall_drop,
+        max_hallucination_increase=args.max_hallucination_increase,
+    )
+    return {
+        "baseline_run_id": baseline_run_id,
+        "shared_fixture_count": len(shared),
+        "latency": latency,
+        "quality_regressions": quality,
+        "regressed": bool(quality) or any(row["regressed"] for row in latency),
     }
 
+
+def _build_run_row(result: dict[str, Any], report_path: Path) -> dict[str, Any]:
+    row = build_run_row(result, report_path)
+    row["model"] = row["model"] or os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+    row["ocr_pipeline_mode"] = row["ocr_pipeline_mode"] or _resolve_ocr_pipeline_mode()
+    row["menu_parse_prompt_version"] = row["menu_parse_prompt_version"] or get_active_prompt_version(
+        _parse_prompt_name(_resolve_ocr_pipeline_mode())
+    )
+    row["ocr_normalize_prompt_version"] = (
+        row["ocr_normalize_prompt_version"] or get_active_prompt_version("ocr_normalize")
+    )
+    return row
+
+
+def _append_run_ledger(row: dict[str, Any]) -> None:
     RUN_LEDGER_PATH.parent.mkdir(parents=True, exist_ok=True)
     write_header = not RUN_LEDGER_PATH.exists() or RUN_LEDGER_PATH.stat().st_size == 0
     with RUN_LEDGER_PATH.open("a", encoding="utf-8-sig", newline="") as file:
@@ -242,17 +488,109 @@ def _append_run_ledger(result: dict[str, Any], report_path: Path) -> None:
         writer.writerow(row)
 
 
-def main() -> None:
+def _parse_args(argv: list[str] | None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m evals.run_evals", description="Run the menu-scanning eval set.")
+    parser.add_argument(
+        "--benchmark",
+        action="store_true",
+        help="Measure latency: disable the stage cache, run warmup passes, then repeat every example.",
+    )
+    parser.add_argument("--warmup", type=int, default=1, help="Unrecorded passes over the dataset (benchmark mode).")
+    parser.add_argument("--repeats", type=int, default=5, help="Measured passes over the dataset (benchmark mode).")
+    parser.add_argument(
+        "--baseline",
+        default=None,
+        help="Compare against a stored run (`latest`, `latest~N` or a run id) and exit non-zero on regression.",
+    )
+    parser.add_argument("--max-latency-regression-pct", type=float, default=10.0)
+    parser.add_argument("--alpha", type=float, default=0.05, help="Significance level for latency regressions.")
+    parser.add_argument("--max-recall-drop", type=float, default=0.02)
+    parser.add_argument("--max-hallucination-increase", type=float, default=0.02)
+    parser.add_argument(
+        "--embed-examples",
+        action="store_true",
+        help="Also embed the example results in the report JSON under `examples`, as reports did before `examples_file`.",
+    )
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--shard",
+        default=None,
+        help="Run only shard i of n (e.g. 1/4) and write a shard report instead of recording a run.",
+    )
+    mode.add_argument(
+        "--merge",
+        nargs="+",
+        metavar="SHARD_REPORT",
+        help="Combine shard reports into one recorded run instead of running the eval set.",
+    )
+    args = parser.parse_args(argv)
+    if args.warmup < 0 or args.repeats < 1:
+        parser.error("--warmup must be >= 0 and --repeats >= 1")
+    if args.shard is not None:
+        try:
+            args.shard = parse_shard(args.shard)
+        except ValueError as exc:
+            parser.error(str(exc))
+        if args.baseline:
+            parser.error("--baseline applies to the merged run, not to a single shard")
+    return args
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = _parse_args(argv)
     RESULTS_DIR.mkdir(parents=True, exist_ok=True)
-    result = asyncio.run(_run())
     timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    if args.shard is not None:
+        index, count = args.shard
+        output_path = RESULTS_DIR / f"eval_shard_{index}of{count}_{timestamp}.json"
+        result = asyncio.run(
+            _run(
+                output_path.with_suffix(".examples.jsonl"),
+                shard=args.shard,
+                benchmark=args.benchmark,
+                warmup=args.warmup,
+                repeats=args.repeats,
+            )
+        )
+        if args.embed_examples:
+            result["examples"] = list(iter_report_examples(result, output_path))
+        output_path.write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"Saved shard {index}/{count} report to {output_path}")
+        print(f"Shard examples={int(result['summary']['example_count'])} failures={len(result['failures'])}")
+        return 0
+
     output_path = RESULTS_DIR / f"eval_report_{timestamp}.json"
-    output_path.write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
-    _append_run_ledger(result, output_path)
+    store = EvalResultsStore(RESULTS_DB_PATH)
+    try:
+        # Resolved before this run is recorded, so `latest` means the previous run.
+        baseline_run_id = store.resolve_run_id(args.baseline) if args.baseline else None
+        if args.merge:
+            shards = [(Path(path), json.loads(Path(path).read_text(encoding="utf-8"))) for path in args.merge]
+            result = merge_shards(shards, output_path.with_suffix(".examples.jsonl"))
+        else:
+            result = asyncio.run(
+                _run(
+                    output_path.with_suffix(".examples.jsonl"),
+                    benchmark=args.benchmark,
+                    warmup=args.warmup,
+                    repeats=args.repeats,
+                )
+            )
+        if baseline_run_id is not None:
+            result["baseline_comparison"] = _compare_with_baseline(result, output_path, store, baseline_run_id, args)
+        if args.embed_examples:
+            result["examples"] = list(iter_report_examples(result, output_path))
+        output_path.write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+        run_row = _build_run_row(result, output_path)
+        _append_run_ledger(run_row)
+        run_id = store.record_run(run_row, result)
+    finally:
+        store.close()
 
     summary = result["summary"]
     print(f"Saved eval report to {output_path}")
     print(f"Appended eval run ledger to {RUN_LEDGER_PATH}")
+    print(f"Recorded eval run {run_id} in {RESULTS_DB_PATH}")
     print(
         "Summary:"
         f" examples={int(summary['example_count'])}"
@@ -262,12 +600,41 @@ def main() -> None:
         f" coverage={summary['coverage_ratio']:.3f}"
         f" mean_latency_ms={summary['mean_latency_ms']:.1f}"
         f" p95_latency_ms={summary['p95_latency_ms']:.1f}"
+        f" mean_gemini_tokens={summary['mean_gemini_tokens']:.1f}"
     )
+    stage_cache = result["stage_cache"]
+    if stage_cache["enabled"]:
+        print(f"Stage cache: hits={stage_cache['hits']} misses={stage_cache['misses']}")
     if result["failures"]:
         print(f"Failures: {len(result['failures'])}")
         for failure in result["failures"]:
             print(f" - {failure['fixture_id']}: {failure['error']}")
+    benchmark = result.get("benchmark")
+    if benchmark:
+        print(
+            f"Benchmark: warmup={benchmark['warmup']} repeats={benchmark['repeats']}"
+            f" warmup_failures={benchmark['warmup_failures']} failed_repeats={benchmark['failed_repeats']}"
+        )
+        for stage, profile in benchmark["stages"].items():
+            print(
+                f" - {stage}: n={int(profile['count'])} p50={profile['p50_ms']:.1f}"
+                f" p90={profile['p90_ms']:.1f} p99={profile['p99_ms']:.1f}"
+            )
+    comparison = result.get("baseline_comparison")
+    if comparison is None:
+        return 0
+    print(f"Baseline run {comparison['baseline_run_id']} ({comparison['shared_fixture_count']} shared fixtures):")
+    for row in comparison["latency"]:
+        print(
+            f" - {row['stage']}: p50 {row['base_p50_ms']:.1f} -> {row['head_p50_ms']:.1f} ({row['p50_change_pct']:+.1f}%)"
+            f" p90 {row['base_p90_ms']:.1f} -> {row['head_p90_ms']:.1f} ({row['p90_change_pct']:+.1f}%)"
+            f" p={row['p_value']:.4f}{' REGRESSED' if row['regressed'] else ''}"
+        )
+    for reason in comparison["quality_regressions"]:
+        print(f" - quality: {reason}")
+    print("Regression gate: " + ("FAILED" if comparison["regressed"] else "passed"))
+    return 1 if comparison["regressed"] else 0
 
 
 if __name__ == "__main__":
-    main()
+    raise SystemExit(main())
@@ -97,7 +97,13 @@ def _match_items(expected_names: list[str], predicted_names: list[str]) -> tuple
     return matches, missed_expected, extra_predicted
 
 
-def score_example(*, expected_jp_names: list[str], predicted_jp_names: list[str], latency_ms: float) -> dict[str, Any]:
+def score_example(
+    *,
+    expected_jp_names: list[str],
+    predicted_jp_names: list[str],
+    latency_ms: float,
+    gemini_tokens: int | None = None,
+) -> dict[str, Any]:
     expected = [value.strip() for value in expected_jp_names if value.strip()]
     predicted = [value.strip() for value in predicted_jp_names if value.strip()]
     matches, missed_expected, extra_predicted = _match_items(expected, predicted)
@@ -119,6 +125,7 @@ def score_example(*, expected_jp_names: list[str], predicted_jp_names: list[str]
         "hallucinated_item_rate": round(hallucinated_item_rate, 4),
         "coverage_ratio": round(coverage_ratio, 4),
         "latency_ms": round(latency_ms, 1),
+        "gemini_tokens": gemini_tokens,
         "matches": matches,
         "missed_expected_jp_names": missed_expected,
         "extra_predicted_jp_names": extra_predicted,
@@ -132,6 +139,11 @@ def summarize_results(example_results: list[dict[str, Any]]) -> dict[str, float]
     precision_values = [float(result["metrics"]["item_precision_proxy"]) for result in example_results]
     hallucination_values = [float(result["metrics"]["hallucinated_item_rate"]) for result in example_results]
     coverage_values = [float(result["metrics"]["coverage_ratio"]) for result in example_results]
+    token_values = [
+        float(result["metrics"]["gemini_tokens"])
+        for result in example_results
+        if result["metrics"].get("gemini_tokens") is not None
+    ]
 
     return {
         "example_count": float(len(example_results)),
@@ -142,4 +154,5 @@ def summarize_results(example_results: list[dict[str, Any]]) -> dict[str, float]
         "coverage_ratio": round(_safe_mean(coverage_values), 4),
         "mean_latency_ms": round(_safe_mean(latencies), 1),
         "p95_latency_ms": round(_safe_p95(latencies), 1),
+        "mean_gemini_tokens": round(_safe_mean(token_values), 1),
     }
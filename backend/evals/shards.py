@@ -0,0 +1,124 @@
+import json
+import zlib
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any
+
+from evals.benchmark import latency_profile, stage_samples
+from evals.scoring import summarize_results
+
+
+def parse_shard(spec: str) -> tuple[int, int]:
+    """Parse `i/n` (1-based) into `(index, count)`."""
+    index_text, separator, count_text = spec.partition("/")
+    try:
+        index, count = int(index_text), int(count_text)
+    except ValueError:
+        raise ValueError(f"Invalid shard {spec!r}; expected i/n, e.g. 1/4") from None
+    if not separator or count < 1 or not 1 <= index <= count:
+        raise ValueError(f"Invalid shard {spec!r}; expected i/n with 1 <= i <= n")
+    return index, count
+
+
+def shard_of(fixture_id: str, count: int) -> int:
+    """Stable 1-based shard for a fixture, so every machine agrees and dataset edits only move new fixtures."""
+    return zlib.crc32(fixture_id.encode("utf-8")) % count + 1
+
+
+def read_jsonl(path: Path) -> Iterator[dict[str, Any]]:
+    with path.open(encoding="utf-8") as file:
+        for line_number, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as exc:
+                raise RuntimeError(f"{path}:{line_number}: invalid JSON ({exc.msg})") from None
+
+
+def read_dataset(path: Path) -> Iterator[dict[str, Any]]:
+    """Examples from a `.jsonl` dataset streamed line by line, or from a JSON array file."""
+    if path.suffix == ".jsonl":
+        yield from read_jsonl(path)
+        return
+    dataset = json.loads(path.read_text(encoding="utf-8"))
+    if not isinstance(dataset, list):
+        raise RuntimeError("Eval dataset must be a JSON array")
+    yield from dataset
+
+
+def write_jsonl_line(file: Any, record: dict[str, Any]) -> None:
+    """Append one record and flush, so an interrupted run keeps the examples it finished."""
+    file.write(json.dumps(record, ensure_ascii=False) + "\n")
+    file.flush()
+
+
+def iter_report_examples(result: dict[str, Any], report_path: str | Path) -> Iterator[dict[str, Any]]:
+    """Example results of a report: embedded (older reports) or streamed from its `examples_file`."""
+    if "examples" in result:
+        yield from result["examples"]
+        return
+    if result.get("examples_file"):
+        yield from read_jsonl(Path(report_path).parent / result["examples_file"])
+
+
+def merge_shards(shards: list[tuple[Path, dict[str, Any]]], examples_path: Path) -> dict[str, Any]:
+    """Combine `--shard` reports into one run report, streaming their examples into `examples_path`."""
+    if not shards:
+        raise ValueError("No shard reports to merge")
+    counts = {result.get("shard", {}).get("count") for _, result in shards}
+    if len(counts) != 1 or None in counts:
+        raise ValueError("Shard reports disagree on the shard count (or are not shard reports)")
+    count = counts.pop()
+    indexes = sorted(result["shard"]["index"] for _, result in shards)
+    if indexes != list(range(1, count + 1)):
+        missing = sorted(set(range(1, count + 1)) - set(indexes))
+        raise ValueError(f"Expected shards 1..{count} exactly once; missing {missing}, got {indexes}")
+    for field in ("target_lang", "pipeline"):
+        if len({json.dumps(result.get(field), sort_keys=True) for _, result in shards if result.get(field)}) > 1:
+            raise ValueError(f"Shard reports disagree on {field}")
+    benchmarks = [result.get("benchmark") for _, result in shards]
+    if any(benchmarks) and not all(
+        benchmark and (benchmark["warmup"], benchmark["repeats"]) == (benchmarks[0]["warmup"], benchmarks[0]["repeats"])
+        for benchmark in benchmarks
+    ):
+        raise ValueError("Shard reports disagree on benchmark settings")
+
+    scored: list[dict[str, Any]] = []
+    with examples_path.open("w", encoding="utf-8") as file:
+        for report_path, result in shards:
+            for example in iter_report_examples(result, report_path):
+                write_jsonl_line(file, example)
+                scored.append({"metrics": example["metrics"]})
+
+    first = shards[0][1]
+    merged: dict[str, Any] = {
+        "run_at_utc": max(result["run_at_utc"] for _, result in shards),
+        "dataset_path": first["dataset_path"],
+        "target_lang": first["target_lang"],
+        "summary": summarize_results(scored),
+        "stage_cache": {
+            "enabled": any(result["stage_cache"]["enabled"] for _, result in shards),
+            "hits": sum(result["stage_cache"]["hits"] for _, result in shards),
+            "misses": sum(result["stage_cache"]["misses"] for _, result in shards),
+        },
+        "failures": [failure for _, result in shards for failure in result["failures"]],
+        "pipeline": next((result["pipeline"] for _, result in shards if result.get("pipeline")), {}),
+        "shards": [
+            {"index": result["shard"]["index"], "report_path": str(report_path)}
+            for report_path, result in sorted(shards, key=lambda shard: shard[1]["shard"]["index"])
+        ],
+        "examples_file": examples_path.name,
+    }
+    if benchmarks[0]:
+        samples = [sample for benchmark in benchmarks for sample in benchmark["samples"]]
+        merged["benchmark"] = {
+            "warmup": benchmarks[0]["warmup"],
+            "repeats": benchmarks[0]["repeats"],
+            "failed_repeats": sum(benchmark["failed_repeats"] for benchmark in benchmarks),
+            "warmup_failures": sum(benchmark.get("warmup_failures", 0) for benchmark in benchmarks),
+            "stages": {stage: latency_profile(values) for stage, values in stage_samples(samples).items()},
+            "samples": samples,
+        }
+    return merged
+
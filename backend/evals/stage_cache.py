@@ -0,0 +1,57 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any
+
+
+def sha256_bytes(value: bytes) -> str:
+    return hashlib.sha256(value).hexdigest()
+
+
+def sha256_text(value: str) -> str:
+    return sha256_bytes(value.encode("utf-8"))
+
+
+class StageCache:
+    """Content-addressed store of per-example stage outputs.
+
+    Each entry lives at `<root>/<stage>/<key[:2]>/<key>.json`, where `key` hashes every
+    input that can change the stage output. Entries are never invalidated in place:
+    a changed input simply produces a different key.
+    """
+
+    def __init__(self, root: Path, enabled: bool = True) -> None:
+        self.root = Path(root)
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(stage: str, **inputs: Any) -> str:
+        material = json.dumps({"stage": stage, **inputs}, sort_keys=True, ensure_ascii=False)
+        return sha256_text(material)
+
+    def _entry_path(self, stage: str, key: str) -> Path:
+        return self.root / stage / key[:2] / f"{key}.json"
+
+    def get(self, stage: str, key: str) -> dict[str, Any] | None:
+        if not self.enabled:
+            return None
+        path = self._entry_path(stage, key)
+        try:
+            entry = json.loads(path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def put(self, stage: str, key: str, value: dict[str, Any]) -> None:
+        if not self.enabled:
+            return
+        path = self._entry_path(stage, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(value, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_path, path)
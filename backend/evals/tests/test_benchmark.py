@@ -0,0 +1,64 @@
+import random
+from pathlib import Path
+
+from evals.benchmark import compare_latency, mann_whitney_p_value, percentile, quality_regressions, stage_samples
+from evals.results_store import EvalResultsStore, build_run_row
+from evals.tests.test_results_store import _example, _result
+
+
+def _latencies(seed: int, center: float, count: int = 40) -> list[float]:
+    rng = random.Random(seed)
+    return [center * rng.lognormvariate(0, 0.15) for _ in range(count)]
+
+
+def test_percentile_and_rank_test_sanity():
+    assert percentile([10.0, 20.0, 30.0, 40.0], 0.5) == 25.0
+    assert percentile([5.0], 0.99) == 5.0
+    assert percentile([], 0.5) == 0.0
+
+    assert mann_whitney_p_value(_latencies(1, 600), _latencies(2, 500)) < 0.001
+    assert mann_whitney_p_value(_latencies(1, 500), _latencies(2, 600)) > 0.99
+    assert mann_whitney_p_value([100.0] * 10, [100.0] * 10) == 1.0
+
+
+def test_compare_latency_flags_real_shifts_but_not_noise():
+    base = {"total": _latencies(1, 500), "menu_parse": _latencies(2, 300)}
+    head = {"total": _latencies(3, 580), "menu_parse": _latencies(4, 300), "vision_ocr": _latencies(5, 100)}
+
+    rows = {row["stage"]: row for row in compare_latency(head, base, max_regression_pct=10, alpha=0.05)}
+
+    assert list(rows) == ["total", "menu_parse"]
+    assert rows["total"]["regressed"]
+    assert not rows["menu_parse"]["regressed"]
+    # A large change on a handful of samples is not significant on its own.
+    few = compare_latency({"total": [700.0, 400.0]}, {"total": [500.0, 450.0]}, max_regression_pct=10, alpha=0.05)
+    assert few[0]["p50_change_pct"] > 10 and not few[0]["regressed"]
+
+    base_run = {"item_recall": 0.9, "hallucinated_item_rate": 0.05}
+    assert quality_regressions({"item_recall": 0.89, "hallucinated_item_rate": 0.06}, base_run, 0.02, 0.02) == []
+    assert len(quality_regressions({"item_recall": 0.8, "hallucinated_item_rate": 0.1}, base_run, 0.02, 0.02)) == 2
+
+
+def test_store_round_trips_benchmark_samples_and_falls_back_to_examples(tmp_path):
+    store = EvalResultsStore(tmp_path / "eval_results.db")
+    plain = _result("2026-05-01T00:00:00+00:00", [_example("menu-1", 1.0, 0.0, 500.0)])
+    plain_id = store.record_run(build_run_row(plain, Path("report.json")), plain)
+    bench = _result("2026-05-02T00:00:00+00:00", [_example("menu-1", 1.0, 0.0, 500.0)])
+    bench["benchmark"] = {
+        "warmup": 1,
+        "repeats": 2,
+        "samples": [
+            {"fixture_id": "menu-1", "repeat": repeat, "latency_ms": latency, "stage_latency_ms": {"menu_parse": latency - 100}}
+            for repeat, latency in enumerate([500.0, 520.0])
+        ],
+    }
+    bench_id = store.record_run(build_run_row(bench, Path("report.json")), bench)
+
+    assert stage_samples(store.latency_samples(bench_id)) == {"total": [500.0, 520.0], "menu_parse": [400.0, 420.0]}
+    assert stage_samples(store.latency_samples(plain_id)) == {
+        "total": [500.0],
+        "vision_ocr": [100.0],
+        "menu_parse": [400.0],
+    }
+    assert store.get_run(plain_id)["item_recall"] == 1.0
+    store.close()
@@ -0,0 +1,129 @@
+import json
+from pathlib import Path
+
+from evals.results_store import EvalResultsStore, build_run_row, main as results_store_main
+from evals.shards import write_jsonl_line
+
+
+def _example(fixture_id: str, recall: float, hallucinated: float, latency_ms: float) -> dict:
+    return {
+        "fixture_id": fixture_id,
+        "predicted": {
+            "items": [
+                {"jp_text": "天丼", "en_title": "Tempura Bowl", "confidence": 0.8, "ocr_diagnostics": {"match_score": 1.0}},
+            ]
+        },
+        "metrics": {
+            "expected_item_count": 1,
+            "predicted_item_count": 1,
+            "matched_item_count": 1 if recall else 0,
+            "parse_success": 1.0,
+            "item_recall": recall,
+            "item_precision_proxy": recall,
+            "hallucinated_item_rate": hallucinated,
+            "coverage_ratio": 1.0,
+            "latency_ms": latency_ms,
+            "matches": [{"predicted": "天丼"}] if recall else [],
+        },
+        "pipeline": {
+            "model": "gemini-2.5-flash",
+            "ocr_pipeline_mode": "hybrid",
+            "menu_parse_prompt_version": "menu_parse_v2",
+            "ocr_normalize_prompt_version": "ocr_normalize_v1",
+            "stage_latency_ms": {"vision_ocr": 100, "menu_parse": latency_ms - 100},
+        },
+    }
+
+
+def _result(run_at: str, examples: list[dict], failures: list[dict] | None = None) -> dict:
+    return {
+        "run_at_utc": run_at,
+        "dataset_path": "evals/dataset/examples.json",
+        "target_lang": "en",
+        "summary": {
+            "example_count": float(len(examples)),
+            "parse_success_rate": 1.0,
+            "item_recall": 1.0,
+            "item_precision_proxy": 1.0,
+            "hallucinated_item_rate": 0.0,
+            "coverage_ratio": 1.0,
+            "mean_latency_ms": 500.0,
+            "p95_latency_ms": 600.0,
+        },
+        "failures": failures or [],
+        "examples": examples,
+    }
+
+
+def _record(store: EvalResultsStore, result: dict) -> int:
+    return store.record_run(build_run_row(result, Path("report.json")), result)
+
+
+def test_diff_reports_regressed_and_failed_fixtures(tmp_path):
+    store = EvalResultsStore(tmp_path / "eval_results.db")
+    base = _record(
+        store,
+        _result(
+            "2026-05-01T00:00:00+00:00",
+            [_example("menu-1", 1.0, 0.0, 500.0), _example("menu-2", 1.0, 0.0, 500.0), _example("menu-3", 1.0, 0.0, 500.0)],
+        ),
+    )
+    head = _record(
+        store,
+        _result(
+            "2026-05-02T00:00:00+00:00",
+            [_example("menu-1", 1.0, 0.0, 450.0), _example("menu-2", 0.0, 0.5, 500.0)],
+            failures=[{"fixture_id": "menu-3", "error": "boom"}],
+        ),
+    )
+
+    diffs = {entry["fixture_id"]: entry for entry in store.diff_runs(base, head)}
+
+    assert diffs["menu-1"]["status"] == "unchanged"
+    assert diffs["menu-1"]["latency_delta_ms"] == -50.0
+    assert diffs["menu-2"]["status"] == "regressed"
+    assert diffs["menu-2"]["recall_delta"] == -1.0
+    assert diffs["menu-3"]["status"] == "regressed"
+    assert store.resolve_run_id("latest") == head
+    assert store.resolve_run_id("latest~1") == base
+
+
+def test_aggregate_groups_runs_by_prompt_version(tmp_path):
+    store = EvalResultsStore(tmp_path / "eval_results.db")
+    _record(store, _result("2026-05-01T00:00:00+00:00", [_example("menu-1", 1.0, 0.0, 500.0)]))
+    _record(store, _result("2026-05-02T00:00:00+00:00", [_example("menu-1", 1.0, 0.0, 500.0)]))
+
+    rows = store.aggregate(group_by="menu_parse_prompt_version")
+
+    assert len(rows) == 1
+    assert rows[0]["group_value"] == "menu_parse_v2"
+    assert rows[0]["run_count"] == 2
+    assert [row["stage"] for row in store.stage_latency_summary(store.resolve_run_id("latest"))] == [
+        "menu_parse",
+        "vision_ocr",
+    ]
+
+
+def test_import_reads_embedded_and_streamed_report_layouts_alike(tmp_path):
+    examples = [_example("menu-1", 1.0, 0.0, 500.0), _example("menu-2", 0.0, 1.0, 700.0)]
+    embedded_path = tmp_path / "eval_report_old.json"
+    embedded_path.write_text(json.dumps(_result("2026-05-01T00:00:00+00:00", examples)), encoding="utf-8")
+    streamed_path = tmp_path / "eval_report_new.json"
+    with streamed_path.with_suffix(".examples.jsonl").open("w", encoding="utf-8") as file:
+        for example in examples:
+            write_jsonl_line(file, example)
+    streamed = _result("2026-05-02T00:00:00+00:00", [])
+    del streamed["examples"]
+    streamed["examples_file"] = streamed_path.with_suffix(".examples.jsonl").name
+    streamed_path.write_text(json.dumps(streamed), encoding="utf-8")
+    db_path = tmp_path / "eval_results.db"
+
+    assert results_store_main(["--db", str(db_path), "import", str(embedded_path), str(streamed_path)]) == 0
+
+    store = EvalResultsStore(db_path)
+    runs = store.list_runs(limit=2)
+    assert [run["model"] for run in runs] == ["gemini-2.5-flash", "gemini-2.5-flash"]
+    old_id, new_id = sorted(run["run_id"] for run in runs)
+    assert store.latency_samples(old_id) == store.latency_samples(new_id)
+    assert [entry["status"] for entry in store.diff_runs(old_id, new_id)] == ["unchanged", "unchanged"]
+    store.close()
@@ -1,4 +1,4 @@
-from evals.scoring import score_example
+from evals.scoring import score_example, summarize_results
 
 
 def test_japanese_spacing_does_not_penalize_match():
@@ -59,3 +59,12 @@ def test_common_kana_kanji_menu_variant_can_match():
     assert metrics["matched_item_count"] == 1
     assert metrics["missed_expected_jp_names"] == []
     assert metrics["extra_predicted_jp_names"] == []
+
+
+def test_summary_averages_gemini_tokens_over_examples_that_report_them():
+    with_tokens = score_example(expected_jp_names=["天丼"], predicted_jp_names=["天丼"], latency_ms=10.0, gemini_tokens=900)
+    cached_without_tokens = score_example(expected_jp_names=["天丼"], predicted_jp_names=["天丼"], latency_ms=10.0)
+
+    summary = summarize_results([{"metrics": with_tokens}, {"metrics": cached_without_tokens}])
+
+    assert summary["mean_gemini_tokens"] == 900.0
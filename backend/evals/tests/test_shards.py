@@ -0,0 +1,77 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from evals.results_store import EvalResultsStore, build_run_row
+from evals.shards import merge_shards, parse_shard, read_dataset, shard_of, write_jsonl_line
+from evals.tests.test_results_store import _example, _result
+
+
+def test_parse_shard_and_stable_assignment():
+    assert parse_shard("2/4") == (2, 4)
+    for spec in ["0/4", "5/4", "4", "a/b", "1/0"]:
+        with pytest.raises(ValueError):
+            parse_shard(spec)
+
+    fixture_ids = [f"menu-{index}" for index in range(200)]
+    assignment = {fixture_id: shard_of(fixture_id, 4) for fixture_id in fixture_ids}
+    assert set(assignment.values()) == {1, 2, 3, 4}
+    assert all(shard_of(fixture_id, 4) == shard for fixture_id, shard in assignment.items())
+
+
+def test_jsonl_dataset_streams_and_reports_bad_lines(tmp_path):
+    dataset = tmp_path / "examples.jsonl"
+    dataset.write_text('{"fixture_id": "menu-1"}\n\n{"fixture_id": "menu-2"}\n{"fixture_id": \n', encoding="utf-8")
+    examples = read_dataset(dataset)
+
+    assert [next(examples)["fixture_id"], next(examples)["fixture_id"]] == ["menu-1", "menu-2"]
+    with pytest.raises(RuntimeError, match="examples.jsonl:4"):
+        next(examples)
+
+
+def _write_shard(directory: Path, index: int, count: int, examples: list[dict], failures: list[dict]) -> tuple[Path, dict]:
+    report_path = directory / f"eval_shard_{index}of{count}.json"
+    examples_path = report_path.with_suffix(".examples.jsonl")
+    with examples_path.open("w", encoding="utf-8") as file:
+        for example in examples:
+            write_jsonl_line(file, example)
+    result = _result("2026-05-0%dT00:00:00+00:00" % index, [], failures)
+    del result["examples"]
+    result.update(
+        {
+            "stage_cache": {"enabled": True, "hits": index, "misses": 1},
+            "pipeline": {"model": "gemini-2.5-flash", "ocr_pipeline_mode": "hybrid"},
+            "examples_file": examples_path.name,
+            "shard": {"index": index, "count": count},
+        }
+    )
+    report_path.write_text(json.dumps(result), encoding="utf-8")
+    return report_path, result
+
+
+def test_merge_combines_shards_into_one_recordable_run(tmp_path):
+    first = _write_shard(tmp_path, 1, 2, [_example("menu-1", 1.0, 0.0, 400.0)], [])
+    second = _write_shard(
+        tmp_path, 2, 2, [_example("menu-2", 0.0, 1.0, 600.0)], [{"fixture_id": "menu-3", "error": "boom"}]
+    )
+    with pytest.raises(ValueError, match="missing \\[2\\]"):
+        merge_shards([first], tmp_path / "partial.examples.jsonl")
+
+    report_path = tmp_path / "eval_report_merged.json"
+    merged = merge_shards([second, first], report_path.with_suffix(".examples.jsonl"))
+
+    assert merged["summary"]["example_count"] == 2.0
+    assert merged["summary"]["item_recall"] == 0.5
+    assert merged["summary"]["mean_latency_ms"] == 500.0
+    assert merged["stage_cache"] == {"enabled": True, "hits": 3, "misses": 2}
+    assert merged["failures"] == [{"fixture_id": "menu-3", "error": "boom"}]
+    assert [shard["index"] for shard in merged["shards"]] == [1, 2]
+
+    store = EvalResultsStore(tmp_path / "eval_results.db")
+    run_row = build_run_row(merged, report_path)
+    run_id = store.record_run(run_row, merged)
+    assert run_row["model"] == "gemini-2.5-flash"
+    assert {row["fixture_id"] for row in store.latency_samples(run_id)} == {"menu-1", "menu-2"}
+    assert store.get_run(run_id)["failure_count"] == 1
+    store.close()
@@ -0,0 +1,22 @@
+from evals.stage_cache import StageCache
+
+
+def test_changed_prompt_fingerprint_misses_cache(tmp_path):
+    cache = StageCache(tmp_path)
+    key = StageCache.make_key("menu_parse", ocr_text_sha256="abc", prompt_sha256="v2-original")
+    cache.put("menu_parse", key, {"llm_output": {"items": []}, "latency_ms": 1200})
+
+    edited_key = StageCache.make_key("menu_parse", ocr_text_sha256="abc", prompt_sha256="v2-edited")
+
+    assert cache.get("menu_parse", key) == {"llm_output": {"items": []}, "latency_ms": 1200}
+    assert cache.get("menu_parse", edited_key) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_disabled_cache_never_reads_or_writes(tmp_path):
+    cache = StageCache(tmp_path, enabled=False)
+    key = StageCache.make_key("vision_ocr", image_sha256="abc")
+    cache.put("vision_ocr", key, {"ocr_text": "天丼", "latency_ms": 10})
+
+    assert cache.get("vision_ocr", key) is None
+    assert not any(tmp_path.iterdir())
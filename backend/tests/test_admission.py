@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+
+from app.admission import AdmissionController, AdmissionRejected
+
+
+def test_free_traffic_is_shed_before_pro_and_waiters_resume_by_priority():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=4, max_wait_seconds=1, free_max_wait_seconds=0.01)
+        free = [await controller.admit("free") for _ in range(3)]
+        with pytest.raises(AdmissionRejected) as shed:
+            await controller.admit("free")
+        pro = await controller.admit("pro")
+
+        # Full for everyone: a pro and a dev scan queue up, and the dev scan goes first.
+        order: list[str] = []
+
+        async def waiting(priority_class: str) -> None:
+            ticket = await controller.admit(priority_class)
+            order.append(priority_class)
+            controller.release(ticket)
+
+        waiters = [asyncio.create_task(waiting("pro")), asyncio.create_task(waiting("dev_unlimited"))]
+        await asyncio.sleep(0)
+        assert controller.metrics()["waiting"] == {"free": 0, "pro": 1, "dev_unlimited": 1}
+        controller.release(pro)
+        await asyncio.gather(*waiters)
+        for ticket in free:
+            controller.release(ticket)
+        return shed.value, order, controller.metrics()
+
+    shed, order, metrics = asyncio.run(scenario())
+
+    assert (shed.priority_class, shed.reason) == ("free", "timeout")
+    assert shed.retry_after_seconds >= 1
+    assert order == ["dev_unlimited", "pro"]
+    assert metrics["in_flight"] == 0
+    assert metrics["decisions"]["free"] == {"admitted": 3, "shed_timeout": 1}
+    assert metrics["decisions"]["pro"] == {"admitted": 1, "admitted_after_wait": 1}
+
+
+def test_slow_scans_shrink_the_limit():
+    controller = AdmissionController(max_in_flight=10, target_latency_ms=1000)
+    ticket = asyncio.run(controller.admit("pro"))
+    controller.release(ticket, latency_ms=4000)
+
+    assert controller.effective_limit() == 2
+    assert controller.class_limit("free") == 2
+    assert controller.would_admit("free")
@@ -0,0 +1,37 @@
+from app.dishes.dictionary import AhoCorasick, load_dish_dictionary
+
+
+MENU = """おすすめ
+唐揚げ定食　980円
+天ぷらそば ¥850
+餃子 450円 枝豆 300円
+店長の気まぐれパスタ 1,200円
+"""
+
+
+def test_matcher_finds_overlapping_patterns_and_prefers_longest():
+    matcher = AhoCorasick({"he": 1, "she": 2, "his": 3, "hers": 4})
+
+    assert sorted(matcher.find_all("ushers")) == [(1, 4, 2), (2, 4, 1), (2, 6, 4)]
+    assert matcher.find_longest("ushers") == [(1, 4, 2)]
+
+
+def test_menu_lines_are_matched_only_when_fully_covered():
+    match = load_dish_dictionary("dishes_v1").match_menu(MENU)
+
+    assert [(dish.entry.dish_id, dish.surface, dish.price_text) for dish in match.matches] == [
+        ("karaage_teishoku", "唐揚げ定食", "980円"),
+        ("tempura_soba", "天ぷらそば", "¥850"),
+        ("gyoza", "餃子", "450円"),
+        ("edamame", "枝豆", "300円"),
+    ]
+    assert (match.candidate_lines, match.matched_lines) == (5, 3)
+    assert match.unmatched_text == "おすすめ\n店長の気まぐれパスタ 1,200円"
+
+
+def test_bundled_dictionary_forms_are_unique():
+    dictionary = load_dish_dictionary("dishes_v1")
+    forms = [form for entry in dictionary.entries for form in entry.jp_forms]
+
+    assert dictionary.version == "dishes_v1"
+    assert len(forms) == len(set(forms))
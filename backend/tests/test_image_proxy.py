@@ -0,0 +1,154 @@
+import asyncio
+import io
+
+import httpx
+import pytest
+from PIL import Image
+
+from app.image_proxy import DiskLruCache, ImageProxy, ImageProxyError
+
+
+def _jpeg(size: tuple[int, int]) -> bytes:
+    output = io.BytesIO()
+    Image.new("RGB", size, (200, 80, 40)).save(output, format="JPEG")
+    return output.getvalue()
+
+
+def _mock_fetches(proxy: ImageProxy, handler, addresses: dict[str, str]) -> None:
+    # Requests are pinned to the resolved address; the handler sees the original host in Host.
+    async def resolve_host(host: str, port: int) -> list[str]:
+        if host not in addresses:
+            raise OSError(f"unknown host {host}")
+        return [addresses[host]]
+
+    proxy._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    proxy._resolve_host = resolve_host
+
+
+def _source_url(request: httpx.Request) -> str:
+    return str(request.url.copy_with(host=request.headers["host"]))
+
+
+def test_thumbnail_is_fetched_once_and_served_from_cache(tmp_path):
+    fetches = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert request.url.host == "93.184.216.34"
+        fetches.append(_source_url(request))
+        return httpx.Response(200, content=_jpeg((1200, 800)))
+
+    proxy = ImageProxy(cache_dir=str(tmp_path / "cache"), secret="s3cret", public_base_url="https://api.example.com/")
+    _mock_fetches(proxy, handler, {"images.example.com": "93.184.216.34"})
+    source_url = "https://images.example.com/tempura.jpg"
+    proxy_url = proxy.proxy_url(source_url)
+    image_id = proxy_url.rsplit("/", 1)[1]
+
+    async def scenario():
+        first, second = await asyncio.gather(
+            proxy.get_thumbnail(proxy.resolve_source_url(image_id), 320),
+            proxy.get_thumbnail(proxy.resolve_source_url(image_id), 320),
+        )
+        third = await proxy.get_thumbnail(source_url, 320)
+        await proxy.aclose()
+        return first, second, third
+
+    first, second, third = asyncio.run(scenario())
+
+    assert proxy_url.startswith("https://api.example.com/v1/images/")
+    assert fetches == [source_url]
+    assert first.body == second.body == third.body
+    assert first.etag == proxy.etag_for(source_url, 320)
+    assert proxy.hits == 1
+    with Image.open(io.BytesIO(third.body)) as thumbnail:
+        assert (thumbnail.format, thumbnail.size) == ("WEBP", (320, 213))
+    with pytest.raises(ImageProxyError):
+        proxy.resolve_source_url(image_id[:-2] + "xx")
+
+
+def test_disk_cache_evicts_least_recently_used(tmp_path):
+    cache = DiskLruCache(tmp_path, max_bytes=25)
+    cache.put("aa1", b"x" * 10)
+    cache.put("bb2", b"y" * 10)
+    assert cache.get("aa1") == b"x" * 10
+    cache.put("cc3", b"z" * 10)
+
+    assert cache.get("bb2") is None
+    assert cache.get("aa1") is not None
+    assert DiskLruCache(tmp_path, max_bytes=25).total_bytes == 20
+
+
+def test_decompression_bomb_is_a_remembered_502(tmp_path, monkeypatch):
+    fetches = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        fetches.append(_source_url(request))
+        return httpx.Response(200, content=_jpeg((1200, 800)))
+
+    # Shrink Pillow's pixel limit instead of building a multi-gigapixel fixture.
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 1000)
+    proxy = ImageProxy(cache_dir=str(tmp_path / "cache"), secret="s3cret", public_base_url="https://api.example.com")
+    _mock_fetches(proxy, handler, {"images.example.com": "93.184.216.34"})
+    source_url = "https://images.example.com/huge.jpg"
+
+    async def scenario():
+        errors = []
+        for _ in range(2):
+            with pytest.raises(ImageProxyError) as excinfo:
+                await proxy.get_thumbnail(source_url, 320)
+            errors.append(excinfo.value)
+        await proxy.aclose()
+        return errors
+
+    first, second = asyncio.run(scenario())
+
+    assert first.status_code == 502
+    assert second.status_code == 404
+    assert fetches == [source_url]
+
+
+def test_sources_resolving_to_internal_addresses_are_never_fetched(tmp_path):
+    fetches = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        fetches.append(_source_url(request))
+        if request.url.path == "/moved.jpg":
+            return httpx.Response(302, headers={"location": "http://metadata.internal/latest/meta-data"})
+        return httpx.Response(301, headers={"location": "/tempura.jpg"})
+
+    proxy = ImageProxy(cache_dir=str(tmp_path / "cache"), secret="s3cret", public_base_url="https://api.example.com")
+    _mock_fetches(
+        proxy,
+        handler,
+        {
+            "images.example.com": "93.184.216.34",
+            "metadata.internal": "169.254.169.254",
+            "intranet.example.com": "10.0.0.5",
+            "127.0.0.1": "127.0.0.1",
+            "mapped.example.com": "::ffff:192.168.0.1",
+        },
+    )
+
+    async def status_for(url: str) -> int:
+        with pytest.raises(ImageProxyError) as excinfo:
+            await proxy.get_thumbnail(url, 320)
+        return excinfo.value.status_code
+
+    async def scenario():
+        statuses = [
+            await status_for(url)
+            for url in [
+                "https://images.example.com/moved.jpg",
+                "http://127.0.0.1/a.jpg",
+                "https://intranet.example.com/a.jpg",
+                "https://mapped.example.com/a.jpg",
+                "file:///etc/passwd",
+                "https://images.example.com/loop.jpg",
+            ]
+        ]
+        await proxy.aclose()
+        return statuses
+
+    assert asyncio.run(scenario()) == [403, 403, 403, 403, 403, 502]
+    assert "http://metadata.internal/latest/meta-data" not in fetches
+    assert fetches[0] == "https://images.example.com/moved.jpg"
+    assert all(fetch.startswith("https://images.example.com/") for fetch in fetches)
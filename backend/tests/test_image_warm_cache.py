@@ -0,0 +1,38 @@
+import asyncio
+
+from app.image_warm_cache import CountMinSketch, WarmImageCache
+
+
+def test_count_min_sketch_never_undercounts():
+    sketch = CountMinSketch(width=64, depth=3)
+    for index in range(500):
+        sketch.add(f"rare {index}")
+    for _ in range(40):
+        sketch.add("karaage")
+
+    assert sketch.estimate("karaage") >= 40
+    sketch.decay()
+    assert sketch.estimate("karaage") >= 20
+
+
+def test_popular_queries_are_warmed_and_served_without_the_provider():
+    cache = WarmImageCache(top_k=2, min_count=2)
+    for query in ["Karaage"] * 5 + ["Ramen"] * 3 + ["Natto"] * 2 + ["Uni"]:
+        cache.record(query)
+    resolved: list[str] = []
+
+    async def resolver(query: str) -> list[str]:
+        resolved.append(query)
+        return [f"https://images.example.com/{query}.jpg"]
+
+    assert cache.top_queries() == [("karaage", 5), ("ramen", 3)]
+    assert asyncio.run(cache.refresh(resolver)) == 2
+    assert sorted(resolved) == ["karaage", "ramen"]
+
+    assert cache.get("  KARAAGE ") == ["https://images.example.com/karaage.jpg"]
+    assert cache.get("Natto") is None
+    stats = cache.stats()
+    assert (stats["warm_entries"], stats["hits"], stats["misses"], stats["hit_rate"]) == (2, 1, 1, 0.5)
+
+    # Fresh entries are not re-resolved on the next cycle.
+    assert asyncio.run(cache.refresh(resolver)) == 0
@@ -0,0 +1,52 @@
+import json
+import random
+
+from app.json_stream import ArrayItemStreamParser
+
+
+_PAYLOAD = {
+    "detected_type": "dish",
+    "items": [
+        {"jp_text": "天丼 {大盛}", "en_title": "Tempura \"Tendon\" Bowl", "tags": ["rice", "fried"], "confidence": 0.9},
+        {"jp_text": "ざるそば", "en_title": "Cold Soba \\ Zaru", "meta": {"items": [1, 2]}, "confidence": 0.8},
+        {"jp_text": "みそ汁", "en_title": "Miso Soup", "price_text": None, "confidence": 0.7},
+    ],
+}
+
+
+def test_items_are_emitted_as_each_object_closes():
+    text = json.dumps(_PAYLOAD, ensure_ascii=False)
+    parser = ArrayItemStreamParser("items")
+    first_close = text.index("}", text.index('"confidence": 0.9'))
+
+    assert parser.feed(text[:first_close]) == []
+    assert parser.feed(text[first_close : first_close + 1]) == [_PAYLOAD["items"][0]]
+    assert parser.feed(text[first_close + 1 :]) == _PAYLOAD["items"][1:]
+
+
+def test_arbitrary_chunking_and_code_fences_yield_the_same_items():
+    text = "```json\n" + json.dumps(_PAYLOAD, ensure_ascii=False, indent=2) + "\n```"
+    rng = random.Random(7)
+    for _ in range(50):
+        parser = ArrayItemStreamParser("items")
+        items = []
+        position = 0
+        while position < len(text):
+            step = rng.randint(1, 12)
+            items.extend(parser.feed(text[position : position + step]))
+            position += step
+        assert items == _PAYLOAD["items"]
+
+
+def test_arrays_under_other_keys_are_ignored():
+    parser = ArrayItemStreamParser("items")
+    text = json.dumps({"other": [{"a": 1}], "items": [{"b": 2}]})
+    assert parser.feed(text) == [{"b": 2}]
+
+
+def test_items_that_are_not_valid_json_are_skipped():
+    parser = ArrayItemStreamParser("items")
+    text = '{"items": [{"jp_text": "a", "confidence": 0.9,}, {"jp_text": "b"}]}'
+
+    assert parser.feed(text) == [{"jp_text": "b"}]
+    assert parser.skipped_items == 1
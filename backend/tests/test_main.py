@@ -0,0 +1,227 @@
+import asyncio
+import dataclasses
+import io
+import json
+import random
+
+import httpx
+import pytest
+from fastapi import HTTPException
+from PIL import Image
+
+from app import main
+from app.main import (
+    _DEFAULT_VERTEX_IMAGE_FIELD_PATHS,
+    VertexImageExtractor,
+    _build_ocr_source_index,
+    _prepare_gemini_image,
+)
+from app.replay import ScanReplayStore
+from app.usage import UsageStore
+from app.usage_backends import ShardedMemoryUsageBackend
+
+
+def _vertex_result(**document) -> dict:
+    return {"document": document}
+
+
+def test_vertex_extractor_prefers_configured_paths_over_learned_ones():
+    extractor = VertexImageExtractor(list(_DEFAULT_VERTEX_IMAGE_FIELD_PATHS))
+    custom = _vertex_result(derivedStructData={"og": {"image_src": "https://cdn.example.com/a"}})
+
+    assert extractor.pick(custom) == "https://cdn.example.com/a"
+    assert extractor.learned_paths == ["document.derivedStructData.og.image_src"]
+
+    both = _vertex_result(
+        derivedStructData={
+            "og": {"image_src": "https://cdn.example.com/og"},
+            "pagemap": {"cse_image": [{"src": "https://cdn.example.com/cse"}]},
+        }
+    )
+    assert extractor.pick(both) == "https://cdn.example.com/cse"
+    assert extractor.pick(_vertex_result(derivedStructData={"og": {"image_src": "https://cdn.example.com/b"}})) == (
+        "https://cdn.example.com/b"
+    )
+    assert (extractor.fast_path_hits, extractor.walk_fallbacks) == (2, 1)
+
+
+def test_vertex_extractor_only_learns_image_fields():
+    extractor = VertexImageExtractor([])
+    weak = _vertex_result(structData={"link": "https://example.com/menu/dish.jpg"})
+
+    assert extractor.pick(weak) == "https://example.com/menu/dish.jpg"
+    assert extractor.learned_paths == []
+    assert extractor.pick(_vertex_result(structData={"link": "https://example.com/about"})) is None
+    assert extractor.walk_fallbacks == 2
+
+
+def _encoded(size: tuple[int, int], image_format: str) -> bytes:
+    output = io.BytesIO()
+    Image.new("RGB", size, (200, 80, 40)).save(output, format=image_format)
+    return output.getvalue()
+
+
+def test_gemini_image_is_downscaled_to_a_jpeg():
+    prepared, mime_type = _prepare_gemini_image(_encoded((3000, 1500), "PNG"), max_side=1536)
+
+    assert mime_type == "image/jpeg"
+    with Image.open(io.BytesIO(prepared)) as image:
+        assert (image.format, image.size) == ("JPEG", (1536, 768))
+
+
+def test_gemini_image_falls_back_to_sniffed_original_bytes(monkeypatch):
+    webp = _encoded((64, 64), "WEBP")
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 1000)
+
+    assert _prepare_gemini_image(_encoded((1200, 800), "PNG"), max_side=1536)[1] == "image/png"
+    assert _prepare_gemini_image(webp, max_side=1536) == (webp, "image/webp")
+    assert _prepare_gemini_image(b"not an image", max_side=1536) == (b"not an image", "image/jpeg")
+
+
+def test_ocr_source_index_answers_like_a_substring_search():
+    rng = random.Random(11)
+    alphabet = "天丼そばaAbB1 "
+    for _ in range(200):
+        source = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 60)))
+        index = _build_ocr_source_index(source)
+        normalized = index.normalized
+        fragments = ["".join(rng.choice(alphabet.strip()) for _ in range(rng.randint(0, 12))) for _ in range(20)]
+        # Fragments cut from the source itself, so long fragments also produce hits.
+        for _ in range(20):
+            start = rng.randint(0, len(normalized))
+            fragments.append(normalized[start : start + rng.randint(1, 12)])
+        for fragment in fragments:
+            assert index.contains(fragment) == (bool(fragment) and fragment in normalized), (source, fragment)
+            assert index.contains_lower(fragment.lower()) == (
+                bool(fragment) and fragment.lower() in normalized.lower()
+            ), (source, fragment)
+
+
+def test_ocr_source_index_handles_repeats_and_case_changing_lengths():
+    index = _build_ocr_source_index("aaaaaaaBaaaa 天丼天丼天丼")
+
+    assert index.match_starts_lower("aaaaa") == [0, 1, 2]
+    assert index.contains("aaaBaaa") and not index.contains("aaabaaa")
+    assert index.contains_lower("aaabaaa")
+    assert index.contains("天丼天丼天") and not index.contains("天丼天丼天丼天")
+    dotted = _build_ocr_source_index("İstanbul Kebab")
+    assert dotted.contains("İstanbulKebab") and not dotted.contains("istanbulKebab")
+
+
+class _SlowUpload:
+    def __init__(self, delay_seconds: float) -> None:
+        self.delay_seconds = delay_seconds
+
+    async def read(self) -> bytes:
+        await asyncio.sleep(self.delay_seconds)
+        return b"menu photo"
+
+
+def test_concurrent_duplicate_scans_run_the_pipeline_once(tmp_path, monkeypatch):
+    usage_store = UsageStore(db_path="unused.db", free_quota=5, pro_quota=10, backend=ShardedMemoryUsageBackend())
+    monkeypatch.setattr(main, "_usage_store", usage_store)
+    monkeypatch.setattr(main, "_scan_replay_store", ScanReplayStore(str(tmp_path / "replay.db")))
+    runs = []
+
+    async def pipeline(**kwargs) -> main.ScanMenuResponse:
+        runs.append(kwargs["usage"].used_scans)
+        await asyncio.sleep(0.05)
+        return main.ScanMenuResponse(
+            scan_id="scan-1", detected_type=main.DetectedType(type="menu", confidence=0.9), items=[]
+        )
+
+    monkeypatch.setattr(main, "_run_scan_pipeline", pipeline)
+
+    async def scan(delay_seconds: float) -> main.ScanMenuResponse:
+        return await main._scan_menu_response(
+            image=_SlowUpload(delay_seconds),
+            target_lang="en",
+            device_id="device-1",
+            app_version="1.0",
+            timezone="Asia/Tokyo",
+            request_id="r1",
+            authorization=None,
+        )
+
+    async def scenario():
+        # The duplicate arrives while the original, already charged, is still reading its upload.
+        original = asyncio.create_task(scan(0.05))
+        await asyncio.sleep(0.01)
+        return await asyncio.gather(original, scan(0))
+
+    original, duplicate = asyncio.run(scenario())
+
+    assert runs == [1]
+    assert original.scan_id == duplicate.scan_id == "scan-1"
+    assert usage_store.consume_scan("device:device-1", request_id="r2").used_scans == 2
+
+
+def test_streaming_parse_skips_malformed_sse_lines(monkeypatch):
+    item = {"jp_text": "天丼", "en_title": "Tempura Bowl", "en_description": "Rice topped with tempura."}
+    text = json.dumps({"items": [item]}, ensure_ascii=False)
+    event = {"candidates": [{"content": {"parts": [{"text": text}]}}], "usageMetadata": {"totalTokenCount": 5}}
+    body = f"data: {{\"candidates\": [\n\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, text=body))
+    streamed = []
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=transport) as client:
+            monkeypatch.setattr(main, "_http_client", lambda: client)
+            return await main._gemini_parse_menu_streaming("天丼", "en", "key", streamed.append)
+
+    output = asyncio.run(scenario())
+
+    assert [streamed_item.jp_text for streamed_item in streamed] == ["天丼"]
+    assert [parsed.en_title for parsed in output.items] == ["Tempura Bowl"]
+
+
+def test_ops_key_is_separate_from_analytics_and_rejects_bad_headers(monkeypatch):
+    def status_for(key: str | None) -> int:
+        with pytest.raises(HTTPException) as excinfo:
+            main._require_ops_key(key)
+        return excinfo.value.status_code
+
+    monkeypatch.setattr(main, "_USAGE_ANALYTICS_API_KEY", "analytics-secret")
+    monkeypatch.setattr(main, "_settings", dataclasses.replace(main._settings, ops_api_key=""))
+    assert status_for("analytics-secret") == 404
+
+    monkeypatch.setattr(main, "_settings", dataclasses.replace(main._settings, ops_api_key="ops-secret"))
+    main._require_ops_key("ops-secret")
+    assert [status_for(key) for key in [None, "analytics-secret", "ops-sécret"]] == [401, 401, 401]
+    with pytest.raises(HTTPException):
+        main._require_analytics_key("analytics-sécret")
+
+
+def test_http_client_is_closed_with_its_event_loop():
+    async def client():
+        return main._http_client()
+
+    first = asyncio.run(client())
+    second = asyncio.run(client())
+
+    assert first is not second
+    assert first.is_closed and second.is_closed
+
+
+def test_reload_keeps_process_environment_ahead_of_dotenv(tmp_path, monkeypatch):
+    dotenv = tmp_path / ".env"
+    dotenv.write_text("MENULENS_TEST_REAL=from-dotenv\nMENULENS_TEST_DOTENV=from-dotenv\n", encoding="utf-8")
+    monkeypatch.setattr(main, "__file__", str(tmp_path / "app" / "main.py"))
+    monkeypatch.setattr(main, "_PROCESS_ENV_KEYS", frozenset({"MENULENS_TEST_REAL"}))
+    monkeypatch.setenv("MENULENS_TEST_REAL", "from-process")
+    monkeypatch.delenv("MENULENS_TEST_DOTENV", raising=False)
+
+    main._apply_dotenv()
+
+    assert main.os.environ["MENULENS_TEST_REAL"] == "from-process"
+    assert main.os.environ["MENULENS_TEST_DOTENV"] == "from-dotenv"
+
+
+def test_scan_replay_store_is_opt_in(tmp_path, monkeypatch):
+    monkeypatch.delenv("ENABLE_SCAN_REPLAY", raising=False)
+    monkeypatch.setenv("SCAN_REPLAY_DB_PATH", str(tmp_path / "replay.db"))
+    assert main._build_scan_replay_store() is None
+    assert not (tmp_path / "replay.db").exists()
+
+    monkeypatch.setenv("ENABLE_SCAN_REPLAY", "true")
+    assert isinstance(main._build_scan_replay_store(), ScanReplayStore)
@@ -0,0 +1,50 @@
+from app.menu_layout import TextBlock, blocks_from_annotation, segment_menu
+
+
+def _paragraph(text, x0, y0, x1, y1):
+    symbols = [{"text": ch} for ch in text]
+    symbols[-1]["property"] = {"detectedBreak": {"type": "LINE_BREAK"}}
+    box = {"vertices": [{"x": x0, "y": y0}, {"x": x1, "y": y0}, {"x": x1, "y": y1}, {"x": x0, "y": y1}]}
+    return {"boundingBox": box, "words": [{"symbols": symbols}]}
+
+
+def test_blocks_from_annotation_rebuilds_paragraph_text_and_boxes():
+    annotation = {
+        "pages": [
+            {
+                "blocks": [
+                    {"paragraphs": [_paragraph("天丼", 10, 20, 110, 50), _paragraph("900円", 120, 20, 200, 50)]},
+                    {"paragraphs": [_paragraph("ざるそば", 10, 80, 150, 110)]},
+                ]
+            }
+        ]
+    }
+
+    blocks = blocks_from_annotation(annotation)
+
+    assert [block.text for block in blocks] == ["天丼", "900円", "ざるそば"]
+    assert (blocks[2].x0, blocks[2].y0, blocks[2].x1, blocks[2].y1) == (10, 80, 150, 110)
+    assert [block.block_index for block in blocks] == [0, 0, 1]
+
+
+def test_two_column_menu_is_cut_between_columns_in_reading_order():
+    left = [TextBlock(f"左{i}" * 20, 0, i * 40, 300, i * 40 + 30) for i in range(10)]
+    right = [TextBlock(f"右{i}" * 20, 400, i * 40, 700, i * 40 + 30) for i in range(10)]
+
+    regions = segment_menu(right + left, max_chars=500, max_regions=4)
+
+    assert len(regions) == 2
+    assert regions[0].blocks == left
+    assert regions[1].blocks == right
+    assert regions[0].bbox == (0, 0, 300, 390)
+
+
+def test_small_and_surplus_regions_are_merged_into_neighbours():
+    header = TextBlock("おしながき", 0, 0, 700, 30)
+    rows = [TextBlock("料理" * 100, 0, 100 + i * 100, 700, 160 + i * 100) for i in range(6)]
+
+    regions = segment_menu([header, *rows], max_chars=200, max_regions=3)
+
+    assert len(regions) == 3
+    assert regions[0].blocks[0] == header
+    assert sum(len(region.blocks) for region in regions) == 7
@@ -0,0 +1,67 @@
+import asyncio
+import time
+import tracemalloc
+
+from app.profiling import IDLE_FRAME, RequestProfiler, render_flamegraph
+
+
+def _busy_parse(seconds: float) -> list[bytes]:
+    chunks = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        chunks.append(bytes(1024))
+    return chunks
+
+
+def test_profile_attributes_samples_to_the_request_task_tree(tmp_path):
+    profiler = RequestProfiler(output_dir=tmp_path, interval_ms=2, lag_interval_ms=5, trace_memory=True)
+
+    async def child() -> None:
+        _busy_parse(0.1)
+
+    async def scenario():
+        async with profiler.profile("POST /v1/scan_menu") as profile:
+            await asyncio.sleep(0.05)
+            await asyncio.create_task(child())
+        return profile
+
+    profile = asyncio.run(scenario())
+    profiler.close()
+    summary = profile.summary()
+
+    assert any("_busy_parse" in stack for stack in profile.stacks)
+    assert profile.idle_samples > 0
+    assert summary["loop_lag_ms_max"] >= 20
+    assert summary["memory_peak_kib"] > 0
+    assert profiler.load(profile.profile_id, "folded").decode().endswith(f"{IDLE_FRAME} {profile.idle_samples}\n")
+    assert profiler.load(profile.profile_id, "svg").startswith(b"<svg")
+    assert profiler.load("../" + profile.profile_id, "json") is None
+
+
+def test_signed_tokens_expire_and_flamegraph_escapes_frames():
+    profiler = RequestProfiler(output_dir=".", signing_key="secret")
+    token = profiler.sign_token(int(time.time()) + 60)
+
+    assert profiler.verify_token(token)
+    assert not profiler.verify_token(token[:-1] + ("A" if token[-1] != "A" else "B"))
+    assert not profiler.verify_token(profiler.sign_token(int(time.time()) - 1))
+    assert not RequestProfiler(output_dir=".", signing_key="other").verify_token(token)
+    assert not profiler.should_profile(None)
+
+    svg = render_flamegraph("scan (app/main.py);parse<T> (app/x.py) 3\nscan (app/main.py) 1\n")
+    assert "parse&lt;T&gt;" in svg
+    assert "4 samples, 100.0%" in svg
+
+
+def test_memory_tracing_is_opt_in(tmp_path):
+    profiler = RequestProfiler(output_dir=tmp_path, interval_ms=2)
+
+    async def scenario():
+        async with profiler.profile("POST /v1/scan_menu") as profile:
+            assert not tracemalloc.is_tracing()
+        return profile
+
+    profile = asyncio.run(scenario())
+    profiler.close()
+
+    assert profile.summary()["memory_peak_kib"] is None
@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+from pydantic import BaseModel
+
+from app.replay import ScanReplayStore
+
+
+class _Response(BaseModel):
+    value: str
+
+
+async def _scan(store: ScanReplayStore, produce, read_seconds: float = 0.0) -> str:
+    # Mirrors the scan handlers: reserve before the first await, claim before charging.
+    reservation = store.reserve("device:a", "r1")
+    try:
+        await store.claim(reservation)
+        await asyncio.sleep(read_seconds)
+        replayed = await store.wait_for_response(reservation)
+        if replayed is not None:
+            return replayed
+        return (await store.run_once(reservation, produce)).model_dump_json()
+    finally:
+        await store.release(reservation)
+
+
+def test_duplicate_waits_for_inflight_original_and_replays_it(tmp_path):
+    store = ScanReplayStore(str(tmp_path / "replay.db"), wait_timeout_seconds=5.0)
+    calls = []
+
+    async def produce() -> _Response:
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return _Response(value="menu")
+
+    async def scenario():
+        original = asyncio.create_task(_scan(store, produce))
+        await asyncio.sleep(0)
+        duplicate = await _scan(store, produce)
+        return await original, duplicate
+
+    original, duplicate = asyncio.run(scenario())
+
+    assert calls == [1]
+    assert _Response.model_validate_json(original).value == "menu"
+    assert duplicate == original
+    reopened = ScanReplayStore(str(tmp_path / "replay.db"))
+    assert asyncio.run(_scan(reopened, produce)) == duplicate
+    assert calls == [1]
+
+
+def test_duplicate_arriving_before_the_original_runs_is_not_rerun(tmp_path):
+    # Two stores on one file stand in for two worker processes.
+    path = str(tmp_path / "replay.db")
+    stores = [ScanReplayStore(path, wait_timeout_seconds=5.0, poll_interval_seconds=0.01) for _ in range(2)]
+    calls = []
+
+    async def produce() -> _Response:
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        return _Response(value="menu")
+
+    async def scenario(same_process: bool):
+        # The original is still reading its upload when the duplicates arrive.
+        second = stores[0] if same_process else stores[1]
+        return await asyncio.gather(
+            _scan(stores[0], produce, read_seconds=0.05), _scan(second, produce), _scan(second, produce)
+        )
+
+    for same_process in (True, False):
+        calls.clear()
+        responses = asyncio.run(scenario(same_process))
+        assert calls == [1]
+        assert len(set(responses)) == 1
+        stores[0]._delete(("device:a", "r1"))
+
+
+def test_failed_original_leaves_nothing_to_replay(tmp_path):
+    store = ScanReplayStore(str(tmp_path / "replay.db"), wait_timeout_seconds=5.0)
+
+    async def fail() -> _Response:
+        raise RuntimeError("upstream failed")
+
+    async def succeed() -> _Response:
+        return _Response(value="retried")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(_scan(store, fail))
+    assert store._load(("device:a", "r1")) is None
+    assert _Response.model_validate_json(asyncio.run(_scan(store, succeed))).value == "retried"
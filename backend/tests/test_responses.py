@@ -0,0 +1,24 @@
+import gzip
+import json
+
+from app.responses import brotli, encoded_json_response, negotiate_encoding
+
+
+def test_negotiate_encoding_respects_quality_values():
+    assert negotiate_encoding(None) is None
+    assert negotiate_encoding("gzip") == "gzip"
+    assert negotiate_encoding("gzip;q=0, identity") is None
+    assert negotiate_encoding("gzip, br") == ("br" if brotli is not None else "gzip")
+    assert negotiate_encoding("br;q=0.5, gzip;q=0.8") == "gzip"
+    assert negotiate_encoding("*") == ("br" if brotli is not None else "gzip")
+
+
+def test_small_bodies_stay_uncompressed_and_large_ones_are_gzipped():
+    small = encoded_json_response(b'{"ok":true}', "gzip")
+    assert "content-encoding" not in small.headers
+    assert small.headers["vary"] == "Accept-Encoding"
+
+    payload = json.dumps({"items": ["天丼"] * 500}, ensure_ascii=False).encode("utf-8")
+    large = encoded_json_response(payload, "gzip")
+    assert large.headers["content-encoding"] == "gzip"
+    assert gzip.decompress(large.body) == payload
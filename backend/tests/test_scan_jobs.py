@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+
+from app.scan_jobs import ScanJobQueue, ScanQueueFullError
+
+
+class _UpstreamError(Exception):
+    status_code = 502
+    detail = "Upstream API error"
+
+
+def test_queue_bounds_waiting_jobs_and_reports_results():
+    async def scenario():
+        queue = ScanJobQueue(workers=1, max_queued=2)
+        release = asyncio.Event()
+
+        async def slow() -> str:
+            await release.wait()
+            return "done"
+
+        async def failing() -> str:
+            raise _UpstreamError()
+
+        first = queue.submit("a", slow)
+        second = queue.submit("b", failing)
+        with pytest.raises(ScanQueueFullError) as rejected:
+            queue.submit("c", slow)
+        assert rejected.value.retry_after_seconds >= 1
+        assert (queue.queue_position(first), queue.queue_position(second)) == (1, 2)
+
+        await asyncio.sleep(0)
+        assert first.status == "running"
+        assert queue.queue_position(second) == 1
+        queue.submit("c", slow)
+
+        release.set()
+        await queue.wait(queue.get("c"), timeout_seconds=1)
+        metrics = queue.metrics()
+        await queue.aclose()
+        return first, second, metrics
+
+    first, second, metrics = asyncio.run(scenario())
+
+    assert (first.status, first.result) == ("succeeded", "done")
+    assert second.status == "failed"
+    assert (second.error.status_code, second.error.detail) == (502, "Upstream API error")
+    assert (metrics["submitted"], metrics["rejected"], metrics["succeeded"], metrics["failed"]) == (3, 1, 2, 1)
+    assert metrics["queue_depth"] == 0
+    assert metrics["wait_ms_p50"] is not None
+
+
+def test_held_slot_counts_against_capacity_until_submitted():
+    async def scenario():
+        queue = ScanJobQueue(workers=1, max_queued=1)
+        queue.hold_slot()
+        with pytest.raises(ScanQueueFullError):
+            queue.submit("a", asyncio.sleep)
+        job = queue.submit("b", lambda: asyncio.sleep(0), slot_held=True)
+        await queue.wait(job, timeout_seconds=1)
+        queue.hold_slot()
+        queue.release_slot()
+        queue.submit("c", lambda: asyncio.sleep(0))
+        await queue.aclose()
+        return job
+
+    assert asyncio.run(scenario()).status == "succeeded"
+
+
+def test_close_fails_jobs_that_never_started():
+    async def scenario():
+        queue = ScanJobQueue(workers=1, max_queued=4)
+        release = asyncio.Event()
+
+        async def slow() -> str:
+            await release.wait()
+            return "done"
+
+        running = queue.submit("a", slow)
+        waiting = queue.submit("b", slow)
+        await asyncio.sleep(0)
+        await queue.aclose()
+        return running, waiting
+
+    running, waiting = asyncio.run(scenario())
+
+    for job in (running, waiting):
+        assert (job.status, job.error.status_code) == ("failed", 503)
+        assert job.done.is_set() and job.finished_at is not None
@@ -0,0 +1,48 @@
+import dataclasses
+
+import pytest
+
+from app.settings import SettingsError, load_settings
+
+
+def test_invalid_values_are_reported_on_use_not_on_load():
+    settings = load_settings(
+        {
+            "OCR_PIPELINE_MODE": "fancy",
+            "MAX_MENU_ITEMS": "50",
+            "GEMINI_VISION_MAX_IMAGE_SIDE": "64",
+            "IMAGE_SEARCH_PROVIDER": "vertex",
+            "GEMINI_API_KEY": " key ",
+        }
+    )
+
+    assert settings.require("GEMINI_API_KEY") == "key"
+    assert settings.image_search_provider == "vertex"
+    with pytest.raises(SettingsError, match="OCR_PIPELINE_MODE"):
+        settings.check("OCR_PIPELINE_MODE")
+    with pytest.raises(SettingsError, match="MAX_MENU_ITEMS"):
+        settings.check("MAX_MENU_ITEMS")
+    with pytest.raises(SettingsError, match="GEMINI_VISION_MAX_IMAGE_SIDE"):
+        settings.check("GEMINI_VISION_MAX_IMAGE_SIDE")
+    with pytest.raises(SettingsError, match="Missing required env var: GOOGLE_CLOUD_VISION_API_KEY"):
+        settings.require("GOOGLE_CLOUD_VISION_API_KEY")
+
+
+def test_settings_snapshot_is_immutable():
+    settings = load_settings({"ENABLE_IMAGE_SEARCH": "false"})
+
+    assert settings.image_search_provider == "none"
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        settings.max_menu_items = 3
+    with pytest.raises(TypeError):
+        settings.credentials["GEMINI_API_KEY"] = "x"
+
+
+def test_dish_dictionary_settings():
+    settings = load_settings({"ENABLE_DISH_DICTIONARY": "true", "DISH_DICTIONARY_MIN_COVERAGE_PCT": "150"})
+
+    assert settings.dish_dictionary_enabled
+    assert settings.dish_dictionary_version == "dishes_v1"
+    assert settings.dish_dictionary_min_coverage == 0.6
+    with pytest.raises(SettingsError, match="DISH_DICTIONARY_MIN_COVERAGE_PCT"):
+        settings.check("DISH_DICTIONARY_MIN_COVERAGE_PCT")
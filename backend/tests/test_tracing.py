@@ -0,0 +1,115 @@
+import asyncio
+import json
+import threading
+
+import httpx
+import pytest
+
+from app.tracing import (
+    HttpSpanExporter,
+    JsonlSpanExporter,
+    SpanExporter,
+    Tracer,
+    TracingTransport,
+    current_trace_id,
+    make_collector,
+    span,
+    summarize,
+    trace_id_for,
+)
+
+
+def test_trace_id_follows_the_client_request_id():
+    assert trace_id_for("0F8FAD5B-D9CB-469F-A165-70867728950E") == "0f8fad5bd9cb469fa16570867728950e"
+    assert trace_id_for("scan-42") == trace_id_for("scan-42")
+    assert len(trace_id_for("scan-42")) == 32
+    assert trace_id_for(None) != trace_id_for(None)
+
+
+def test_spans_nest_and_export_once_the_root_ends(tmp_path):
+    tracer = Tracer(JsonlSpanExporter(tmp_path / "traces.jsonl"))
+
+    async def scenario():
+        with tracer.trace("scan_menu", trace_id_for("req-1")) as root:
+            with span("quota") as quota:
+                quota.set(plan="free")
+            with span("menu_parse"):
+                await asyncio.gather(*(asyncio.create_task(lookup(query)) for query in ["ramen", "natto"]))
+            with pytest.raises(ValueError), span("ocr_normalize"):
+                raise ValueError("bad json")
+            assert current_trace_id() == root.trace_id
+        assert current_trace_id() is None
+
+    async def lookup(query: str) -> None:
+        with span("image_search", query=query):
+            await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+    tracer.close()
+    lines = (tmp_path / "traces.jsonl").read_text().splitlines()
+    records = {}
+    for record in map(json.loads, lines):
+        records[record["name"] + record["attributes"].get("query", "")] = record
+
+    root = records["scan_menu"]
+    assert root["parent_span_id"] is None
+    assert {records[name]["parent_span_id"] for name in ["quota", "menu_parse", "ocr_normalize"]} == {root["span_id"]}
+    assert records["image_searchramen"]["parent_span_id"] == records["menu_parse"]["span_id"]
+    assert records["ocr_normalize"]["status"] == "error"
+    assert records["quota"]["attributes"] == {"plan": "free"}
+    assert {record["trace_id"] for record in records.values()} == {trace_id_for("req-1")}
+
+
+def test_exporter_drops_batches_once_its_queue_is_full():
+    writing = threading.Event()
+    release = threading.Event()
+
+    class StalledExporter(SpanExporter):
+        def _write(self, batch):
+            writing.set()
+            release.wait(timeout=5)
+
+    tracer = Tracer(StalledExporter(max_queued_batches=2))
+
+    def trace(request_id: str) -> None:
+        with tracer.trace("scan_menu", trace_id_for(request_id)):
+            pass
+
+    trace("req-0")
+    assert writing.wait(timeout=5)
+    for index in range(1, 5):
+        trace(f"req-{index}")
+    assert tracer.exporter.failures == 2
+
+    release.set()
+    tracer.close()
+    assert (tracer.exporter.exported, tracer.exporter.failures) == (3, 2)
+
+
+def test_upstream_calls_are_traced_and_shipped_to_the_collector(tmp_path):
+    output = tmp_path / "collected.jsonl"
+    collector = make_collector(0, output)
+    threading.Thread(target=collector.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{collector.server_port}/v1/spans"
+    tracer = Tracer(HttpSpanExporter(url))
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=TracingTransport(httpx.AsyncHTTPTransport())) as client:
+            await client.post(url + "?key=secret", content=b"[]")
+            with tracer.trace("scan_menu", trace_id_for("req-2")):
+                response = await client.post(url + "?key=secret", content=b"[]")
+        return response.status_code
+
+    try:
+        assert asyncio.run(scenario()) == 204
+        tracer.close()
+    finally:
+        collector.shutdown()
+        collector.server_close()
+    records = [json.loads(line) for line in output.read_text().splitlines()]
+
+    upstream = next(record for record in records if record["name"].startswith("http POST"))
+    assert upstream["attributes"]["http_path"] == "/v1/spans"
+    assert "secret" not in json.dumps(upstream)
+    assert upstream["attributes"]["status_code"] == 204
+    assert [row["name"] for row in summarize(records)] == ["scan_menu", "http POST 127.0.0.1"]
@@ -0,0 +1,49 @@
+import json
+
+import pytest
+from fastapi import HTTPException
+
+from app.traffic_capture import TrafficCapture, note, note_image
+
+
+def _records(capture: TrafficCapture) -> list[dict]:
+    capture.close()
+    return [json.loads(line) for line in capture.path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_capture_records_sanitized_outcomes(tmp_path):
+    capture = TrafficCapture(tmp_path / "capture.jsonl")
+
+    for attempt in range(2):
+        with capture.capture("req-1", target_lang="en") as record:
+            note(subject_key="device:secret-device", plan="free")
+            note_image(b"menu photo")
+            note(ocr_text="天丼 1200円")
+            record.update(returned_item_count=1, response_replayed=attempt == 1)
+    with pytest.raises(HTTPException), capture.capture("req-2"):
+        raise HTTPException(status_code=402, detail={"code": "scan_quota_exceeded"})
+    note(ocr_text="outside any capture")
+    first, retry, rejected = _records(capture)
+
+    assert "secret-device" not in json.dumps([first, retry, rejected])
+    assert "req-1" not in json.dumps([first, retry, rejected])
+    assert first["request_key"] == retry["request_key"] != rejected["request_key"]
+    assert first["subject_key"] == retry["subject_key"]
+    assert first["ocr_text"] == "天丼 1200円" and first["image_bytes"] == 10
+    assert (first["status_code"], retry["response_replayed"]) == (200, True)
+    assert (rejected["status_code"], rejected["error_code"]) == (402, "scan_quota_exceeded")
+
+
+def test_sampling_keeps_retries_together_and_caps_records(tmp_path):
+    capture = TrafficCapture(tmp_path / "capture.jsonl", sample_rate=0.5, max_records=1000)
+    decisions = {request_id: capture.should_capture(request_id) for request_id in map(str, range(400))}
+
+    assert 120 < sum(decisions.values()) < 280
+    assert all(capture.should_capture(request_id) == sampled for request_id, sampled in decisions.items())
+
+    capped = TrafficCapture(tmp_path / "capped.jsonl", max_records=2)
+    for request_id in ["a", "b", "c"]:
+        with capped.capture(request_id):
+            pass
+    assert len(_records(capped)) == 2
+    capture.close()
@@ -0,0 +1,87 @@
+import pytest
+
+from app.usage import UsageStore
+from app.usage_backends import SQLiteUsageBackend
+
+
+def _period(store: UsageStore) -> str:
+    return store._period_ym(store._now_utc())
+
+
+def test_direct_mode_stops_exactly_at_quota_and_replays_duplicates_at_the_boundary(tmp_path):
+    backend = SQLiteUsageBackend(str(tmp_path / "usage.db"))
+    store = UsageStore(db_path="unused.db", free_quota=2, pro_quota=5, backend=backend)
+
+    assert [store.consume_scan("device:a", request_id=f"r{idx}").allowed for idx in (1, 2)] == [True, True]
+    denied = store.consume_scan("device:a", request_id="r3")
+    retry_at_quota = store.consume_scan("device:a", request_id="r2")
+    denied_retry = store.consume_scan("device:a", request_id="r3")
+    anonymous = store.consume_scan("device:a")
+
+    assert (denied.allowed, denied.used_scans, denied.remaining_scans) == (False, 2, 0)
+    # A retry of a charged request is answered even at quota, and never charged again.
+    assert (retry_at_quota.allowed, retry_at_quota.duplicate_request, retry_at_quota.used_scans) == (True, True, 2)
+    # A denied request_id is not recorded, so its retry is denied again rather than replayed.
+    assert (denied_retry.allowed, denied_retry.duplicate_request) == (False, False)
+    assert (anonymous.allowed, anonymous.used_scans) == (False, 2)
+    assert backend.load_counter("device:a", _period(store)) == (2, {"r1", "r2"})
+    backend.close()
+
+
+def test_memory_mode_enforces_quota_and_duplicates_across_flushes(tmp_path):
+    backend = SQLiteUsageBackend(str(tmp_path / "usage.db"))
+    store = UsageStore(db_path="unused.db", free_quota=2, pro_quota=5, counter_mode="memory", backend=backend)
+
+    assert store.consume_scan("device:a", request_id="r1").used_scans == 1
+    assert store.consume_scan("device:a", request_id="r1").duplicate_request is True
+    assert store.flush() == 1
+    assert store.flush() == 0
+    assert store.consume_scan("device:a", request_id="r1").duplicate_request is True
+    assert store.consume_scan("device:a", request_id="r2").used_scans == 2
+    denied = store.consume_scan("device:a", request_id="r3")
+
+    assert (denied.allowed, denied.used_scans, denied.remaining_scans) == (False, 2, 0)
+    assert store.flush() == 1
+    assert backend.load_counter("device:a", _period(store)) == (2, {"r1", "r2"})
+    store.close()
+
+
+def test_write_behind_flushes_charge_each_request_once_across_processes(tmp_path):
+    db_path = str(tmp_path / "usage.db")
+    first = UsageStore(db_path=db_path, free_quota=5, pro_quota=10, counter_mode="memory")
+    second = UsageStore(db_path=db_path, free_quota=5, pro_quota=10, counter_mode="memory")
+
+    # Both processes see the same retry before either has flushed.
+    first.consume_scan("device:a", request_id="r1")
+    second.consume_scan("device:a", request_id="r1")
+    second.consume_scan("device:a", request_id="r2")
+
+    assert first.flush() == 1
+    assert second.flush() == 1
+    assert first.backend.load_counter("device:a", _period(first)) == (2, {"r1", "r2"})
+    assert first.consume_scan("device:a", request_id="r2").duplicate_request is True
+    first.close()
+    second.close()
+
+
+def test_failed_flush_keeps_pending_scans_for_the_next_one(tmp_path):
+    class FlakyBackend(SQLiteUsageBackend):
+        failures = 1
+
+        def apply_pending(self, batches, now_iso):
+            if self.failures:
+                self.failures -= 1
+                raise OSError("counter store unavailable")
+            return super().apply_pending(batches, now_iso)
+
+    backend = FlakyBackend(str(tmp_path / "usage.db"))
+    store = UsageStore(db_path="unused.db", free_quota=3, pro_quota=5, counter_mode="memory", backend=backend)
+    store.consume_scan("device:a", request_id="r1")
+    store.consume_scan("device:a")
+
+    with pytest.raises(OSError):
+        store.flush()
+    assert store.consume_scan("device:a", request_id="r1").duplicate_request is True
+    assert store.flush() == 2
+    assert backend.load_counter("device:a", _period(store)) == (2, {"r1"})
+    store.close()
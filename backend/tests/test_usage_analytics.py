@@ -0,0 +1,65 @@
+import pytest
+
+from app.usage import UsageStore
+from app.usage_analytics import UsageAnalytics
+from app.usage_backends import ShardedMemoryUsageBackend, SQLiteUsageBackend
+
+
+@pytest.fixture(params=["sqlite", "sharded_memory"])
+def backend(request, tmp_path):
+    if request.param == "sqlite":
+        backend = SQLiteUsageBackend(str(tmp_path / "usage.db"))
+        yield backend
+        backend.close()
+    else:
+        yield ShardedMemoryUsageBackend(shard_count=4)
+
+
+def test_summary_folds_in_changed_rows_incrementally(backend):
+    store = UsageStore(db_path="unused.db", free_quota=2, pro_quota=5, backend=backend)
+    analytics = UsageAnalytics(backend, start_background=False)
+    store.set_plan("device:pro", "pro")
+    for subject_key in ("device:a", "device:a", "device:b", "device:pro"):
+        store.consume_scan(subject_key)
+
+    assert analytics.refresh() == 3
+    period_ym = analytics.latest_period()
+    [summary] = analytics.period_summaries(period_ym)
+    assert (summary.subjects, summary.total_scans, summary.exhausted_subjects) == (3, 4, 1)
+    assert summary.subjects_by_plan == {"free": 2, "pro": 1}
+
+    store.consume_scan("device:b")
+    store.consume_scan("device:pro")
+    analytics.refresh()
+
+    [summary] = analytics.period_summaries(period_ym)
+    assert (summary.subjects, summary.total_scans, summary.exhausted_subjects) == (3, 6, 2)
+    assert summary.scans_by_plan == {"free": 4, "pro": 2}
+    assert [subject.subject_key for subject in analytics.top_subjects(period_ym, limit=2)] == ["device:pro", "device:b"]
+    exhaustion = analytics.quota_exhaustion(period_ym, near_remaining_threshold=3)
+    assert (exhaustion.exhausted_subjects, exhaustion.near_quota_subjects) == (2, 1)
+
+
+def test_full_resync_drops_archived_periods(backend):
+    store = UsageStore(db_path="unused.db", free_quota=2, pro_quota=5, backend=backend, usage_retention_months=2)
+    analytics = UsageAnalytics(backend, start_background=False)
+    backend.consume(
+        subject_key="device:old",
+        period_ym="2000-01",
+        request_id=None,
+        quota=2,
+        plan="free",
+        now_iso="2000-01-15T00:00:00+00:00",
+    )
+    store.consume_scan("device:a")
+    analytics.refresh()
+    assert [summary.period_ym for summary in analytics.period_summaries()][-1] == "2000-01"
+
+    assert store.compact().archived_usage_rows == 1
+    # An incremental refresh never sees the archived row go away.
+    analytics.refresh()
+    assert len(analytics.period_summaries()) == 2
+
+    assert analytics.refresh(full=True) == 1
+    assert [summary.period_ym for summary in analytics.period_summaries()] == [analytics.latest_period()]
+    assert analytics.top_subjects("2000-01") == []
@@ -0,0 +1,122 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.usage import UsageStore
+from app.usage_backends import HttpUsageBackend, ShardedMemoryUsageBackend, SQLiteUsageBackend, UsageCounterServer
+
+
+@pytest.fixture(params=["sqlite", "sharded_memory", "http"])
+def backend(request, tmp_path):
+    if request.param == "sqlite":
+        backend = SQLiteUsageBackend(str(tmp_path / "usage.db"))
+        yield backend
+        backend.close()
+    elif request.param == "sharded_memory":
+        yield ShardedMemoryUsageBackend(shard_count=4)
+    else:
+        server = UsageCounterServer(ShardedMemoryUsageBackend(shard_count=4)).start()
+        backend = HttpUsageBackend(server.url)
+        yield backend
+        backend.close()
+        server.stop()
+
+
+def test_quota_and_duplicate_requests_behave_the_same_on_every_backend(backend):
+    store = UsageStore(db_path="unused.db", free_quota=2, pro_quota=3, backend=backend)
+
+    first = store.consume_scan("device:a", request_id="r1")
+    retry = store.consume_scan("device:a", request_id="r1")
+    second = store.consume_scan("device:a", request_id="r2")
+    denied = store.consume_scan("device:a", request_id="r3")
+
+    assert (first.allowed, first.used_scans, first.duplicate_request) == (True, 1, False)
+    assert (retry.allowed, retry.used_scans, retry.duplicate_request) == (True, 1, True)
+    assert (second.allowed, second.used_scans) == (True, 2)
+    assert (denied.allowed, denied.used_scans, denied.remaining_scans) == (False, 2, 0)
+
+    store.set_plan("device:a", "pro")
+    upgraded = store.consume_scan("device:a", request_id="r3")
+    assert (upgraded.allowed, upgraded.plan, upgraded.quota_scans) == (True, "pro", 3)
+
+
+def test_sqlite_counter_mode_is_an_alias_for_direct():
+    store = UsageStore(
+        db_path="unused.db", free_quota=2, pro_quota=3, counter_mode="sqlite", backend=ShardedMemoryUsageBackend()
+    )
+
+    assert store.counter_mode == "direct"
+    with pytest.raises(ValueError, match="counter_mode"):
+        UsageStore(db_path="unused.db", free_quota=2, pro_quota=3, counter_mode="redis")
+
+
+def test_concurrent_consumers_never_exceed_quota(backend):
+    store = UsageStore(db_path="unused.db", free_quota=25, pro_quota=50, backend=backend)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        decisions = list(pool.map(lambda idx: store.consume_scan("device:b", request_id=f"r{idx}"), range(40)))
+
+    assert sum(1 for decision in decisions if decision.allowed) == 25
+    assert max(decision.used_scans for decision in decisions) == 25
+
+
+def test_write_behind_flush_reconciles_with_the_backend(backend):
+    store = UsageStore(db_path="unused.db", free_quota=10, pro_quota=20, counter_mode="memory", backend=backend)
+    store.consume_scan("device:c", request_id="r1")
+    store.consume_scan("device:c")
+
+    assert store.flush() == 2
+    assert backend.load_counter("device:c", store._period_ym(store._now_utc()))[0] == 2
+    # Flushed counters are dropped, so these decisions are rebuilt from backend state.
+    assert store.consume_scan("device:c", request_id="r1").duplicate_request is True
+    assert store.consume_scan("device:c", request_id="r2").used_scans == 3
+    store.close()
+
+
+def test_compaction_expires_old_request_ids_and_archives_old_periods(backend):
+    store = UsageStore(
+        db_path="unused.db",
+        free_quota=10,
+        pro_quota=20,
+        backend=backend,
+        idempotency_retention_days=7,
+        usage_retention_months=2,
+        compaction_batch_size=2,
+    )
+    for idx in range(5):
+        backend.consume(
+            subject_key=f"device:{idx}",
+            period_ym="2000-01",
+            request_id=f"old-{idx}",
+            quota=10,
+            plan="free",
+            now_iso="2000-01-15T00:00:00+00:00",
+        )
+    store.consume_scan("device:0", request_id="fresh")
+
+    result = store.compact()
+
+    assert result.expired_request_ids == 5
+    assert result.archived_usage_rows == 5
+    assert backend.load_counter("device:0", "2000-01") == (0, set())
+    assert store.consume_scan("device:0", request_id="fresh").duplicate_request is True
+
+
+def test_memory_mode_loads_counters_without_blocking_other_subjects():
+    release = threading.Event()
+
+    class SlowBackend(ShardedMemoryUsageBackend):
+        def load_counter(self, subject_key, period_ym):
+            if subject_key == "device:slow":
+                release.wait(timeout=5)
+            return super().load_counter(subject_key, period_ym)
+
+    store = UsageStore(db_path="unused.db", free_quota=10, pro_quota=20, counter_mode="memory", backend=SlowBackend())
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        slow = pool.submit(store.consume_scan, "device:slow", "r1")
+        fast = store.consume_scan("device:fast", request_id="r1")
+        assert not slow.done()
+        release.set()
+        assert slow.result().used_scans == fast.used_scans == 1
+    store.close()